@@ -1,31 +1,67 @@
-from flask import Flask, request, redirect, url_for, render_template, send_file, flash, jsonify, session
+from flask import Flask, Response, request, redirect, url_for, render_template, send_file, flash, jsonify, session
 import os
 import subprocess
 import sys
 import random
 import json
+import hashlib
 from werkzeug.utils import secure_filename
 import threading
 import time
-import requests
 import uuid
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from session_store import ServerSideSessionInterface, create_session_store
+import search_index
+from context_budget import budget_context, get_budget_stats
+from assets import register_assets
+import retention
+import clients
+import audio_probe
+import jobs
+import quiz_store
+from key_points import extract_key_points, save_key_points
+from generate_lec1 import generate_text
+from resilience import (CircuitOpenError, DeadlineExceeded, UpstreamError, call_with_failover, is_upstream_failure,
+                        upstream_stats)
 
 # Load environment variables from .env file
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'
+register_assets(app)
+
+# Largest accepted request body (lecture recordings); bigger uploads get a 413
+app.config['MAX_CONTENT_LENGTH'] = int(float(os.getenv('MAX_UPLOAD_MB', '1024')) * 1024 * 1024)
 
 # OpenAI Realtime API configuration
 app.config['OPENAI_REALTIME_MODEL'] = os.getenv('OPENAI_REALTIME_MODEL', 'gpt-4o-mini-realtime-preview')
 app.config['OPENAI_REALTIME_VOICE'] = os.getenv('OPENAI_REALTIME_VOICE', 'alloy')
+app.config['OPENAI_API_BASE'] = os.getenv('OPENAI_API_BASE', 'https://api.openai.com/v1')
+
+# Upper bounds on what a student waits for upstreams (see resilience.py)
+app.config['GEMINI_DEADLINE_SECONDS'] = float(os.getenv('GEMINI_INTERACTIVE_DEADLINE_SECONDS', '45'))
+app.config['REALTIME_DEADLINE_SECONDS'] = float(os.getenv('REALTIME_DEADLINE_SECONDS', '8'))
+app.config['REALTIME_HEDGE_AFTER_SECONDS'] = float(os.getenv('REALTIME_HEDGE_AFTER_SECONDS', '2'))
+app.config['OPENAI_REALTIME_FALLBACK_MODEL'] = os.getenv('OPENAI_REALTIME_FALLBACK_MODEL', 'gpt-4o-realtime-preview')
+
+# 'pipelined' overlaps Gemini note generation with transcription (see pipeline.py)
+app.config['PIPELINE_MODE'] = os.getenv('PIPELINE_MODE', 'sequential')
+
+# Token budgets for lecture content placed into prompts
+app.config['PROMPT_TOKEN_BUDGET'] = int(os.getenv('CONTEXT_TOKEN_BUDGET', '6000'))
+app.config['TUTOR_TOKEN_BUDGET'] = int(os.getenv('TUTOR_CONTEXT_TOKEN_BUDGET', '800'))
+
+# Refine the local key points with Gemini in the background (tutor never waits on it)
+app.config['KEY_POINTS_GEMINI_REFINE'] = os.getenv('KEY_POINTS_GEMINI_REFINE', '1') == '1'
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 PROCESSED_FOLDER = 'processed'
 GENERATED_FOLDER = 'generated_documents'
+# Which lecture output.txt was generated for (quiz analytics for every student)
+LECTURE_ID_PATH = 'lecture_id.txt'
 ALLOWED_EXTENSIONS = {'mp3', 'wav', 'm4a', 'flac'}
 
 # Ensure directories exist
@@ -33,25 +69,51 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_FOLDER, exist_ok=True)
 os.makedirs(GENERATED_FOLDER, exist_ok=True)
 
+# Disk retention: sweep orphaned temp chunks now, then evict by TTL/quota every hour
+if os.getenv('RETENTION_ENABLED', '1') == '1':
+    retention.start_retention_thread(int(os.getenv('RETENTION_INTERVAL_SECONDS', '3600')))
+
+# Server-side sessions: the cookie only carries a signed session ID,
+# quiz state and the student name live in the store ('memory' or 'sqlite')
+app.session_interface = ServerSideSessionInterface(
+    create_session_store(
+        os.getenv('SESSION_STORE', 'memory'),
+        os.getenv('SESSION_DB_PATH', os.path.join(PROCESSED_FOLDER, 'sessions.sqlite3')),
+    ),
+    ttl=int(os.getenv('SESSION_TTL_SECONDS', str(6 * 3600))),
+)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def extract_key_topics_with_gemini(lecture_content):
+def save_audio_upload(file, stem):
+    """Save an upload as uploads/<stem>.<ext>, where ext comes from probing the bytes, not the name"""
+    tmp_path = os.path.join(UPLOAD_FOLDER, f'{stem}.upload')
+    file.save(tmp_path)
+    info = audio_probe.probe(tmp_path)
+    ext = info.extension if info.container else secure_filename(file.filename).rsplit('.', 1)[-1].lower()
+    filepath = os.path.join(UPLOAD_FOLDER, f'{stem}.{ext}')
+    # Drop the previous upload if it had another format
+    for old_ext in ALLOWED_EXTENSIONS:
+        old_path = os.path.join(UPLOAD_FOLDER, f'{stem}.{old_ext}')
+        if old_path != filepath and os.path.exists(old_path):
+            os.remove(old_path)
+    os.replace(tmp_path, filepath)
+    app.logger.info(f'Saved {filepath} ({info.container or "unknown"}/{info.codec or "?"}, '
+                    f'{info.sample_rate or "?"} Hz, {info.channels or "?"} ch, speech-ready={info.speech_ready})')
+    return filepath
+
+def get_gemini_client():
+    """Shared Gemini client (built once per process by the client registry)"""
+    return clients.gemini_client()
+
+def extract_key_topics_with_gemini(lecture_content, fallback=True):
     """Extract 4-5 key points from lecture content using Gemini API"""
     try:
-        from google import genai
-        from dotenv import load_dotenv
-        
-        # Load environment variables
-        load_dotenv()
+        client = get_gemini_client()
         
-        # Get Gemini API key
-        api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise RuntimeError("GEMINI_API_KEY not found in environment variables")
-        
-        # Initialize Gemini client
-        client = genai.Client(api_key=api_key)
+        # Keep only the most relevant sections of long lectures
+        lecture_content = budget_context(lecture_content, app.config['PROMPT_TOKEN_BUDGET'], label='key_points')
         
         # Create prompt for key points extraction
         prompt = f"""
@@ -71,12 +133,7 @@ def extract_key_topics_with_gemini(lecture_content):
 """
         
         # Generate key points using Gemini
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt
-        )
-        
-        key_points_text = response.text or str(response)
+        key_points_text = generate_text(client, prompt, deadline=app.config['GEMINI_DEADLINE_SECONDS'])
         
         # Parse the response to get individual points
         lines = key_points_text.strip().split('\n')
@@ -103,45 +160,109 @@ def extract_key_topics_with_gemini(lecture_content):
         
     except Exception as e:
         print(f"❌ Error extracting key points with Gemini: {e}")
-        # Fallback to simple extraction
+        if not fallback:
+            return []
+        # Fallback to local extraction
         return extract_key_topics_fallback(lecture_content)
 
 def extract_key_topics_fallback(lecture_content):
     """Fallback method to extract key topics if Gemini fails"""
-    lines = lecture_content.split('\n')
-    topics = []
-    
-    for line in lines:
-        line = line.strip()
-        # Look for main headings and key points
-        if line.startswith('**') and line.endswith('**'):
-            # Main topic
-            topic = line.replace('**', '').strip()
-            if topic and len(topic) > 3:
-                topics.append(topic)
-        elif line.startswith('*   **') and line.endswith('**'):
-            # Sub-topic
-            topic = line.replace('*   **', '').replace('**', '').strip()
-            if topic and len(topic) > 3:
-                topics.append(topic)
-    
-    # Remove duplicates and limit to 5 most important topics
-    unique_topics = list(dict.fromkeys(topics))
-    return unique_topics[:5]
+    return extract_key_points(lecture_content, limit=5)
+
+_refine_lock = threading.Lock()
+_refined_lectures = set()
+
+def refine_key_points_in_background(lecture_content):
+    """Start one Gemini key-point pass per lecture content; it overwrites key_points.txt when done"""
+    digest = hashlib.sha256(lecture_content.encode('utf-8')).hexdigest()
+    with _refine_lock:
+        if digest in _refined_lectures:
+            return
+        _refined_lectures.add(digest)
+
+    def refine():
+        started = time.perf_counter()
+        key_points = extract_key_topics_with_gemini(lecture_content, fallback=False)
+        if key_points:
+            app.logger.info(f'Gemini refined key points in {time.perf_counter() - started:.1f}s')
+        else:
+            # Allow another attempt on the next tutor session
+            with _refine_lock:
+                _refined_lectures.discard(digest)
+
+    threading.Thread(target=refine, name='key-points-refine', daemon=True).start()
+
+def load_or_extract_key_points(lecture_content, output_path='output.txt', key_points_path='key_points.txt'):
+    """Key points for the current notes: the saved file if it is newer than the notes, else local extraction"""
+    if os.path.exists(key_points_path) and os.path.getmtime(key_points_path) >= os.path.getmtime(output_path):
+        with open(key_points_path, 'r', encoding='utf-8') as f:
+            key_points = [line.strip() for line in f if line.strip()]
+        if key_points:
+            return key_points
+
+    started = time.perf_counter()
+    key_points = extract_key_points(lecture_content, limit=5)
+    save_key_points(key_points, key_points_path)
+    app.logger.info(f'Extracted {len(key_points)} key points locally in {(time.perf_counter() - started) * 1000:.1f} ms')
+    return key_points
+
+def track_lecture_artifacts(lecture_id):
+    """Register the current lecture's generated files with the retention registry"""
+    for path in ('input.txt', 'output.txt', LECTURE_ID_PATH,
+                 os.path.join(GENERATED_FOLDER, 'final_document.pdf'),
+                 os.path.join(GENERATED_FOLDER, 'final_document.docx')):
+        retention.track(path, lecture_id=lecture_id)
+
+def index_lecture_notes(lecture_id):
+    """Add the freshly generated notes and transcript to the search index"""
+    try:
+        with open('output.txt', 'r', encoding='utf-8') as f:
+            notes = f.read()
+        transcript = ''
+        if os.path.exists('input.txt'):
+            with open('input.txt', 'r', encoding='utf-8') as f:
+                transcript = f.read()
+        count = search_index.get_index().index_lecture(lecture_id, notes, transcript)
+        app.logger.info(f'Indexed {count} sections for lecture {lecture_id}')
+    except Exception as e:
+        app.logger.error(f'Error indexing lecture {lecture_id}: {e}')
 
-def run_script(script_path, *args):
-    """Run a Python script and return the result using an absolute path."""
+def run_script(script_path, *args, progress=None):
+    """Run a Python script and return the result using an absolute path.
+
+    Progress lines the script prints (jobs.report) are passed to progress as they arrive.
+    """
     try:
         project_root = os.path.abspath(os.path.dirname(__file__))
         # script_path may be relative (e.g., 'transcribtion.py' or 'backend/transcribtion.py')
         normalized = script_path.replace('backend/', '').replace('backend\\', '')
         abs_script = os.path.join(project_root, normalized)
-        result = subprocess.run([sys.executable, abs_script] + list(args),
-                                capture_output=True, text=True, cwd=project_root)
-        return result.returncode == 0, result.stdout, result.stderr
+        process = subprocess.Popen([sys.executable, abs_script] + list(args), cwd=project_root,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   encoding='utf-8', errors='replace')
+        stderr = []
+        reader = threading.Thread(target=lambda: stderr.append(process.stderr.read()), daemon=True)
+        reader.start()
+        stdout = []
+        for line in process.stdout:
+            update = jobs.parse_progress(line)
+            if update is None:
+                stdout.append(line)
+            elif progress is not None:
+                progress(update)
+        process.wait()
+        reader.join()
+        return process.returncode == 0, ''.join(stdout), ''.join(stderr)
     except Exception as e:
         return False, "", str(e)
 
+def run_step(job, stage, script_path, *args):
+    """run_script as one stage of a job (stage start/finish events and timings)"""
+    job.start_stage(stage)
+    success, stdout, stderr = run_script(script_path, *args, progress=job.progress)
+    job.finish_stage(success, None if success else stderr[-500:])
+    return success, stdout, stderr
+
 @app.route('/')
 def welcome():
     """Welcome page with introduction"""
@@ -152,63 +273,170 @@ def index():
     """Main page with audio upload form"""
     return render_template('index.html')
 
-@app.route('/upload', methods=['POST'])
-def upload_file():
+def uploaded_audio_file():
+    """The form's audio file if one was sent with an allowed type, else None (after flashing why)"""
+    file = request.files.get('audio')
+    if file is None or file.filename == '':
+        flash('No audio file selected')
+        return None
+    if not allowed_file(file.filename):
+        flash('Invalid file type. Please upload MP3, WAV, M4A, or FLAC files.')
+        return None
+    return file
+
+def start_upload_job(kind, stages):
+    """Job for the upload being received; None (after flashing why) if that job is already running"""
+    job = jobs.claim_job(request.form.get('job_id'))
+    if job.running:
+        flash('This recording is already being processed')
+        return None
+    job.plan(['upload'] + stages, kind=kind, lecture_id=session.get('lecture_id'))
+    job.start_stage('upload')
+    session['job_id'] = job.id
+    return job
+
+def current_job():
+    """Progress job of the lecture in this session (a new one if there is none)"""
+    job = jobs.claim_job(session.get('job_id'))
+    session['job_id'] = job.id
+    if job.started is None:
+        job.plan([stage for stage, _, _, _ in notes_steps(peek=True)], lecture_id=session.get('lecture_id'))
+    return job
+
+def save_job_audio(job, file, stem):
+    """save_audio_upload as the job's upload stage; the probed duration sharpens its estimates"""
+    filepath = save_audio_upload(file, stem)
+    retention.track(filepath, 'raw_audio', session.get('lecture_id'))
+    duration_ms = audio_probe.probe(filepath).duration_ms
+    job.finish_stage()
+    if duration_ms:
+        job.set_audio_seconds(duration_ms / 1000)
+    return filepath
+
+def receive_lecture_upload():
+    """Validate the upload form, start a new lecture and save its audio; returns the path or None"""
     if 'audio' not in request.files:
         flash('No audio file selected')
-        return redirect(url_for('index'))
+        return None
     
     if 'student_name' not in request.form or not request.form['student_name'].strip():
         flash('Please enter your name')
-        return redirect(url_for('index'))
+        return None
     
-    file = request.files['audio']
-    if file.filename == '':
-        flash('No audio file selected')
-        return redirect(url_for('index'))
+    file = uploaded_audio_file()
+    if file is None:
+        return None
     
-    if file and allowed_file(file.filename):
-        # Store student name in session
-        session['student_name'] = request.form['student_name'].strip()
-        
-        filename = secure_filename(file.filename)
-        # Use a consistent filename for processing
-        filename = 'audio_input.mp3'
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
-        
-        # Run transcription from backend directory (use absolute path)
-        success, stdout, stderr = run_script('transcribtion.py')
-        if not success:
-            flash(f'Transcription failed: {stderr}')
-            return redirect(url_for('index'))
-        
-        flash('Audio uploaded and transcribed successfully!')
+    # Store student name in session
+    session['student_name'] = request.form['student_name'].strip()
+    session['lecture_id'] = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    
+    pipelined = app.config['PIPELINE_MODE'] == 'pipelined'
+    job = start_upload_job('lecture', ['transcription'] + ([] if pipelined else ['notes']) + ['export'])
+    if job is None:
+        return None
+    
+    # Use a consistent filename for processing, with the extension of the
+    # probed format so the transcriber picks the right decoder (or none)
+    return save_job_audio(job, file, 'audio_input')
+
+def transcription_script():
+    """In pipelined mode the notes are generated while transcribing"""
+    return 'pipeline.py' if app.config['PIPELINE_MODE'] == 'pipelined' else 'transcribtion.py'
+
+def finish_transcription(success, stderr):
+    """Flash the transcription outcome and redirect to the next step"""
+    pipelined = app.config['PIPELINE_MODE'] == 'pipelined'
+    if not success and pipelined and os.path.exists('input.txt'):
+        # pipeline.py saved the transcript but its note generation failed; /process runs it again
+        app.logger.warning(f'Pipelined note generation failed, retrying after upload: {stderr[-500:]}')
+        session['notes_ready'] = False
+        flash('Audio transcribed; note generation failed during upload and will be retried.')
         return redirect(url_for('process'))
-    else:
-        flash('Invalid file type. Please upload MP3, WAV, M4A, or FLAC files.')
+    if not success:
+        current_job().finish('failed', 'Transcription failed')
+        flash(f'Transcription failed: {stderr}')
         return redirect(url_for('index'))
+    session['notes_ready'] = pipelined
+    
+    flash('Audio uploaded and transcribed successfully!')
+    return redirect(url_for('process'))
+
+def notes_steps(peek=False):
+    """(stage, script, args, failure message) still needed to turn the transcript into notes and a PDF"""
+    steps = []
+    # generate_lec1.py already ran during upload in pipelined mode
+    notes_ready = session.get('notes_ready', False) if peek else session.pop('notes_ready', False)
+    if not notes_ready:
+        steps.append(('notes', 'generate_lec1.py', (), 'Note generation failed'))
+    steps.append(('export', 'document_export.py', (), 'PDF generation failed'))
+    return steps
+
+def explanation_steps():
+    """Stages that add an explanation recording to the notes"""
+    return [
+        ('transcription', 'transcribtion.py', (), 'Explanation transcription failed'),
+        # Process explanation (you might want to modify this based on your needs)
+        ('notes', 'generate_lec1.py', (), 'Explanation processing failed'),
+        # Generate updated PDF
+        ('export', 'document_export.py', (), 'Updated PDF generation failed'),
+    ]
+
+def fail_step(job, failure, stderr):
+    """Flash a failed step and end its job"""
+    job.finish('failed', failure)
+    flash(f'{failure}: {stderr}')
+
+def save_lecture_id(lecture_id, path=LECTURE_ID_PATH):
+    """Record which lecture output.txt belongs to, for students who did not upload it"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(lecture_id)
+
+def current_lecture_id():
+    """ID of the lecture the current output.txt was generated for"""
+    try:
+        with open(LECTURE_ID_PATH, 'r', encoding='utf-8') as f:
+            lecture_id = f.read().strip()
+    except OSError:
+        lecture_id = ''
+    # Notes generated before lecture IDs were saved
+    return lecture_id or session.get('lecture_id', 'latest')
+
+def finish_lecture(message):
+    """Index and track the regenerated notes, flash message and end the job"""
+    lecture_id = session.get('lecture_id', 'latest')
+    save_lecture_id(lecture_id)
+    index_lecture_notes(lecture_id)
+    track_lecture_artifacts(lecture_id)
+    current_job().finish('done')
+    flash(message)
+
+@app.route('/upload', methods=['POST'])
+def upload_file():
+    filepath = receive_lecture_upload()
+    if filepath is None:
+        return redirect(url_for('index'))
+    
+    # Run transcription from backend directory (use absolute path)
+    success, stdout, stderr = run_step(current_job(), 'transcription', transcription_script(), filepath)
+    return finish_transcription(success, stderr)
 
 @app.route('/process')
 def process():
     """Process the transcribed audio and generate PDF"""
+    job = current_job()
     try:
-        # Run generate_lec1.py
-        success, stdout, stderr = run_script('generate_lec1.py')
-        if not success:
-            flash(f'Note generation failed: {stderr}')
-            return redirect(url_for('index'))
+        for stage, script, args, failure in notes_steps():
+            success, stdout, stderr = run_step(job, stage, script, *args)
+            if not success:
+                fail_step(job, failure, stderr)
+                return redirect(url_for('index'))
         
-        # Run document_export.py
-        success, stdout, stderr = run_script('document_export.py')
-        if not success:
-            flash(f'PDF generation failed: {stderr}')
-            return redirect(url_for('index'))
-        
-        flash('Lecture notes generated successfully!')
+        finish_lecture('Lecture notes generated successfully!')
         return redirect(url_for('explanation'))
         
     except Exception as e:
+        job.finish('failed', str(e))
         flash(f'Processing failed: {str(e)}')
         return redirect(url_for('index'))
 
@@ -241,12 +469,94 @@ def tutor_student_name():
     student_name = session.get('student_name', 'Student')
     return jsonify({'name': student_name})
 
+@app.route('/search')
+def search():
+    """Ranked full-text search across all indexed lecture notes and transcripts"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing query parameter q'}), 400
+    try:
+        limit = min(int(request.args.get('limit', 10)), 50)
+        started = time.perf_counter()
+        results = search_index.get_index().search(query, limit=limit, kind=request.args.get('kind'))
+        return jsonify({
+            'query': query,
+            'took_ms': round((time.perf_counter() - started) * 1000, 2),
+            'results': results,
+        })
+    except Exception as e:
+        app.logger.error(f'Error searching lectures: {e}')
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-Sent Events with the progress of a job (it may be subscribed to before it starts)"""
+    job = jobs.subscribe(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    try:
+        seq = int(request.headers.get('Last-Event-ID') or request.args.get('after') or 0)
+    except ValueError:
+        seq = 0
+    
+    def stream():
+        nonlocal seq
+        while True:
+            events, finished = job.wait(seq, timeout=15)
+            if job.abandoned:
+                return  # no upload claimed it; the browser reconnects if it is still uploading
+            if not events:
+                yield ': keep-alive\n\n'
+            for event in events:
+                yield jobs.format_sse(event)
+                seq = event['seq']
+            if finished and len(job.events) <= seq:
+                return
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs/<job_id>')
+def job_timings(job_id):
+    """Stage timings recorded for a job"""
+    summary = jobs.job_summary(job_id)
+    if summary is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(summary)
+
+@app.route('/stats/upstreams')
+def upstreams_stats():
+    """Circuit breaker state, hedges and latency percentiles per upstream"""
+    return jsonify(upstream_stats())
+
+@app.route('/stats/clients')
+def clients_stats():
+    """Shared upstream clients and connection reuse per host"""
+    return jsonify(clients.pool_stats())
+
+@app.route('/stats/quiz')
+def quiz_lecture_stats():
+    """Quiz attempts, answers and correct rate per lecture"""
+    return jsonify(quiz_store.get_store().lecture_stats())
+
+@app.route('/stats/quiz/<lecture_id>')
+def quiz_question_stats(lecture_id):
+    """Per-question quiz results of a lecture, most often missed first"""
+    limit = request.args.get('limit', type=int)
+    return jsonify(quiz_store.get_store().question_stats(lecture_id, limit))
+
+@app.route('/stats/context-budget')
+def context_budget_stats():
+    """Tokens saved by prompt context budgeting"""
+    return jsonify(get_budget_stats())
+
 @app.route('/download')
 def download_pdf():
     """Download the generated PDF"""
     # Use absolute path to ensure we find the file regardless of working directory
     pdf_path = os.path.abspath(os.path.join(GENERATED_FOLDER, 'final_document.pdf'))
     if os.path.exists(pdf_path):
+        retention.touch(os.path.join(GENERATED_FOLDER, 'final_document.pdf'))
         return send_file(pdf_path, as_attachment=True, download_name='lecture_notes.pdf')
     else:
         flash('PDF not found. Please try processing again.')
@@ -255,89 +565,50 @@ def download_pdf():
 @app.route('/upload_explanation', methods=['POST'])
 def upload_explanation():
     """Handle second audio upload for explanation"""
-    if 'audio' not in request.files:
-        flash('No audio file selected')
+    file = uploaded_audio_file()
+    if file is None:
         return redirect(url_for('explanation'))
     
-    file = request.files['audio']
-    if file.filename == '':
-        flash('No audio file selected')
+    job = start_upload_job('explanation', ['transcription', 'notes', 'export'])
+    if job is None:
         return redirect(url_for('explanation'))
     
-    if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        # Use a different filename for explanation
-        filename = 'explanation_input.mp3'
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
-        
-        # Run transcription for explanation
-        success, stdout, stderr = run_script('transcribtion.py')
-        if not success:
-            flash(f'Explanation transcription failed: {stderr}')
-            return redirect(url_for('explanation'))
-        
-        # Process explanation (you might want to modify this based on your needs)
-        success, stdout, stderr = run_script('generate_lec1.py')
-        if not success:
-            flash(f'Explanation processing failed: {stderr}')
-            return redirect(url_for('explanation'))
-        
-        # Generate updated PDF
-        success, stdout, stderr = run_script('document_export.py')
+    # Use a different filename for explanation
+    save_job_audio(job, file, 'explanation_input')
+    
+    for stage, script, args, failure in explanation_steps():
+        success, stdout, stderr = run_step(job, stage, script, *args)
         if not success:
-            flash(f'Updated PDF generation failed: {stderr}')
+            fail_step(job, failure, stderr)
             return redirect(url_for('explanation'))
-        
-        flash('Explanation added successfully!')
-        return redirect(url_for('explanation'))
-    else:
-        flash('Invalid file type. Please upload MP3, WAV, M4A, or FLAC files.')
-        return redirect(url_for('explanation'))
-
-@app.route('/tutor/realtime/session', methods=['POST'])
-def tutor_realtime_session():
-    """Create a session for OpenAI Realtime API for the AI Tutor"""
-    try:
-        # Check if OpenAI API key is available
-        openai_api_key = os.getenv('OPENAI_API_KEY')
-        if not openai_api_key:
-            return jsonify({'error': 'OpenAI API key not configured'}), 500
+    
+    finish_lecture('Explanation added successfully!')
+    return redirect(url_for('explanation'))
 
-        # Get student name from session
-        student_name = session.get('student_name', 'الطالب')
-        
-        # Read the lecture content from output.txt
-        output_path = 'output.txt'
-        if not os.path.exists(output_path):
-            return jsonify({'error': 'Lecture notes not found. Please generate notes first.'}), 400
+def prepare_tutor_instructions():
+    """Realtime tutor instructions for the current student and notes; None if there are no notes yet"""
+    # Get student name from session
+    student_name = session.get('student_name', 'الطالب')
+    
+    # Read the lecture content from output.txt
+    output_path = 'output.txt'
+    if not os.path.exists(output_path):
+        return None
 
-        with open(output_path, 'r', encoding='utf-8') as f:
-            lecture_content = f.read()
-        
-        # Extract key topics from lecture content using Gemini API
-        app.logger.info("Extracting key points from lecture content using Gemini API...")
-        key_topics = extract_key_topics_with_gemini(lecture_content)
-        app.logger.info(f"Extracted {len(key_topics)} key points")
-
-        # Create session with OpenAI Realtime API
-        model = app.config['OPENAI_REALTIME_MODEL']
-        voice = app.config['OPENAI_REALTIME_VOICE']
-        
-        # Read key points from the saved file
-        key_points_path = 'key_points.txt'
-        key_points_content = ""
-        
-        if os.path.exists(key_points_path):
-            app.logger.info("Reading key points from key_points.txt file")
-            with open(key_points_path, 'r', encoding='utf-8') as f:
-                key_points_content = f.read().strip()
-        else:
-            app.logger.warning("key_points.txt not found, using extracted topics directly")
-            # Fallback: use the extracted topics directly
-            key_points_content = "\n".join([f"- {topic}" for topic in key_topics])
-        
-        instructions = f"""You are an AI tutor for {student_name}. Speak only in Jordanian Arabic.
+    with open(output_path, 'r', encoding='utf-8') as f:
+        lecture_content = f.read()
+    
+    # Key points come from the local extractor (milliseconds); Gemini
+    # refines key_points.txt in the background for later sessions
+    key_topics = load_or_extract_key_points(lecture_content, output_path)
+    if app.config['KEY_POINTS_GEMINI_REFINE']:
+        refine_key_points_in_background(lecture_content)
+    
+    key_points_content = "\n".join([f"- {topic}" for topic in key_topics])
+    
+    key_points_content = budget_context(key_points_content, app.config['TUTOR_TOKEN_BUDGET'], label='tutor')
+    
+    return f"""You are an AI tutor for {student_name}. Speak only in Jordanian Arabic.
 
 Given these key points from a lecture (key_points.txt):
 {key_points_content}
@@ -353,59 +624,75 @@ Your task:
 
 Start speaking NOW."""
 
+def realtime_models():
+    """Realtime models tried in order (a model whose breaker is open is skipped)"""
+    return [app.config['OPENAI_REALTIME_MODEL'], app.config['OPENAI_REALTIME_FALLBACK_MODEL']]
+
+def realtime_session_request(using_model, instructions):
+    """URL, headers and JSON body that create an OpenAI Realtime session"""
+    url = f"{app.config['OPENAI_API_BASE'].rstrip('/')}/realtime/sessions"
+    headers = {
+        'Authorization': f"Bearer {os.getenv('OPENAI_API_KEY')}",
+        'OpenAI-Beta': 'realtime=v1',
+        'Content-Type': 'application/json',
+    }
+    body = {
+        'model': using_model,
+        'voice': app.config['OPENAI_REALTIME_VOICE'],
+        'modalities': ['text', 'audio'],
+        'instructions': instructions,
+    }
+    return url, headers, body
 
+def realtime_session_failed(e):
+    """Error response for a realtime session that could not be created"""
+    if isinstance(e, UpstreamError):
+        resp = e.result
+        app.logger.error(f'Session creation failed with status {resp.status_code}: {resp.text[:500]}')
+        try:
+            data = resp.json()
+        except Exception:
+            data = {'status_code': resp.status_code, 'text': resp.text[:400]}
+        return jsonify({'error': 'upstream_error', 'upstream': data}), 502
+    if isinstance(e, (CircuitOpenError, DeadlineExceeded)):
+        app.logger.error(f'Realtime upstream unavailable: {e}')
+        return jsonify({'error': 'upstream_unavailable', 'message': str(e)}), 503
+    app.logger.error(f'Network error creating session: {str(e)}')
+    return jsonify({'error': 'network_error', 'message': str(e)}), 502
 
-        def create_session(using_model: str):
-            return requests.post(
-                'https://api.openai.com/v1/realtime/sessions',
-                headers={
-                    'Authorization': f'Bearer {openai_api_key}',
-                    'OpenAI-Beta': 'realtime=v1',
-                    'Content-Type': 'application/json',
-                },
-                json={
-                    'model': using_model,
-                    'voice': voice,
-                    'modalities': ['text', 'audio'],
-                    'instructions': instructions,
-                },
-                timeout=20,
-            )
+@app.route('/tutor/realtime/session', methods=['POST'])
+def tutor_realtime_session():
+    """Create a session for OpenAI Realtime API for the AI Tutor"""
+    try:
+        # Check if OpenAI API key is available
+        if not os.getenv('OPENAI_API_KEY'):
+            return jsonify({'error': 'OpenAI API key not configured'}), 500
+
+        instructions = prepare_tutor_instructions()
+        if instructions is None:
+            return jsonify({'error': 'Lecture notes not found. Please generate notes first.'}), 400
 
+        def create_session(using_model: str, timeout: float):
+            url, headers, body = realtime_session_request(using_model, instructions)
+            return clients.http_session('openai').post(url, headers=headers, json=body, timeout=timeout)
+
+        # One overall deadline; a slow attempt is hedged after the endpoint's p95,
+        # and a model whose breaker is open fails over to the fallback at once
         try:
-            resp = create_session(model)
-            app.logger.info(f'Session creation response status: {resp.status_code}')
+            used_model, resp = call_with_failover(
+                create_session,
+                realtime_models(),
+                app.config['REALTIME_DEADLINE_SECONDS'],
+                hedge_after=app.config['REALTIME_HEDGE_AFTER_SECONDS'],
+                is_failure=is_upstream_failure,
+                name_prefix='realtime:',
+            )
+            app.logger.info(f'Session created with {used_model}: {resp.status_code}')
         except Exception as e:
-            app.logger.error(f'Network error creating session: {str(e)}')
-            return jsonify({'error': 'network_error', 'message': str(e)}), 502
-
-        if not resp.ok:
-            app.logger.error(f'Session creation failed with status {resp.status_code}: {resp.text[:500]}')
-            # Fallback: try alternate realtime model name if available
-            alt_model = 'gpt-4o-mini-realtime-preview'
-            if model != alt_model:
-                try:
-                    app.logger.info(f'Trying fallback model: {alt_model}')
-                    alt_resp = create_session(alt_model)
-                    if alt_resp.ok:
-                        app.logger.info('Fallback model succeeded')
-                        return jsonify(alt_resp.json())
-                    else:
-                        app.logger.error(f'Fallback model also failed: {alt_resp.status_code}: {alt_resp.text[:500]}')
-                except Exception as e:
-                    app.logger.error(f'Fallback model network error: {str(e)}')
-                    alt_resp = None
-
-            try:
-                data = resp.json()
-            except Exception:
-                data = {'status_code': resp.status_code, 'text': resp.text[:400]}
-            # Log details for debugging
-            try:
-                app.logger.error('Realtime upstream error %s: %s', resp.status_code, resp.text[:400])
-            except Exception:
-                pass
-            return jsonify({'error': 'upstream_error', 'upstream': data}), 502
+            return realtime_session_failed(e)
+        if resp.status_code >= 400:
+            # A rejected request (bad key, bad body) is not retried and does not trip the breaker
+            return realtime_session_failed(UpstreamError(f'realtime:{used_model}', resp))
 
         data = resp.json()
         # Pass through the entire session object (client_secret.value, id, etc.)
@@ -416,64 +703,58 @@ Start speaking NOW."""
         return jsonify({'error': 'Internal server error'}), 500
 
 # Quiz functionality
-def generate_quiz_questions():
-    """Generate quiz questions from lecture content using Gemini API"""
-    try:
-        from google import genai
-        
-        # Get Gemini API key
-        api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise RuntimeError("GEMINI_API_KEY not found in environment variables")
-        
-        # Initialize Gemini client
-        client = genai.Client(api_key=api_key)
-        
-        # Read lecture content
-        with open("output.txt", "r", encoding="utf-8") as f:
-            lecture_content = f.read()
-        
-        # Generate quiz questions
-        prompt = f"""
-        Based on the lecture content below, generate 5 multiple-choice questions that test understanding of the key concepts.
+def build_quiz_prompt():
+    """Quiz prompt for the current lecture notes"""
+    # Read lecture content
+    with open("output.txt", "r", encoding="utf-8") as f:
+        lecture_content = f.read()
+    
+    # Keep only the most relevant sections of long lectures
+    lecture_content = budget_context(lecture_content, app.config['PROMPT_TOKEN_BUDGET'], label='quiz')
+    
+    # Generate quiz questions
+    return f"""
+    Based on the lecture content below, generate 5 multiple-choice questions that test understanding of the key concepts.
 
-        Each question should have 4 answer options (only one correct). Questions should be in Arabic and cover different aspects of the lecture.
+    Each question should have 4 answer options (only one correct). Questions should be in Arabic and cover different aspects of the lecture.
 
-        Return the result strictly in JSON array format, where each item follows this structure:
+    Return the result strictly in JSON array format, where each item follows this structure:
 
-        {{
-          "question": "string (in Arabic)",
-          "right_answer": "string (in Arabic)",
-          "wrong_answer1": "string (in Arabic)",
-          "wrong_answer2": "string (in Arabic)",
-          "wrong_answer3": "string (in Arabic)"
-        }}
+    {{
+      "question": "string (in Arabic)",
+      "right_answer": "string (in Arabic)",
+      "wrong_answer1": "string (in Arabic)",
+      "wrong_answer2": "string (in Arabic)",
+      "wrong_answer3": "string (in Arabic)"
+    }}
 
-        ---
+    ---
 
-        lecture_content:
-        {lecture_content}
-        """
-        
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt
-        )
-        
-        quiz_json = response.text or str(response)
-        
-        # Clean up JSON if it has markdown formatting
-        if quiz_json.startswith('```json'):
-            quiz_json = quiz_json.replace('```json', '').replace('```', '').strip()
-        
-        # Parse and validate JSON
-        quiz_data = json.loads(quiz_json)
-        
-        # Save to file
-        with open("quiz.json", "w", encoding="utf-8") as f:
-            json.dump(quiz_data, f, ensure_ascii=False, indent=2)
-        
-        return quiz_data
+    lecture_content:
+    {lecture_content}
+    """
+
+def parse_quiz_questions(quiz_json):
+    """Parse Gemini's quiz answer and save it to quiz.json"""
+    # Clean up JSON if it has markdown formatting
+    if quiz_json.startswith('```json'):
+        quiz_json = quiz_json.replace('```json', '').replace('```', '').strip()
+    
+    # Parse and validate JSON
+    quiz_data = json.loads(quiz_json)
+    
+    # Save to file
+    with open("quiz.json", "w", encoding="utf-8") as f:
+        json.dump(quiz_data, f, ensure_ascii=False, indent=2)
+    
+    return quiz_data
+
+def generate_quiz_questions():
+    """Generate quiz questions from lecture content using Gemini API"""
+    try:
+        client = get_gemini_client()
+        quiz_json = generate_text(client, build_quiz_prompt(), deadline=app.config['GEMINI_DEADLINE_SECONDS'])
+        return parse_quiz_questions(quiz_json)
         
     except Exception as e:
         app.logger.error(f'Error generating quiz questions: {str(e)}')
@@ -506,29 +787,40 @@ def quiz():
     """Display the quiz page"""
     return render_template('quiz.html')
 
+def start_quiz(quiz_data):
+    """Randomize the answers, keep the quiz in the session and return it to the browser"""
+    # Randomize answers for each question
+    randomized_questions = []
+    for question in quiz_data:
+        randomized_questions.append(randomize_answers(question))
+    
+    # Store in the server-side session for scoring
+    session['quiz_questions'] = randomized_questions
+    session['quiz_answers'] = [q['correct_index'] for q in randomized_questions]
+    session['current_question'] = 0
+    session['user_answers'] = []
+    session['quiz_start_time'] = time.time()
+    session['quiz_last_answer_time'] = session['quiz_start_time']
+    session['quiz_attempt_id'] = uuid.uuid4().hex
+    # Pinned for the attempt, so a lecture uploaded mid-quiz does not take over its answers
+    session['quiz_lecture_id'] = current_lecture_id()
+    try:
+        quiz_store.get_store().start_attempt(session['quiz_attempt_id'], session['quiz_lecture_id'],
+                                             session.get('student_name'), len(randomized_questions))
+    except Exception as e:
+        app.logger.error(f'Error recording quiz attempt: {e}')
+    
+    return jsonify({
+        'success': True,
+        'total_questions': len(randomized_questions),
+        'questions': randomized_questions
+    })
+
 @app.route('/quiz/generate', methods=['POST'])
 def generate_quiz():
     """Generate quiz questions from lecture content"""
     try:
-        quiz_data = generate_quiz_questions()
-        
-        # Randomize answers for each question
-        randomized_questions = []
-        for question in quiz_data:
-            randomized_questions.append(randomize_answers(question))
-        
-        # Store in session for scoring
-        session['quiz_questions'] = randomized_questions
-        session['quiz_answers'] = [q['correct_index'] for q in randomized_questions]
-        session['current_question'] = 0
-        session['user_answers'] = []
-        session['quiz_start_time'] = time.time()
-        
-        return jsonify({
-            'success': True,
-            'total_questions': len(randomized_questions),
-            'questions': randomized_questions
-        })
+        return start_quiz(generate_quiz_questions())
         
     except Exception as e:
         app.logger.error(f'Error generating quiz: {str(e)}')
@@ -536,16 +828,31 @@ def generate_quiz():
 
 @app.route('/quiz/submit', methods=['POST'])
 def submit_quiz_answer():
-    """Submit an answer for the current question"""
+    """Submit an answer for the current question (or for question_index, when going back to a question)"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         answer_index = data.get('answer_index')
         
-        if 'user_answers' not in session:
-            session['user_answers'] = []
-        
-        session['user_answers'].append(answer_index)
-        session['current_question'] = session.get('current_question', 0) + 1
+        # Re-assign the list so the session store sees the change
+        user_answers = session.get('user_answers', [])
+        questions = session.get('quiz_questions', [])
+        question_index = data.get('question_index')
+        if question_index is None:
+            question_index = len(user_answers)
+        # type() rather than isinstance(): JSON true/false must not pass as 1/0
+        if type(question_index) is not int or not 0 <= question_index < len(questions):
+            return jsonify({'error': 'Invalid question_index'}), 400
+        if type(answer_index) is not int or not 0 <= answer_index < len(questions[question_index]['answers']):
+            return jsonify({'error': 'Invalid answer_index'}), 400
+        user_answers.extend([None] * (question_index + 1 - len(user_answers)))
+        user_answers[question_index] = answer_index
+        session['user_answers'] = user_answers
+        session['current_question'] = question_index + 1
+        
+        now = time.time()
+        seconds = now - session.get('quiz_last_answer_time', session.get('quiz_start_time', now))
+        session['quiz_last_answer_time'] = now
+        record_quiz_answer(question_index, answer_index, seconds)
         
         return jsonify({'success': True})
         
@@ -553,6 +860,19 @@ def submit_quiz_answer():
         app.logger.error(f'Error submitting answer: {str(e)}')
         return jsonify({'error': str(e)}), 500
 
+def record_quiz_answer(question_index, answer_index, seconds):
+    """Store a validated answer in the quiz attempt store (best effort, never fails the request)"""
+    questions = session.get('quiz_questions', [])
+    if 'quiz_attempt_id' not in session:
+        return
+    try:
+        quiz_store.get_store().record_answer(
+            session['quiz_attempt_id'], session.get('quiz_lecture_id', 'latest'), question_index,
+            questions[question_index]['question'], answer_index, questions[question_index]['correct_index'],
+            round(seconds, 2))
+    except Exception as e:
+        app.logger.error(f'Error recording quiz answer: {e}')
+
 @app.route('/quiz/result')
 def quiz_result():
     """Display quiz results"""
@@ -573,6 +893,11 @@ def quiz_result():
         # Calculate time taken
         start_time = session.get('quiz_start_time', time.time())
         time_taken = time.time() - start_time
+        if 'quiz_attempt_id' in session:
+            try:
+                quiz_store.get_store().finish_attempt(session['quiz_attempt_id'])
+            except Exception as e:
+                app.logger.error(f'Error finishing quiz attempt: {e}')
         
         # Determine performance level
         if score_percentage >= 80:
@@ -595,7 +920,7 @@ def quiz_result():
                 is_correct = user_answers[i] == correct_answers[i]
                 detailed_results.append({
                     'question': question['question'],
-                    'user_answer': question['answers'][user_answers[i]] if user_answers[i] < len(question['answers']) else "لم يتم الإجابة",
+                    'user_answer': question['answers'][user_answers[i]] if isinstance(user_answers[i], int) and user_answers[i] < len(question['answers']) else "لم يتم الإجابة",
                     'correct_answer': question['correct_answer'],
                     'is_correct': is_correct
                 })
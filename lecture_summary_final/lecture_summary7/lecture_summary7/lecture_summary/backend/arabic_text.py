@@ -0,0 +1,97 @@
+"""Arabic-aware text normalization, tokenization and BM25 scoring.
+
+Used by the lecture search index and anywhere else we rank sections of the
+generated notes.  English terms mixed into the Arabic text (e.g. "Regression")
+are only lower-cased, never stemmed.
+"""
+import math
+import re
+from collections import Counter
+
+# Harakat / tanween / shadda / sukun, superscript alef and Quranic marks
+_DIACRITICS = re.compile(r'[ؐ-ًؚ-ٰٟۖ-ۭ]')
+_TATWEEL = 'ـ'
+_CHAR_MAP = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه',
+    'ى': 'ي',
+    'ؤ': 'و', 'ئ': 'ي',
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+})
+_TOKEN = re.compile(r'[ء-ي]+|[A-Za-z][A-Za-z0-9\-]*|\d+')
+_ARABIC_WORD = re.compile(r'^[ء-ي]+$')
+# Definite article with optional attached conjunction/preposition
+_ARTICLE_PREFIXES = ('وال', 'بال', 'كال', 'فال', 'لل', 'ال')
+
+_RAW_STOPWORDS = """
+في من على إلى الى عن مع هذا هذه ذلك تلك التي الذي الذين هو هي هم هن أن إن ان كان كانت يكون
+و أو او ثم لا ما لم لن قد كل بعض أي اي بين عند حتى إذا اذا لكن كما أيضا ايضا بعد قبل حول
+خلال يتم تم عندما لماذا ماذا كيف هل التى هنا هناك نحن أنت انت أنا انا فقط جدا أكثر اكثر
+the a an of and or to in on for with is are was were be by as at this that it from
+"""
+
+
+def normalize_arabic(text: str) -> str:
+    """Strip diacritics/tatweel and unify alef, taa marbuta and alef maqsura variants"""
+    text = _DIACRITICS.sub('', text or '').replace(_TATWEEL, '')
+    return text.translate(_CHAR_MAP)
+
+
+def _light_stem(token: str) -> str:
+    """Drop the Arabic definite article (and its attached prefixes) when enough stem remains"""
+    for prefix in _ARTICLE_PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= 3:
+            return token[len(prefix):]
+    return token
+
+
+STOPWORDS = {normalize_arabic(w).lower() for w in _RAW_STOPWORDS.split()}
+
+
+def tokenize(text: str, keep_stopwords: bool = False):
+    """Normalize and split text into search terms"""
+    terms = []
+    for token in _TOKEN.findall(normalize_arabic(text)):
+        if _ARABIC_WORD.match(token):
+            if not keep_stopwords and token in STOPWORDS:
+                continue
+            token = _light_stem(token)
+        else:
+            token = token.lower()
+            if not keep_stopwords and token in STOPWORDS:
+                continue
+        if len(token) >= 2:
+            terms.append(token)
+    return terms
+
+
+def bm25_idf(doc_count: int, doc_freq: int) -> float:
+    """BM25 inverse document frequency (never negative)"""
+    return math.log(1 + (doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+
+
+def bm25_term_score(tf: int, idf: float, doc_len: int, avg_len: float,
+                    k1: float = 1.5, b: float = 0.75) -> float:
+    norm = k1 * (1 - b + b * doc_len / (avg_len or 1))
+    return idf * tf * (k1 + 1) / (tf + norm)
+
+
+def bm25_scores(query_terms, docs_terms, k1: float = 1.5, b: float = 0.75):
+    """Score every tokenized document against the query terms (in-memory BM25)"""
+    doc_count = len(docs_terms)
+    if not doc_count:
+        return []
+    counts = [Counter(terms) for terms in docs_terms]
+    avg_len = sum(len(terms) for terms in docs_terms) / doc_count
+    doc_freq = Counter(term for c in counts for term in c)
+
+    scores = []
+    for c, terms in zip(counts, docs_terms):
+        score = 0.0
+        for term in set(query_terms):
+            tf = c.get(term)
+            if tf:
+                score += bm25_term_score(tf, bm25_idf(doc_count, doc_freq[term]), len(terms), avg_len, k1, b)
+        scores.append(score)
+    return scores
@@ -0,0 +1,338 @@
+"""ASGI front end: upstream-bound routes on asyncio, everything else on Flask.
+
+The routes that wait on Gemini, OpenAI or the pipeline scripts are served by
+coroutines, so a slow upstream holds a suspended task instead of a worker
+thread.  They run inside a Flask request context, share the session store,
+flash messages and helpers with app.py, and only hop onto a thread for the
+short blocking parts (multipart parsing, saving the upload, indexing).  All
+other routes are passed to the Flask app through a WSGI thread pool.
+
+    python asgi.py                     # uvicorn on port 5000
+    uvicorn asgi:application --port 5000
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+from a2wsgi import WSGIMiddleware
+from flask import flash, jsonify, redirect, url_for
+
+import app as app_module
+import async_service
+import clients
+import jobs
+from app import app
+from resilience import UpstreamError, call_with_failover_async, is_upstream_failure
+
+# Request bodies above this size are spooled to disk while they stream in
+SPOOL_MAX_BYTES = 1024 * 1024
+WSGI_WORKERS = int(os.getenv('ASGI_WSGI_WORKERS', '16'))
+
+ASYNC_ROUTES = {}
+
+
+def route(path, methods=('GET',)):
+    """Register an async view for path, served on the event loop"""
+    def decorator(view):
+        for method in methods:
+            ASYNC_ROUTES[(method, path)] = view
+        return view
+    return decorator
+
+
+@route('/upload', methods=['POST'])
+async def upload_file():
+    filepath = await asyncio.to_thread(app_module.receive_lecture_upload)
+    if filepath is None:
+        return redirect(url_for('index'))
+
+    job = await asyncio.to_thread(app_module.current_job)
+    success, stdout, stderr = await async_service.run_step(job, 'transcription',
+                                                           app_module.transcription_script(), filepath)
+    return await asyncio.to_thread(app_module.finish_transcription, success, stderr)
+
+
+@route('/process')
+async def process():
+    """Process the transcribed audio and generate PDF"""
+    job = await asyncio.to_thread(app_module.current_job)
+    try:
+        for stage, script, args, failure in app_module.notes_steps():
+            success, stdout, stderr = await async_service.run_step(job, stage, script, *args)
+            if not success:
+                await asyncio.to_thread(app_module.fail_step, job, failure, stderr)
+                return redirect(url_for('index'))
+
+        await asyncio.to_thread(app_module.finish_lecture, 'Lecture notes generated successfully!')
+        return redirect(url_for('explanation'))
+
+    except Exception as e:
+        await asyncio.to_thread(job.finish, 'failed', str(e))
+        flash(f'Processing failed: {str(e)}')
+        return redirect(url_for('index'))
+
+
+@route('/upload_explanation', methods=['POST'])
+async def upload_explanation():
+    """Handle second audio upload for explanation"""
+    file = await asyncio.to_thread(app_module.uploaded_audio_file)
+    if file is None:
+        return redirect(url_for('explanation'))
+
+    job = await asyncio.to_thread(app_module.start_upload_job, 'explanation', ['transcription', 'notes', 'export'])
+    if job is None:
+        return redirect(url_for('explanation'))
+
+    await asyncio.to_thread(app_module.save_job_audio, job, file, 'explanation_input')
+
+    for stage, script, args, failure in app_module.explanation_steps():
+        success, stdout, stderr = await async_service.run_step(job, stage, script, *args)
+        if not success:
+            await asyncio.to_thread(app_module.fail_step, job, failure, stderr)
+            return redirect(url_for('explanation'))
+
+    await asyncio.to_thread(app_module.finish_lecture, 'Explanation added successfully!')
+    return redirect(url_for('explanation'))
+
+
+@route('/tutor/realtime/session', methods=['POST'])
+async def tutor_realtime_session():
+    """Create a session for OpenAI Realtime API for the AI Tutor"""
+    try:
+        if not os.getenv('OPENAI_API_KEY'):
+            return jsonify({'error': 'OpenAI API key not configured'}), 500
+
+        # File reads and key-point extraction stay off the event loop
+        instructions = await asyncio.to_thread(app_module.prepare_tutor_instructions)
+        if instructions is None:
+            return jsonify({'error': 'Lecture notes not found. Please generate notes first.'}), 400
+
+        http = clients.async_http_client('openai')
+
+        async def create_session(using_model, timeout):
+            url, headers, body = app_module.realtime_session_request(using_model, instructions)
+            return await http.post(url, headers=headers, json=body, timeout=timeout)
+
+        try:
+            used_model, resp = await call_with_failover_async(
+                create_session,
+                app_module.realtime_models(),
+                app.config['REALTIME_DEADLINE_SECONDS'],
+                hedge_after=app.config['REALTIME_HEDGE_AFTER_SECONDS'],
+                is_failure=is_upstream_failure,
+                name_prefix='realtime:',
+            )
+            app.logger.info(f'Session created with {used_model}: {resp.status_code}')
+        except Exception as e:
+            return app_module.realtime_session_failed(e)
+        if resp.status_code >= 400:
+            return app_module.realtime_session_failed(UpstreamError(f'realtime:{used_model}', resp))
+
+        return jsonify(resp.json())
+
+    except Exception as e:
+        app.logger.error(f'Error creating tutor session: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+@route('/quiz/generate', methods=['POST'])
+async def generate_quiz():
+    """Generate quiz questions from lecture content"""
+    try:
+        prompt = await asyncio.to_thread(app_module.build_quiz_prompt)
+        quiz_json = await async_service.gemini_generate(prompt, deadline=app.config['GEMINI_DEADLINE_SECONDS'])
+        return await asyncio.to_thread(lambda: app_module.start_quiz(app_module.parse_quiz_questions(quiz_json)))
+
+    except Exception as e:
+        app.logger.error(f'Error generating quiz: {str(e)}')
+        return jsonify({'error': str(e)}), 500
+
+
+async def job_events(scope, receive, send, job_id):
+    """Server-Sent Events with the progress of a job, streamed from the event loop"""
+    job = jobs.subscribe(job_id)
+    if job is None:
+        body = b'{"error": "Job not found"}'
+        await send({'type': 'http.response.start', 'status': 404,
+                    'headers': [(b'content-type', b'application/json'),
+                                (b'content-length', str(len(body)).encode('latin1'))]})
+        await send({'type': 'http.response.body', 'body': body})
+        return
+    headers = {k.decode('latin1'): v.decode('latin1') for k, v in scope.get('headers', [])}
+    query = dict(part.split('=', 1) for part in scope['query_string'].decode('latin1').split('&') if '=' in part)
+    try:
+        seq = int(headers.get('last-event-id') or query.get('after') or 0)
+    except ValueError:
+        seq = 0
+
+    async def wait_for_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    disconnected = asyncio.ensure_future(wait_for_disconnect())
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/event-stream; charset=utf-8'),
+                    (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')],
+    })
+    try:
+        while True:
+            waiting = asyncio.ensure_future(job.wait_async(seq, timeout=15))
+            await asyncio.wait({waiting, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                waiting.cancel()
+                return
+            events, finished = waiting.result()
+            if job.abandoned:
+                break  # no upload claimed it; the browser reconnects if it is still uploading
+            chunk = ''.join(jobs.format_sse(event) for event in events) or ': keep-alive\n\n'
+            await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+            if events:
+                seq = events[-1]['seq']
+            if finished and len(job.events) <= seq:
+                break
+        await send({'type': 'http.response.body', 'body': b''})
+    except OSError:
+        pass  # client went away mid-write
+    finally:
+        disconnected.cancel()
+
+
+class RequestTooLarge(Exception):
+    pass
+
+
+def _declared_length(scope):
+    for key, value in scope.get('headers', []):
+        if key == b'content-length':
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+async def _send_too_large(send):
+    message = f"Request body larger than {app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)} MB".encode('utf-8')
+    await send({'type': 'http.response.start', 'status': 413,
+                'headers': [(b'content-type', b'text/plain; charset=utf-8'),
+                            (b'content-length', str(len(message)).encode('latin1'))]})
+    await send({'type': 'http.response.body', 'body': message})
+
+
+async def _read_body(receive, max_bytes):
+    """Stream the request body into a spooled temporary file, up to max_bytes"""
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    size = 0
+    more_body = True
+    while more_body:
+        message = await receive()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if max_bytes is not None and size > max_bytes:
+            body.close()
+            raise RequestTooLarge()
+        body.write(chunk)
+        more_body = message.get('more_body', False)
+    body.seek(0)
+    return body
+
+
+def _environ(scope, body):
+    """WSGI environ for an ASGI http scope (the ASGI spec's WSGI mapping)"""
+    root_path = scope.get('root_path', '')
+    path = scope['path'][len(root_path):] if scope['path'].startswith(root_path) else scope['path']
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for key, value in scope.get('headers', []):
+        name = key.decode('latin1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        value = value.decode('latin1')
+        # Repeated headers are joined, as a WSGI server would
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+    return environ
+
+
+async def _dispatch(view, scope, receive, send):
+    """Run an async view the way Flask runs a sync one: hooks, session, response"""
+    try:
+        body = await _read_body(receive, app.config['MAX_CONTENT_LENGTH'])
+    except RequestTooLarge:
+        await _send_too_large(send)
+        return
+    try:
+        with app.request_context(_environ(scope, body)):
+            try:
+                try:
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = await view()
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                response = app.finalize_request(rv)
+            except Exception as e:
+                response = app.handle_exception(e)
+    finally:
+        body.close()
+
+    await send({
+        'type': 'http.response.start',
+        'status': response.status_code,
+        'headers': [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in response.headers.items()],
+    })
+    await send({'type': 'http.response.body', 'body': response.get_data()})
+
+
+_wsgi = WSGIMiddleware(app, workers=WSGI_WORKERS)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await clients.aclose_async_clients()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    view = ASYNC_ROUTES.get((scope['method'], scope['path'])) if scope['type'] == 'http' else None
+    max_bytes = app.config['MAX_CONTENT_LENGTH']
+    if scope['type'] == 'http' and max_bytes is not None and (_declared_length(scope) or 0) > max_bytes:
+        # Refused before anything is buffered, for the Flask routes as well
+        await _send_too_large(send)
+        return
+    parts = scope.get('path', '').split('/')
+    if scope['type'] == 'http' and len(parts) == 4 and parts[1] == 'jobs' and parts[3] == 'events':
+        await job_events(scope, receive, send, parts[2])
+    elif view is None:
+        await _wsgi(scope, receive, send)
+    else:
+        await _dispatch(view, scope, receive, send)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(application, host='0.0.0.0', port=int(os.getenv('PORT', '5000')))
@@ -0,0 +1,219 @@
+"""Fingerprinted, precompressed static assets.
+
+Build step (run before deploying / starting the app):
+
+    python assets.py
+
+- copies every file under static/ to static/dist/ with a content hash in its name
+- subsets the Amiri fonts to the Arabic + Latin ranges we use and converts them to WOFF2
+- rewrites /static/... references inside CSS to the hashed names
+- writes .gz (and .br when Brotli is installed) next to every compressible file
+- records logical name -> hashed name in static/dist/manifest.json
+
+At runtime register_assets(app) serves static/dist under /assets/ with immutable
+cache headers and picks the precompressed variant the browser accepts.  When the
+manifest has not been built, asset_url() falls back to the plain /static/ URL.
+"""
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import request, send_from_directory, url_for
+from markupsafe import Markup
+
+BACKEND_DIR = os.path.abspath(os.path.dirname(__file__))
+STATIC_DIR = os.path.join(BACKEND_DIR, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.ttf', '.html'}
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Arabic, Arabic Supplement, Arabic Presentation Forms A/B, Basic Latin,
+# Latin-1, general punctuation and the Arabic/English digits we print
+FONT_UNICODE_RANGES = (
+    '0020-007E,00A0-00FF,0600-06FF,0750-077F,08A0-08FF,'
+    'FB50-FDFF,FE70-FEFF,2000-206F,200C-200F,25CC'
+)
+
+mimetypes.add_type('font/woff2', '.woff2')
+
+_CSS_URL = re.compile(r"""url\((['"]?)/static/([^'")]+)\1\)""")
+
+
+def _hashed_name(logical_name, data, ext=None):
+    stem, original_ext = os.path.splitext(logical_name)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext or original_ext}"
+
+
+def _subset_font_to_woff2(path):
+    """Subset a TTF to FONT_UNICODE_RANGES and return WOFF2 bytes (None if fontTools/brotli missing)"""
+    try:
+        import brotli  # noqa: F401  (required by fontTools for WOFF2)
+        from fontTools import subset
+    except ImportError:
+        return None
+
+    options = subset.Options()
+    options.flavor = 'woff2'
+    options.layout_features = ['*']  # keep Arabic shaping (init/medi/fina, ligatures, marks)
+    options.name_IDs = ['*']
+    options.notdef_outline = True
+    font = subset.load_font(path, options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=subset.parse_unicodes(FONT_UNICODE_RANGES))
+    subsetter.subset(font)
+
+    out = io.BytesIO()
+    subset.save_font(font, out, options)
+    return out.getvalue()
+
+
+def _optimize_image(data, ext):
+    """Re-encode JPEG/PNG losslessly-optimized (progressive JPEG); keep the original if not smaller"""
+    try:
+        from PIL import Image
+    except ImportError:
+        print("  Pillow not installed: image optimization skipped (pip install Pillow)")
+        return data
+    img = Image.open(io.BytesIO(data))
+    out = io.BytesIO()
+    if ext in ('.jpg', '.jpeg'):
+        img.save(out, 'JPEG', quality=85, optimize=True, progressive=True)
+    else:
+        img.save(out, 'PNG', optimize=True)
+    return out.getvalue() if out.tell() < len(data) else data
+
+
+def _write_compressed(path, data):
+    with gzip.open(path + '.gz', 'wb', compresslevel=9) as f:
+        f.write(data)
+    try:
+        import brotli
+    except ImportError:
+        return
+    with open(path + '.br', 'wb') as f:
+        f.write(brotli.compress(data, quality=11))
+
+
+def _emit(manifest, logical_name, data, ext=None):
+    hashed = _hashed_name(logical_name, data, ext)
+    out_path = os.path.join(DIST_DIR, hashed)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, 'wb') as f:
+        f.write(data)
+    if os.path.splitext(hashed)[1].lower() in COMPRESSIBLE:
+        _write_compressed(out_path, data)
+    manifest[logical_name] = hashed
+    return hashed
+
+
+def build():
+    """Rebuild static/dist and its manifest from static/"""
+    if os.path.exists(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    os.makedirs(DIST_DIR)
+
+    sources = []
+    for dirpath, _, filenames in os.walk(STATIC_DIR):
+        for name in filenames:
+            sources.append(os.path.relpath(os.path.join(dirpath, name), STATIC_DIR).replace(os.sep, '/'))
+
+    manifest = {}
+    before = after = 0
+    # CSS last, so its url(...) references can point at hashed names
+    for logical_name in sorted(sources, key=lambda n: n.endswith('.css')):
+        path = os.path.join(STATIC_DIR, logical_name)
+        with open(path, 'rb') as f:
+            data = f.read()
+        before += len(data)
+
+        if logical_name.endswith('.ttf'):
+            woff2 = _subset_font_to_woff2(path)
+            if woff2 is not None:
+                data = woff2
+                hashed = _emit(manifest, logical_name, data, ext='.woff2')
+                after += len(data)
+                print(f"  {logical_name} -> {hashed} ({os.path.getsize(path) // 1024} KB -> {len(data) // 1024} KB)")
+                continue
+        elif logical_name.lower().endswith(('.jpg', '.jpeg', '.png')):
+            data = _optimize_image(data, os.path.splitext(logical_name)[1].lower())
+        elif logical_name.endswith('.css'):
+            css = data.decode('utf-8')
+            css = _CSS_URL.sub(
+                lambda m: f"url('/assets/{manifest[m.group(2)]}')" if m.group(2) in manifest else m.group(0), css)
+            data = css.encode('utf-8')
+
+        hashed = _emit(manifest, logical_name, data)
+        after += len(data)
+        print(f"  {logical_name} -> {hashed}")
+
+    with open(MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    print(f"Built {len(manifest)} assets into {DIST_DIR} ({before // 1024} KB -> {after // 1024} KB before compression)")
+    return manifest
+
+
+_manifest_cache = {'mtime': None, 'data': {}}
+
+
+def _manifest():
+    """Load the manifest, re-reading it only when the file changes"""
+    try:
+        mtime = os.path.getmtime(MANIFEST_PATH)
+    except OSError:
+        return {}
+    if _manifest_cache['mtime'] != mtime:
+        with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            _manifest_cache['data'] = json.load(f)
+        _manifest_cache['mtime'] = mtime
+    return _manifest_cache['data']
+
+
+def asset_url(filename):
+    """URL of the fingerprinted asset, or the plain static URL if not built"""
+    hashed = _manifest().get(filename)
+    if hashed:
+        return url_for('hashed_asset', filename=hashed)
+    return url_for('static', filename=filename)
+
+
+def asset_font_src(filename):
+    """CSS @font-face src value for a font, WOFF2 when the subset was built"""
+    url = asset_url(filename)
+    font_format = 'woff2' if url.endswith('.woff2') else 'truetype'
+    return Markup(f"url('{url}') format('{font_format}')")
+
+
+def hashed_asset(filename):
+    """Serve a fingerprinted asset, precompressed when the client accepts it"""
+    # Parsed tokens with q-values: "br;q=0" refuses Brotli, "*" accepts anything not listed
+    accept = request.accept_encodings
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    variants = sorted((('br', '.br'), ('gzip', '.gz')), key=lambda v: accept.quality(v[0]), reverse=True)
+    for encoding, suffix in variants:
+        if accept.quality(encoding) > 0 and os.path.exists(os.path.join(DIST_DIR, filename + suffix)):
+            response = send_from_directory(DIST_DIR, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(DIST_DIR, filename, mimetype=mimetype)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def register_assets(app):
+    """Add the /assets/ route and the asset_url / asset_font_src template helpers"""
+    app.add_url_rule('/assets/<path:filename>', 'hashed_asset', hashed_asset)
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.jinja_env.globals['asset_font_src'] = asset_font_src
+
+
+if __name__ == '__main__':
+    build()
@@ -0,0 +1,91 @@
+"""Async upstream calls for the asyncio routes in asgi.py.
+
+While a coroutine here waits on Gemini or a pipeline script, it holds no
+thread, so one process can keep thousands of these waits in flight:
+
+- gemini_generate(): Gemini generateContent over the shared httpx client,
+  with the same deadline, hedging, breakers and model failover as
+  generate_lec1.generate_text()
+- run_script() / run_step(): the transcription / note / export scripts as
+  asyncio subprocesses, with their progress lines going to the job
+"""
+import asyncio
+import os
+import sys
+
+import clients
+import jobs
+from generate_lec1 import GEMINI_DEADLINE_SECONDS, GEMINI_MODELS
+from resilience import call_with_failover_async, is_upstream_failure
+
+BACKEND_DIR = os.path.abspath(os.path.dirname(__file__))
+# transcribtion.py prints the whole transcript on one line
+STDOUT_LINE_LIMIT = 64 * 1024 * 1024
+GEMINI_API_BASE = 'https://generativelanguage.googleapis.com'
+
+
+def _response_text(data):
+    """Concatenated text parts of the first candidate of a generateContent response"""
+    candidates = data.get('candidates') or []
+    if not candidates:
+        raise RuntimeError(f"Gemini returned no candidates: {str(data)[:300]}")
+    parts = (candidates[0].get('content') or {}).get('parts') or []
+    return ''.join(part.get('text', '') for part in parts)
+
+
+async def gemini_generate(prompt, deadline=GEMINI_DEADLINE_SECONDS):
+    """Generate text for prompt with a deadline, hedging and failover across GEMINI_MODELS"""
+    api_key = os.getenv('GEMINI_API_KEY') or os.getenv('GOOGLE_API_KEY')
+    if not api_key:
+        raise RuntimeError('GEMINI_API_KEY not found in environment variables')
+    base_url = (os.getenv('GEMINI_API_BASE_URL') or GEMINI_API_BASE).rstrip('/')
+    http = clients.async_http_client('gemini')
+
+    async def call(model, timeout):
+        return await http.post(
+            f'{base_url}/v1beta/models/{model}:generateContent',
+            headers={'x-goog-api-key': api_key},
+            json={'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]},
+            timeout=timeout,
+        )
+
+    # Same upstream names as the thread-based path, so both share breakers and latency windows
+    _, response = await call_with_failover_async(call, GEMINI_MODELS, deadline, name_prefix='gemini:',
+                                                 is_failure=is_upstream_failure)
+    response.raise_for_status()  # 4xx: the request itself was rejected, not worth a retry
+    return _response_text(response.json())
+
+
+async def run_script(script_path, *args, progress=None):
+    """Run a backend script as an asyncio subprocess; returns (success, stdout, stderr).
+
+    Progress lines the script prints (jobs.report) are passed to progress as they arrive.
+    """
+    try:
+        normalized = script_path.replace('backend/', '').replace('backend\\', '')
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(BACKEND_DIR, normalized), *args,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, cwd=BACKEND_DIR,
+            limit=STDOUT_LINE_LIMIT,
+        )
+        stderr = asyncio.ensure_future(process.stderr.read())
+        stdout = []
+        async for raw in process.stdout:
+            line = raw.decode('utf-8', 'replace')
+            update = jobs.parse_progress(line)
+            if update is None:
+                stdout.append(line)
+            elif progress is not None:
+                await asyncio.to_thread(progress, update)  # records the event in SQLite
+        await process.wait()
+        return process.returncode == 0, ''.join(stdout), (await stderr).decode('utf-8', 'replace')
+    except Exception as e:
+        return False, "", str(e)
+
+
+async def run_step(job, stage, script_path, *args):
+    """run_script as one stage of a job (stage start/finish events and timings)"""
+    await asyncio.to_thread(job.start_stage, stage)
+    success, stdout, stderr = await run_script(script_path, *args, progress=job.progress)
+    await asyncio.to_thread(job.finish_stage, success, None if success else stderr[-500:])
+    return success, stdout, stderr
@@ -0,0 +1,260 @@
+"""Container/codec probing from file headers, without decoding any audio.
+
+Uploads are identified by their bytes rather than their file name, so a WAV
+renamed to .mp3 is still treated as WAV.  Recordings that Google Speech can
+take as they are (16-bit mono PCM WAV, 16/24-bit mono FLAC at 8-48 kHz) skip
+decoding entirely: WAV samples are memory-mapped and sliced, FLAC is cut on
+frame boundaries (see pcm_cache.open_audio).
+"""
+import os
+import struct
+from dataclasses import dataclass
+from typing import Optional
+
+SPEECH_MIN_RATE = 8000
+SPEECH_MAX_RATE = 48000
+HEADER_READ_BYTES = 256 * 1024
+
+_MP3_BITRATES = {  # (mpeg1, layer) -> kbps by index
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+_FLAC_BLOCK_SIZES = {1: 192, 2: 576, 3: 1152, 4: 2304, 5: 4608,
+                     8: 256, 9: 512, 10: 1024, 11: 2048, 12: 4096, 13: 8192, 14: 16384, 15: 32768}
+
+
+@dataclass
+class AudioInfo:
+    container: Optional[str]          # 'wav', 'flac', 'mp3', 'mp4' or None if unknown
+    codec: Optional[str] = None       # 'pcm_s16le', 'flac', 'mp3', 'aac', ...
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    bits_per_sample: Optional[int] = None
+    duration_ms: Optional[int] = None
+    data_offset: int = 0              # first byte of samples (WAV) / frames (FLAC)
+    data_size: Optional[int] = None
+
+    @property
+    def extension(self):
+        return {'mp4': 'm4a'}.get(self.container, self.container) or 'bin'
+
+    @property
+    def decoder_format(self):
+        """Format name for pydub/ffmpeg; None lets ffmpeg sniff the input"""
+        return self.container
+
+    @property
+    def speech_ready(self):
+        """True when the samples can go to Google Speech without decoding"""
+        if self.channels != 1 or not self.sample_rate:
+            return False
+        if not SPEECH_MIN_RATE <= self.sample_rate <= SPEECH_MAX_RATE:
+            return False
+        if self.codec == 'pcm_s16le':
+            return True
+        return self.codec == 'flac' and self.bits_per_sample in (16, 24)
+
+
+def _skip_id3(data):
+    """Length of a leading ID3v2 tag (0 if none)"""
+    if len(data) >= 10 and data[:3] == b'ID3':
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        return 10 + size + (10 if data[5] & 0x10 else 0)
+    return 0
+
+
+def _probe_wav(f, file_size):
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+        return None
+    info = AudioInfo('wav')
+    audio_format = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+        chunk_id, size = chunk[:4], struct.unpack('<I', chunk[4:])[0]
+        if chunk_id == b'fmt ':
+            fmt = f.read(size)
+            audio_format, info.channels, info.sample_rate = struct.unpack('<HHI', fmt[:8])
+            info.bits_per_sample = struct.unpack('<H', fmt[14:16])[0]
+            if audio_format == 0xFFFE and len(fmt) >= 26:  # WAVE_FORMAT_EXTENSIBLE: subformat GUID
+                audio_format = struct.unpack('<H', fmt[24:26])[0]
+            if size % 2:
+                f.seek(1, os.SEEK_CUR)
+        elif chunk_id == b'data':
+            info.data_offset = f.tell()
+            info.data_size = min(size, file_size - info.data_offset)
+            break
+        else:
+            f.seek(size + size % 2, os.SEEK_CUR)
+
+    if audio_format == 1:
+        info.codec = f"pcm_s{info.bits_per_sample}le" if info.bits_per_sample > 8 else 'pcm_u8'
+    elif audio_format == 3:
+        info.codec = f"pcm_f{info.bits_per_sample}le"
+    elif audio_format is not None:
+        info.codec = f"wav_0x{audio_format:04x}"
+    if info.data_size and info.sample_rate and info.channels and info.bits_per_sample:
+        frame_size = info.channels * info.bits_per_sample // 8
+        info.duration_ms = info.data_size // frame_size * 1000 // info.sample_rate
+    return info
+
+
+def parse_flac_streaminfo(block):
+    """(sample_rate, channels, bits_per_sample, total_samples, min_block, max_block) from STREAMINFO"""
+    min_block, max_block = struct.unpack('>HH', block[:4])
+    packed = int.from_bytes(block[10:18], 'big')
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    bits = ((packed >> 36) & 0x1F) + 1
+    total_samples = packed & 0xFFFFFFFFF
+    return sample_rate, channels, bits, total_samples, min_block, max_block
+
+
+def _probe_flac(data, file_size):
+    start = _skip_id3(data)
+    if data[start:start + 4] != b'fLaC':
+        return None
+    info = AudioInfo('flac', 'flac')
+    pos = start + 4
+    while pos + 4 <= len(data):
+        header = data[pos]
+        length = int.from_bytes(data[pos + 1:pos + 4], 'big')
+        if header & 0x7F == 0:
+            rate, channels, bits, total, _, _ = parse_flac_streaminfo(data[pos + 4:pos + 4 + length])
+            info.sample_rate, info.channels, info.bits_per_sample = rate, channels, bits
+            if total and rate:
+                info.duration_ms = total * 1000 // rate
+        pos += 4 + length
+        if header & 0x80:  # last metadata block
+            info.data_offset = pos
+            info.data_size = file_size - pos
+            break
+    return info
+
+
+def _probe_mp3(data, file_size):
+    start = _skip_id3(data)
+    for pos in range(start, min(len(data) - 4, start + 64 * 1024)):
+        if data[pos] != 0xFF or data[pos + 1] & 0xE0 != 0xE0:
+            continue
+        version = (data[pos + 1] >> 3) & 0x3
+        layer = (data[pos + 1] >> 1) & 0x3
+        bitrate_index = data[pos + 2] >> 4
+        rate_index = (data[pos + 2] >> 2) & 0x3
+        if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+            continue  # only Layer III (layer bits 01) is MP3
+        info = AudioInfo('mp3', 'mp3', _MP3_RATES[version][rate_index],
+                         1 if data[pos + 3] >> 6 == 3 else 2)
+        kbps = _MP3_BITRATES[(version == 3, 3)][bitrate_index]
+        info.data_offset = pos
+        info.duration_ms = (file_size - pos) * 8 // kbps  # exact for CBR, an estimate for VBR
+        return info
+    return AudioInfo('mp3', 'mp3') if start else None
+
+
+def _probe_mp4(data, tail):
+    if data[4:8] != b'ftyp':
+        return None
+    info = AudioInfo('mp4')
+    for blob in (data, tail):
+        for codec, fourcc in (('aac', b'mp4a'), ('alac', b'alac')):
+            i = blob.find(fourcc)
+            # AudioSampleEntry: 6 reserved, 2 data ref, 8 reserved, channels, sample size, 4 more, rate 16.16
+            if i > 0 and i + 32 <= len(blob) and struct.unpack('>I', blob[i - 4:i])[0] >= 36:
+                info.codec = codec
+                info.channels, info.bits_per_sample = struct.unpack('>HH', blob[i + 20:i + 24])
+                info.sample_rate = struct.unpack('>I', blob[i + 28:i + 32])[0] >> 16
+                return info
+    return info
+
+
+def probe(file_path):
+    """Identify container, codec and stream parameters from the file's headers"""
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        wav = _probe_wav(f, file_size)
+        if wav is not None:
+            return wav
+        f.seek(0)
+        data = f.read(HEADER_READ_BYTES)
+        tail = b''
+        if file_size > HEADER_READ_BYTES:
+            # MP4 files written without faststart keep the moov box at the end
+            f.seek(max(HEADER_READ_BYTES, file_size - 1024 * 1024))
+            tail = f.read()
+
+    for result in (_probe_flac(data, file_size), _probe_mp4(data, tail), _probe_mp3(data, file_size)):
+        if result is not None:
+            return result
+    return AudioInfo(None)
+
+
+def _crc8(data):
+    crc = 0
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+def _utf8_number(data, pos):
+    """Decode FLAC's UTF-8-style coded frame/sample number; returns (value, next_pos) or None"""
+    first = data[pos]
+    if first < 0x80:
+        return first, pos + 1
+    length = 0
+    while length < 7 and first & (0x80 >> length):
+        length += 1
+    if length < 2 or pos + length > len(data):
+        return None
+    value = first & (0x7F >> length)
+    for byte in data[pos + 1:pos + length]:
+        if byte & 0xC0 != 0x80:
+            return None
+        value = (value << 6) | (byte & 0x3F)
+    return value, pos + length
+
+
+def flac_frame_header(data, pos, max_block_size):
+    """Validate a FLAC frame header at pos; returns (first_sample, block_size) or None"""
+    if pos + 6 > len(data) or data[pos] != 0xFF or data[pos + 1] not in (0xF8, 0xF9):
+        return None
+    variable = data[pos + 1] == 0xF9
+    block_code, rate_code = data[pos + 2] >> 4, data[pos + 2] & 0x0F
+    if block_code == 0 or rate_code == 15 or (data[pos + 3] >> 4) > 10 or data[pos + 3] & 0x01:
+        return None
+    decoded = _utf8_number(data, pos + 4)
+    if decoded is None:
+        return None
+    number, end = decoded
+    if block_code == 6:
+        block_size, end = data[end] + 1, end + 1
+    elif block_code == 7:
+        block_size, end = int.from_bytes(data[end:end + 2], 'big') + 1, end + 2
+    else:
+        block_size = _FLAC_BLOCK_SIZES[block_code]
+    end += {12: 1, 13: 2, 14: 2}.get(rate_code, 0)
+    if end >= len(data) or _crc8(data[pos:end]) != data[end]:
+        return None
+    return (number if variable else number * max_block_size), block_size
+
+
+def index_flac_frames(data, start, max_block_size, min_frame_size=0):
+    """[(byte_offset, first_sample)] for every frame in data[start:]"""
+    frames = []
+    expected = 0
+    pos = data.find(b'\xff', start)
+    while pos != -1:
+        header = flac_frame_header(data, pos, max_block_size)
+        if header is not None and header[0] == expected:
+            frames.append((pos, header[0]))
+            expected = header[0] + header[1]
+            pos = data.find(b'\xff', pos + max(min_frame_size, 1))
+        else:
+            pos = data.find(b'\xff', pos + 1)
+    return frames
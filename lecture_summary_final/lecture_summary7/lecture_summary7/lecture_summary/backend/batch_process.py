@@ -0,0 +1,256 @@
+"""Batch-process a whole directory (or manifest) of lecture recordings.
+
+Usage (from the backend directory):
+
+    python batch_process.py recordings/ --out batch_output --workers 4
+    python batch_process.py lectures.txt --speech-concurrency 2 --gemini-concurrency 3
+
+Each lecture goes through the same three stages as the web app
+(transcription -> note generation -> PDF/DOCX export) and gets its own folder
+under --out.  Progress is written to a JSON manifest after every lecture, so
+re-running the same command after a crash skips everything already done.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+AUDIO_EXTENSIONS = {'mp3', 'wav', 'm4a', 'flac'}
+MANIFEST_NAME = 'batch_manifest.json'
+
+# Per-upstream semaphores, shared by every worker process (set by _init_worker)
+_upstream_limits = {}
+
+
+def _init_worker(speech_sem, gemini_sem):
+    """Install the shared upstream semaphores in a pool worker"""
+    _upstream_limits['speech'] = speech_sem
+    _upstream_limits['gemini'] = gemini_sem
+
+
+def _lecture_id(audio_path, root):
+    """Stable, filesystem-safe id for a recording (relative path + short hash)"""
+    rel = os.path.relpath(audio_path, root) if root else os.path.basename(audio_path)
+    stem = os.path.splitext(rel)[0]
+    slug = re.sub(r'[^\w\-]+', '_', stem, flags=re.UNICODE).strip('_') or 'lecture'
+    digest = hashlib.sha1(os.path.abspath(audio_path).encode('utf-8')).hexdigest()[:8]
+    return f"{slug[:60]}_{digest}"
+
+
+def discover_lectures(source):
+    """Return [(lecture_id, audio_path)] from a directory or a manifest file"""
+    if os.path.isdir(source):
+        paths = []
+        for dirpath, _, filenames in os.walk(source):
+            for name in filenames:
+                if name.rsplit('.', 1)[-1].lower() in AUDIO_EXTENSIONS:
+                    paths.append(os.path.join(dirpath, name))
+        return [(_lecture_id(p, source), p) for p in sorted(paths)]
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, 'r', encoding='utf-8') as f:
+        if source.endswith('.json'):
+            entries = json.load(f)
+            if isinstance(entries, dict):
+                entries = entries.get('lectures', [])
+        else:
+            entries = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+    lectures = []
+    for entry in entries:
+        if isinstance(entry, dict):
+            path = entry['audio']
+            lecture_id = entry.get('id')
+        else:
+            path, lecture_id = entry, None
+        if not os.path.isabs(path):
+            path = os.path.join(base, path)
+        lectures.append((lecture_id or _lecture_id(path, base), path))
+    return lectures
+
+
+def load_manifest(path):
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {'created': datetime.now().isoformat(timespec='seconds'), 'lectures': {}}
+
+
+def save_manifest(manifest, path):
+    """Write the manifest atomically so a crash never leaves it half-written"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _read_text(path):
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    return None
+
+
+def _write_text(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def process_lecture(lecture_id, audio_path, lecture_dir):
+    """Run transcription, note generation and export for one lecture.
+
+    Stage outputs already present in lecture_dir are reused, so a lecture that
+    crashed half-way only redoes the stages it had not finished.
+    """
+    # Imported here so the parent process stays light and every worker
+    # builds its own upstream clients.
+    import transcribtion
+    import generate_lec1
+    import document_export
+    import search_index
+
+    os.makedirs(lecture_dir, exist_ok=True)
+    timings = {}
+    input_path = os.path.join(lecture_dir, 'input.txt')
+    output_path = os.path.join(lecture_dir, 'output.txt')
+
+    transcript = _read_text(input_path)
+    if transcript is None:
+        started = time.time()
+        with _upstream_limits['speech']:
+            transcript = transcribtion.transcribe_long_arabic_audio(
+                audio_path, "ar-JO", chunk_dir=lecture_dir)
+        if not transcript:
+            raise RuntimeError('Transcription returned no text')
+        _write_text(input_path, transcript)
+        timings['transcribe'] = round(time.time() - started, 2)
+
+    notes = _read_text(output_path)
+    if notes is None:
+        started = time.time()
+        with _upstream_limits['gemini']:
+            notes = generate_lec1.generate_notes(transcript)
+        _write_text(output_path, notes)
+        timings['generate'] = round(time.time() - started, 2)
+
+    started = time.time()
+    docx_path, pdf_path = document_export.export_documents(notes, lecture_dir)
+    timings['export'] = round(time.time() - started, 2)
+
+    started = time.time()
+    search_index.get_index().index_lecture(lecture_id, notes, transcript)
+    timings['index'] = round(time.time() - started, 2)
+
+    return {
+        'timings': timings,
+        'audio_bytes': os.path.getsize(audio_path),
+        'transcript_chars': len(transcript),
+        'outputs': {'input': input_path, 'output': output_path, 'docx': docx_path, 'pdf': pdf_path},
+    }
+
+
+def _is_done(entry):
+    return (entry.get('status') == 'done'
+            and all(os.path.exists(p) for p in entry.get('outputs', {}).values()))
+
+
+def print_summary(results, skipped, wall_time):
+    done = [r for r in results if r['status'] == 'done']
+    failed = [r for r in results if r['status'] == 'failed']
+
+    print("\n📊 Batch summary")
+    print(f"   Processed: {len(done)}   Failed: {len(failed)}   Skipped (already done): {skipped}")
+    print(f"   Wall time: {wall_time:.1f}s")
+    if done and wall_time > 0:
+        print(f"   Throughput: {len(done) / wall_time * 3600:.1f} lectures/hour")
+        audio_mb = sum(r['audio_bytes'] for r in done) / (1024 * 1024)
+        print(f"   Audio ingested: {audio_mb:.1f} MB ({audio_mb / wall_time * 60:.1f} MB/min)")
+
+        stage_totals = {}
+        for r in done:
+            for stage, seconds in r['timings'].items():
+                stage_totals.setdefault(stage, []).append(seconds)
+        busy = 0.0
+        for stage, values in stage_totals.items():
+            busy += sum(values)
+            print(f"   {stage:<10} mean {sum(values) / len(values):7.1f}s   total {sum(values):8.1f}s")
+        print(f"   Effective parallelism: {busy / wall_time:.2f}x")
+    for r in failed:
+        print(f"   ❌ {r['id']}: {r['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Batch-process lecture recordings into notes and PDFs.')
+    parser.add_argument('source', help='Directory of recordings, or a .txt/.json manifest of audio paths')
+    parser.add_argument('--out', default='batch_output', help='Output directory (one folder per lecture)')
+    parser.add_argument('--manifest', help=f'Progress manifest path (default: <out>/{MANIFEST_NAME})')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='Process pool size')
+    parser.add_argument('--speech-concurrency', type=int, default=2,
+                        help='Max lectures transcribing with Google Speech at once')
+    parser.add_argument('--gemini-concurrency', type=int, default=3,
+                        help='Max lectures generating notes with Gemini at once')
+    parser.add_argument('--retry-failed', action='store_true', help='Also retry lectures marked as failed')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+    manifest_path = args.manifest or os.path.join(args.out, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+
+    lectures = discover_lectures(args.source)
+    if not lectures:
+        print(f"Error: no audio files found in {args.source}")
+        return 1
+
+    pending = []
+    skipped = 0
+    for lecture_id, audio_path in lectures:
+        entry = manifest['lectures'].setdefault(lecture_id, {'audio': audio_path, 'status': 'pending'})
+        if _is_done(entry) or (entry.get('status') == 'failed' and not args.retry_failed):
+            skipped += 1
+            continue
+        entry['status'] = 'pending'
+        pending.append((lecture_id, audio_path))
+    save_manifest(manifest, manifest_path)
+
+    print(f"🎓 {len(lectures)} lectures found, {len(pending)} to process, {skipped} skipped")
+
+    ctx = multiprocessing.get_context('spawn')
+    speech_sem = ctx.BoundedSemaphore(max(1, args.speech_concurrency))
+    gemini_sem = ctx.BoundedSemaphore(max(1, args.gemini_concurrency))
+
+    results = []
+    started = time.time()
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), mp_context=ctx,
+                             initializer=_init_worker, initargs=(speech_sem, gemini_sem)) as pool:
+        futures = {
+            pool.submit(process_lecture, lecture_id, audio_path, os.path.join(args.out, lecture_id)): lecture_id
+            for lecture_id, audio_path in pending
+        }
+        for n, future in enumerate(as_completed(futures), 1):
+            lecture_id = futures[future]
+            entry = manifest['lectures'][lecture_id]
+            entry['finished'] = datetime.now().isoformat(timespec='seconds')
+            try:
+                result = future.result()
+                entry.update(status='done', error=None, **result)
+                print(f"✅ [{n}/{len(futures)}] {lecture_id} {result['timings']}")
+            except Exception as e:
+                result = {}
+                entry.update(status='failed', error=str(e))
+                print(f"❌ [{n}/{len(futures)}] {lecture_id}: {e}")
+            results.append({'id': lecture_id, 'status': entry['status'], 'error': entry.get('error'),
+                            'timings': result.get('timings', {}), 'audio_bytes': result.get('audio_bytes', 0)})
+            save_manifest(manifest, manifest_path)
+
+    print_summary(results, skipped, time.time() - started)
+    return 0 if all(r['status'] == 'done' for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""Process-wide registry of upstream clients.
+
+Each client is built once per process on first use and then shared, so a
+request only pays for the request itself:
+
+- http_session(name): a requests.Session per upstream with a keep-alive
+  connection pool (UPSTREAM_HTTP_POOL_MAXSIZE connections per host)
+- gemini_client(): one google.genai client; SDK versions that open a new
+  requests.Session per call are routed through http_session('gemini'),
+  with the timeout set by request_timeout() (so an abandoned hedged
+  attempt cannot hold its worker thread forever)
+- speech_client(): Google Speech clients over SPEECH_GRPC_CHANNELS gRPC
+  channels, handed out round-robin
+- async_http_client(name): an httpx.AsyncClient per upstream and event loop
+  for the asyncio routes in asgi.py; up to UPSTREAM_ASYNC_MAX_CONNECTIONS
+  requests are in flight at once and further ones wait for a connection
+
+The registry is reset after a fork, so batch workers build their own
+connections instead of sharing the parent's sockets.
+"""
+import contextlib
+import inspect
+import itertools
+import json
+import os
+import threading
+
+HTTP_POOL_CONNECTIONS = int(os.getenv('UPSTREAM_HTTP_POOL_CONNECTIONS', '4'))
+HTTP_POOL_MAXSIZE = int(os.getenv('UPSTREAM_HTTP_POOL_MAXSIZE', '16'))
+SPEECH_GRPC_CHANNELS = max(1, int(os.getenv('SPEECH_GRPC_CHANNELS', '1')))
+ASYNC_MAX_CONNECTIONS = int(os.getenv('UPSTREAM_ASYNC_MAX_CONNECTIONS', '1000'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_HTTP_CONNECT_TIMEOUT_SECONDS', '10'))
+HTTP_READ_TIMEOUT = float(os.getenv('UPSTREAM_HTTP_READ_TIMEOUT_SECONDS', '300'))
+# google.genai releases whose private _request_unauthorized(http_request, stream) we know how to replace
+POOLED_GENAI_VERSIONS = ('0.2.', '0.3.')
+
+_lock = threading.RLock()
+_pid = None
+_sessions = {}
+_gemini = {}
+_speech = []
+_speech_counter = itertools.count()
+_speech_calls = 0
+_async_clients = {}
+_async_requests = {}
+_call_timeout = threading.local()
+
+
+def _check_fork():
+    """Forget clients inherited from a parent process (sockets must not be shared)"""
+    global _pid, _speech_counter, _speech_calls
+    if _pid != os.getpid():
+        _pid = os.getpid()
+        _sessions.clear()
+        _gemini.clear()
+        _speech.clear()
+        _async_clients.clear()
+        _async_requests.clear()
+        _speech_counter = itertools.count()
+        _speech_calls = 0
+
+
+def http_session(name):
+    """Shared requests.Session for one upstream, with a keep-alive connection pool"""
+    with _lock:
+        _check_fork()
+        session = _sessions.get(name)
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[name] = session
+        return session
+
+
+@contextlib.contextmanager
+def request_timeout(seconds):
+    """Read timeout for pooled SDK requests made by this thread inside the block"""
+    previous = getattr(_call_timeout, 'seconds', None)
+    _call_timeout.seconds = seconds
+    try:
+        yield
+    finally:
+        _call_timeout.seconds = previous
+
+
+def _route_through_session(api_client, session):
+    """Send the SDK's API-key requests through a pooled session; False if the SDK does not need it"""
+    try:
+        from google import genai
+        from google.genai import _api_client, errors
+        if not hasattr(_api_client, 'requests') or not hasattr(api_client, '_request_unauthorized'):
+            return False  # newer SDKs keep their own persistent HTTP client
+        version = getattr(genai, '__version__', '')
+        params = list(inspect.signature(api_client._request_unauthorized).parameters)
+        if not version.startswith(POOLED_GENAI_VERSIONS) or params != ['http_request', 'stream']:
+            print(f"Warning: google-genai {version or '?'} not known to the connection pool hook, "
+                  f"using the SDK's own HTTP handling")
+            return False
+        encoder, http_response = _api_client.RequestJsonEncoder, _api_client.HttpResponse
+    except (ImportError, AttributeError, TypeError, ValueError):
+        return False
+
+    def request_unauthorized(http_request, stream=False):
+        data = http_request.data
+        if data and not isinstance(data, bytes):
+            data = json.dumps(data, cls=encoder)
+        read_timeout = getattr(_call_timeout, 'seconds', None) or HTTP_READ_TIMEOUT
+        response = session.request(http_request.method, http_request.url, headers=http_request.headers,
+                                   data=data or None, stream=stream,
+                                   timeout=(min(HTTP_CONNECT_TIMEOUT, read_timeout), read_timeout))
+        errors.APIError.raise_for_response(response)
+        return http_response(response.headers, response if stream else [response.text])
+
+    api_client._request_unauthorized = request_unauthorized
+    return True
+
+
+def gemini_client():
+    """Shared Gemini client from GEMINI_API_KEY / GOOGLE_API_KEY; google.genai is imported on first use"""
+    with _lock:
+        _check_fork()
+        if 'client' not in _gemini:
+            api_key = os.getenv('GEMINI_API_KEY') or os.getenv('GOOGLE_API_KEY')
+            if not api_key:
+                raise RuntimeError('GEMINI_API_KEY not found in environment variables')
+            from google import genai
+
+            # GEMINI_API_BASE_URL points the client at a local stand-in during load tests
+            base_url = os.getenv('GEMINI_API_BASE_URL')
+            client = genai.Client(api_key=api_key, http_options={'base_url': base_url} if base_url else None)
+            _gemini['pooled'] = _route_through_session(client._api_client, http_session('gemini'))
+            _gemini['client'] = client
+        return _gemini['client']
+
+
+def speech_client():
+    """Shared Google Speech client; calls are spread round-robin over SPEECH_GRPC_CHANNELS channels"""
+    global _speech_calls
+    with _lock:
+        _check_fork()
+        if not _speech:
+            from google.cloud import speech_v1p1beta1 as speech
+            _speech.extend(speech.SpeechClient() for _ in range(SPEECH_GRPC_CHANNELS))
+        _speech_calls += 1
+        return _speech[next(_speech_counter) % len(_speech)]
+
+
+def async_http_client(name):
+    """Shared httpx.AsyncClient for one upstream on the running event loop"""
+    import asyncio
+    loop = asyncio.get_running_loop()
+    with _lock:
+        _check_fork()
+        client = _async_clients.get((name, loop))
+        if client is None:
+            import httpx
+
+            async def count_request(request):
+                _async_requests[name] = _async_requests.get(name, 0) + 1
+
+            limits = httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS, max_keepalive_connections=HTTP_POOL_MAXSIZE)
+            client = httpx.AsyncClient(limits=limits, event_hooks={'request': [count_request]})
+            _async_clients[(name, loop)] = client
+        return client
+
+
+async def aclose_async_clients():
+    """Close the async clients of the running event loop (ASGI shutdown)"""
+    import asyncio
+    loop = asyncio.get_running_loop()
+    with _lock:
+        closing = [_async_clients.pop(key) for key in list(_async_clients) if key[1] is loop]
+    for client in closing:
+        await client.aclose()
+
+
+def _http_pool_stats(session):
+    hosts = {}
+    adapter = session.get_adapter('https://')
+    pools = adapter.poolmanager.pools
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        hosts[f'{pool.scheme}://{pool.host}:{pool.port}'] = {
+            'connections_opened': pool.num_connections,
+            'requests': pool.num_requests,
+        }
+    return {'pool_maxsize': HTTP_POOL_MAXSIZE, 'hosts': hosts}
+
+
+def pool_stats():
+    """Which clients exist in this process and how much their connections are reused"""
+    with _lock:
+        _check_fork()
+        sessions = dict(_sessions)
+        stats = {
+            'pid': _pid,
+            'gemini': {'created': 'client' in _gemini, 'pooled_http': _gemini.get('pooled', False)},
+            'speech': {'channels': len(_speech), 'configured_channels': SPEECH_GRPC_CHANNELS,
+                       'calls': _speech_calls},
+        }
+        stats['async_http'] = {name: {'max_connections': ASYNC_MAX_CONNECTIONS, 'requests': _async_requests.get(name, 0)}
+                               for name, _ in _async_clients}
+    stats['http'] = {name: _http_pool_stats(session) for name, session in sessions.items()}
+    return stats
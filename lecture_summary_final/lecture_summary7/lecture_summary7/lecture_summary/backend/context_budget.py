@@ -0,0 +1,124 @@
+"""Token-budgeted context selection for Gemini / Realtime prompts.
+
+Long lectures used to be pasted into prompts in full.  budget_context() keeps
+the whole text when it fits the budget; otherwise it ranks the parsed note
+sections with BM25 (against a query, or against the lecture's own most
+characteristic terms) and keeps the best ones, in their original order, until
+the budget is used up.  Every call is recorded so we can see the savings.
+"""
+import os
+import threading
+import time
+from collections import Counter, deque
+
+from arabic_text import bm25_idf, bm25_scores, tokenize
+from document_export import split_sections
+
+# Rough chars-per-token for mixed Arabic/English text; good enough for budgeting
+CHARS_PER_TOKEN = float(os.getenv('CONTEXT_CHARS_PER_TOKEN', '3.0'))
+DEFAULT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '6000'))
+CENTROID_TERMS = 25
+
+_stats_lock = threading.Lock()
+_recent_calls = deque(maxlen=200)
+_totals = {'calls': 0, 'trimmed_calls': 0, 'tokens_in': 0, 'tokens_out': 0}
+
+
+def count_tokens(text):
+    """Approximate token count of a prompt fragment"""
+    return int(len(text or '') / CHARS_PER_TOKEN) + 1
+
+
+def _units(text, budget):
+    """Split text into rankable (heading, body) units no larger than a quarter of the budget"""
+    max_unit = max(budget // 4, 1)
+    units = []
+    for sec in split_sections(text):
+        lines = list(sec.body_lines)
+        part, part_tokens = [], count_tokens(sec.heading)
+        for line in lines:
+            line_tokens = count_tokens(line)
+            if part and part_tokens + line_tokens > max_unit:
+                units.append((sec.heading, part))
+                part, part_tokens = [], count_tokens(sec.heading)
+            part.append(line)
+            part_tokens += line_tokens
+        if part:
+            units.append((sec.heading, part))
+    return units
+
+
+def _centroid_query(docs_terms):
+    """The lecture's most characteristic terms (summed tf * idf across units)"""
+    doc_count = len(docs_terms)
+    doc_freq = Counter(term for terms in docs_terms for term in set(terms))
+    weights = Counter()
+    for terms in docs_terms:
+        for term, tf in Counter(terms).items():
+            weights[term] += tf * bm25_idf(doc_count, doc_freq[term])
+    return [term for term, _ in weights.most_common(CENTROID_TERMS)]
+
+
+def _render(heading, lines):
+    if heading == "المحتوى":  # split_sections' placeholder for text without headings
+        return '\n'.join(lines)
+    return f"**{heading}**\n" + '\n'.join(lines)
+
+
+def budget_context(text, budget_tokens=None, query=None, label='prompt'):
+    """Return text trimmed to the most relevant sections that fit budget_tokens"""
+    budget = budget_tokens or DEFAULT_TOKEN_BUDGET
+    started = time.perf_counter()
+    tokens_in = count_tokens(text)
+
+    if tokens_in <= budget:
+        selected = text
+    else:
+        units = _units(text, budget)
+        docs_terms = [tokenize(heading + '\n' + '\n'.join(lines)) for heading, lines in units]
+        query_terms = tokenize(query) if query else _centroid_query(docs_terms)
+        scores = bm25_scores(query_terms, docs_terms)
+
+        chosen, used = set(), 0
+        for i in sorted(range(len(units)), key=lambda i: scores[i], reverse=True):
+            cost = count_tokens(_render(*units[i]))
+            if used + cost <= budget:
+                chosen.add(i)
+                used += cost
+        # Keep the lecture's original order so the prompt still reads naturally
+        selected = '\n\n'.join(_render(*units[i]) for i in sorted(chosen))
+        if not selected:
+            selected = text[:int(budget * CHARS_PER_TOKEN)]
+
+    tokens_out = count_tokens(selected)
+    _record(label, tokens_in, tokens_out, budget, time.perf_counter() - started)
+    return selected
+
+
+def _record(label, tokens_in, tokens_out, budget, seconds):
+    entry = {
+        'label': label,
+        'tokens_in': tokens_in,
+        'tokens_out': tokens_out,
+        'tokens_saved': tokens_in - tokens_out,
+        'budget': budget,
+        'select_ms': round(seconds * 1000, 2),
+        'at': time.time(),
+    }
+    with _stats_lock:
+        _recent_calls.append(entry)
+        _totals['calls'] += 1
+        _totals['trimmed_calls'] += tokens_out < tokens_in
+        _totals['tokens_in'] += tokens_in
+        _totals['tokens_out'] += tokens_out
+    if tokens_out < tokens_in:
+        print(f"✂️ Context budget [{label}]: {tokens_in} -> {tokens_out} tokens "
+              f"(saved {tokens_in - tokens_out}, budget {budget})")
+
+
+def get_budget_stats():
+    """Totals plus the most recent calls, newest last"""
+    with _stats_lock:
+        totals = dict(_totals)
+        totals['tokens_saved'] = totals['tokens_in'] - totals['tokens_out']
+        return {'totals': totals, 'recent': list(_recent_calls)}
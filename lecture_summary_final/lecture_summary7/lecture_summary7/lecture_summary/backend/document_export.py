@@ -3,19 +3,7 @@
 
 
 # %% In[1]
-from docx import Document
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.enums import TA_RIGHT
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 import os
-from bidi.algorithm import get_display
 import sys
 
 # Ensure console output uses UTF-8 (avoids Windows cp1252 errors)
@@ -28,35 +16,22 @@ except Exception:
     pass
 
 # %% In[2]
-import os, re
+import re
 from dataclasses import dataclass
 from typing import List
 from pathlib import Path
 from html import escape
 
-# Word
-from docx import Document
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
-
-# PDF
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.enums import TA_RIGHT
-
-# Arabic shaping for PDF
-import arabic_reshaper
-from bidi.algorithm import get_display
+# python-docx, reportlab and the Arabic shaping libraries are imported inside
+# the export functions: the web app and search only need the parsers below,
+# and loading the exporters costs about a third of a second at startup.
 
 def ar_text(s: str) -> str:
+    import arabic_reshaper
+    from bidi.algorithm import get_display
     return escape(get_display(arabic_reshaper.reshape(s or "")))
 
 OUT_DIR = Path("generated_documents")
-OUT_DIR.mkdir(parents=True, exist_ok=True)
 
 def pick_arabic_font() -> str:
     candidates = [
@@ -72,7 +47,6 @@ def pick_arabic_font() -> str:
     return ""
 
 AR_FONT_PATH = pick_arabic_font()
-print("Using font:", AR_FONT_PATH if AR_FONT_PATH else "(fallback)")
 
 # %% In[3]
 @dataclass
@@ -170,18 +144,49 @@ def parse_text_to_model(text: str) -> DocumentModel:
     # fallback to legacy
     return parse_legacy_to_model(text)
 
-# %% In[4]
-from docx import Document
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
+_md_bold_line = re.compile(r'^\s{0,3}([*\-]\s+)?\*\*([^*]+?)\*\*\s*:?\s*$')
 
+def split_sections(text: str) -> List[Section]:
+    """
+    Finer-grained split used for search and ranking (not for export): every
+    Markdown heading or whole-line **bold** title starts a new section, and
+    bulleted bold titles are prefixed with the chapter they belong to.
+    """
+    sections: List[Section] = []
+    chapter = ""
+    heading = "المحتوى"
+    body: List[str] = []
+    for raw in text.splitlines():
+        if not raw.strip():
+            continue
+        mh = _md_heading.match(raw)
+        mb = None if mh else _md_bold_line.match(raw)
+        if mh or mb:
+            if body:
+                sections.append(Section(heading, body))
+            body = []
+            title = _strip_md_inline(mh.group(2) if mh else mb.group(2)).rstrip(':').strip()
+            if mh or not mb.group(1):
+                chapter = heading = title
+            else:
+                heading = f"{chapter} - {title}" if chapter else title
+            continue
+        mul = _md_ul.match(raw) or _md_ol.match(raw)
+        body.append("- " + _strip_md_inline(mul.group(2)) if mul else _strip_md_inline(raw))
+    if body:
+        sections.append(Section(heading, body))
+    return sections
+
+# %% In[4]
 def set_paragraph_rtl_and_alignment(paragraph, alignment):
     """
     Sets the paragraph's direction to Right-to-Left (RTL) and its
     alignment to the specified value (e.g., WD_ALIGN_PARAGRAPH.RIGHT).
     This simulates the Ctrl+R shortcut for all text.
     """
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+
     p = paragraph._p
     pPr = p.get_or_add_pPr()
 
@@ -195,7 +200,9 @@ def set_paragraph_rtl_and_alignment(paragraph, alignment):
     paragraph.alignment = alignment
 
 def generate_docx_from_model(model: DocumentModel, output_path: str):
-   
+    from docx import Document
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+
     doc = Document()
 
     # Create the main title as a heading (level 1)
@@ -228,6 +235,13 @@ def generate_docx_from_model(model: DocumentModel, output_path: str):
 
 # %% In[5]
 def generate_pdf_from_model(model: DocumentModel, output_path: str, font_path: str = AR_FONT_PATH):
+    from reportlab.lib.enums import TA_RIGHT
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
     if font_path and os.path.exists(font_path):
         try:
             pdfmetrics.registerFont(TTFont("AR", font_path))
@@ -266,17 +280,28 @@ def generate_pdf_from_model(model: DocumentModel, output_path: str, font_path: s
 
 INPUT_PATH = "output.txt"
 
-if not os.path.exists(INPUT_PATH):
-    raise FileNotFoundError(f"Input file not found: {INPUT_PATH}")
+def export_documents(raw_text: str, out_dir=OUT_DIR):
+    """Parse the generated notes and write final_document.docx/.pdf into out_dir"""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    model = parse_text_to_model(raw_text)
+
+    docx_path = str(out_dir / "final_document.docx")
+    pdf_path  = str(out_dir / "final_document.pdf")
+
+    generate_docx_from_model(model, docx_path)
+    generate_pdf_from_model(model, pdf_path)
+    return docx_path, pdf_path
 
-with open(INPUT_PATH, "r", encoding="utf-8") as f:
-    raw_text = f.read()
+if __name__ == "__main__":
+    print("Using font:", AR_FONT_PATH if AR_FONT_PATH else "(fallback)")
 
-model = parse_text_to_model(raw_text)
+    if not os.path.exists(INPUT_PATH):
+        raise FileNotFoundError(f"Input file not found: {INPUT_PATH}")
 
-docx_path = str(OUT_DIR / "final_document.docx")
-pdf_path  = str(OUT_DIR / "final_document.pdf")
+    with open(INPUT_PATH, "r", encoding="utf-8") as f:
+        raw_text = f.read()
 
-generate_docx_from_model(model, docx_path)
-generate_pdf_from_model(model, pdf_path)
-print("Done.")
+    export_documents(raw_text)
+    print("Done.")
@@ -1,8 +1,10 @@
 import os
 from dotenv import load_dotenv
-from google import genai
 import sys
 
+import clients
+from resilience import call_with_failover
+
 # Ensure console output uses UTF-8 (avoids Windows cp1252 errors)
 try:
     if hasattr(sys.stdout, "reconfigure"):
@@ -15,23 +17,43 @@ except Exception:
 # تحميل متغيرات البيئة من .env
 load_dotenv()
 
-# قراءة الـ API Key
-api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+# Models tried in order; a model whose circuit breaker is open is skipped at once
+GEMINI_MODELS = [m for m in (os.getenv("GEMINI_MODEL", "gemini-2.0-flash"),
+                             os.getenv("GEMINI_FALLBACK_MODEL", "gemini-1.5-flash")) if m]
+GEMINI_DEADLINE_SECONDS = float(os.getenv("GEMINI_DEADLINE_SECONDS", "180"))
+
+
+def get_gemini_client():
+    """Shared Gemini client from GEMINI_API_KEY / GOOGLE_API_KEY (one per process)"""
+    if not (os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")):
+        raise RuntimeError(
+            "خطأ: ما في API key. ضعي GEMINI_API_KEY في ملف .env أو عيّني المتغير في النظام."
+        )
+    # العميل يُنشأ مرة واحدة ويعيد استخدام الاتصالات (clients.py)
+    return clients.gemini_client()
+
 
-if not api_key:
-    raise RuntimeError(
-        "خطأ: ما في API key. ضعي GEMINI_API_KEY في ملف .env أو عيّني المتغير في النظام."
-    )
+def is_rejected_request(error):
+    """Gemini 4xx errors (bad key, invalid or oversized prompt) blame the request, not the model; 429 still fails over"""
+    from google.genai import errors
+    return isinstance(error, errors.ClientError) and error.code != 429
 
-# تهيئة عميل Gemini
-client = genai.Client(api_key=api_key)
 
-# قراءة نص المحاضرة
-with open("input.txt", "r", encoding="utf-8") as f:
-    short_text = f.read()
+def generate_text(client, contents, deadline=GEMINI_DEADLINE_SECONDS):
+    """generate_content with a deadline, hedging after p95 and failover across GEMINI_MODELS"""
+    def generate(model, timeout):
+        with clients.request_timeout(timeout):
+            return client.models.generate_content(model=model, contents=contents)
 
-# إعداد Prompt قوي ومنسق لتنظيم النص كملاحظات محاضرة
-prompt = f"""
+    _, response = call_with_failover(generate, GEMINI_MODELS, deadline, name_prefix="gemini:",
+                                     is_rejection=is_rejected_request)
+    return response.text or str(response)
+
+
+def build_notes_prompt(short_text):
+    """Build the lecture-notes prompt for a transcript"""
+    # إعداد Prompt قوي ومنسق لتنظيم النص كملاحظات محاضرة
+    return f"""
 أنت مساعد ذكي لتنظيم الملاحظات الدراسية. حول النص التالي إلى ملاحظات محاضرة منظمة بحيث:
 
 1. تقسيم النص لأقسام وفصول
@@ -47,18 +69,81 @@ prompt = f"""
 المخرجات المطلوبة: ملاحظات منظمة وجاهزة للدراسة
 """
 
-# توليد النص النهائي
-try:
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=prompt
-    )
-    final_text = response.text or str(response)
-except Exception as e:
-    raise RuntimeError(f"خطأ أثناء توليد النص: {e}")
-
-# حفظ الناتج في output.txt
-with open("output.txt", "w", encoding="utf-8") as f:
-    f.write(final_text)
-
-print("تمت المعالجة. الملف الناتج موجود باسم: output.txt")
\ No newline at end of file
+
+def generate_notes(short_text, client=None):
+    """Turn a raw transcript into organized lecture notes with Gemini"""
+    client = client or get_gemini_client()
+
+    # توليد النص النهائي
+    try:
+        return generate_text(client, build_notes_prompt(short_text))
+    except Exception as e:
+        raise RuntimeError(f"خطأ أثناء توليد النص: {e}")
+
+
+def build_segment_prompt(segment_text, segment_number):
+    """Prompt for notes on one part of a lecture that is still being transcribed"""
+    return f"""
+أنت مساعد ذكي لتنظيم الملاحظات الدراسية. النص التالي هو الجزء رقم {segment_number} من محاضرة أطول.
+حوله إلى ملاحظات منظمة بحيث:
+
+1. تقسيم النص لأقسام مع عنوان واضح لكل قسم
+2. كتابة نقاط أساسية لكل فكرة
+3. إضافة أمثلة وشروح عند الحاجة
+4. الحفاظ على الكلمات الإنجليزية كما هي
+5. لا تكتب مقدمة أو خاتمة للمحاضرة كاملة، فقط ملاحظات هذا الجزء
+
+النص الأصلي:
+{segment_text}
+"""
+
+
+def generate_segment_notes(segment_text, segment_number, client=None):
+    """Generate notes for one transcript segment (pipelined mode)"""
+    client = client or get_gemini_client()
+    try:
+        return generate_text(client, build_segment_prompt(segment_text, segment_number))
+    except Exception as e:
+        raise RuntimeError(f"خطأ أثناء توليد ملاحظات الجزء {segment_number}: {e}")
+
+
+def merge_segment_notes(segment_notes, client=None):
+    """Merge per-segment notes into one organized lecture document"""
+    client = client or get_gemini_client()
+    parts = "\n\n".join(f"--- الجزء {n} ---\n{notes}" for n, notes in enumerate(segment_notes, 1))
+    prompt = f"""
+أنت مساعد ذكي لتنظيم الملاحظات الدراسية. هذه ملاحظات أجزاء متتالية من نفس المحاضرة.
+ادمجها في ملاحظات محاضرة واحدة منظمة بحيث:
+
+1. عنوان رئيسي واحد للمحاضرة ثم أقسام وفصول مرتبة
+2. دمج الأقسام المكررة أو المتداخلة بين الأجزاء
+3. الحفاظ على كل النقاط والأمثلة المهمة
+4. الحفاظ على الكلمات الإنجليزية كما هي
+
+ملاحظات الأجزاء:
+{parts}
+
+المخرجات المطلوبة: ملاحظات منظمة وجاهزة للدراسة
+"""
+    try:
+        return generate_text(client, prompt)
+    except Exception as e:
+        raise RuntimeError(f"خطأ أثناء دمج الملاحظات: {e}")
+
+
+def main(input_path="input.txt", output_path="output.txt"):
+    # قراءة نص المحاضرة
+    with open(input_path, "r", encoding="utf-8") as f:
+        short_text = f.read()
+
+    final_text = generate_notes(short_text)
+
+    # حفظ الناتج في output.txt
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(final_text)
+
+    print("تمت المعالجة. الملف الناتج موجود باسم: output.txt")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+"""Progress events and per-stage timings of pipeline jobs.
+
+A job is one run of an upload through the pipeline (upload, transcription,
+notes, export).  The upload page picks the job ID and subscribes to
+/jobs/<id>/events (Server-Sent Events) before it submits the form, so the
+student sees every stage start and finish, chunk-level transcription
+progress ("chunk 37/108"), the elapsed time and an estimate of what is left.
+
+Pipeline scripts report progress by printing report() lines; run_script()
+picks them out of the child's stdout and hands them to Job.progress().
+
+Every event and the start, end and duration of each stage are written to
+processed/jobs.sqlite3, which also feeds the estimates: a stage that has
+not started yet is expected to take the median of its recent durations,
+scaled by the audio length when both are known.
+
+    python jobs.py              # median seconds per stage over recent jobs
+    python jobs.py <job_id>     # stage timings of one job
+"""
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+PROGRESS_PREFIX = '@@progress '
+DB_PATH = os.path.join('processed', 'jobs.sqlite3')
+HISTORY_JOBS = int(os.getenv('JOB_ESTIMATE_HISTORY', '50'))
+MEMORY_TTL_SECONDS = int(os.getenv('JOB_MEMORY_TTL_SECONDS', '3600'))
+# A subscription to an ID no upload has claimed yet waits this long, and only this many at once
+PLACEHOLDER_TTL_SECONDS = float(os.getenv('JOB_PLACEHOLDER_TTL_SECONDS', '30'))
+MAX_PLACEHOLDERS = int(os.getenv('JOB_MAX_PLACEHOLDERS', '256'))
+
+_JOB_ID = re.compile(r'^[A-Za-z0-9-]{8,64}$')
+
+
+def report(stage, done, total):
+    """Called by pipeline scripts: one progress line on stdout for the parent to pick up"""
+    print(PROGRESS_PREFIX + json.dumps({'stage': stage, 'done': done, 'total': total}), flush=True)
+
+
+def parse_progress(line):
+    """The progress dict of a report() line, or None for ordinary output"""
+    if not line.startswith(PROGRESS_PREFIX):
+        return None
+    try:
+        return json.loads(line[len(PROGRESS_PREFIX):])
+    except ValueError:
+        return None
+
+
+def format_sse(event):
+    """One Server-Sent Events message for an event dict"""
+    return f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def _median(values):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    mid = len(ordered) // 2
+    return ordered[mid] if len(ordered) % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+
+
+class JobStore:
+    """SQLite record of jobs, their stages and events"""
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'job_id TEXT PRIMARY KEY, lecture_id TEXT, kind TEXT, audio_seconds REAL, '
+                'started REAL NOT NULL, finished REAL, status TEXT NOT NULL, message TEXT)'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS job_stages ('
+                'job_id TEXT NOT NULL, stage TEXT NOT NULL, started REAL NOT NULL, finished REAL, '
+                'seconds REAL, done INTEGER, total INTEGER, status TEXT NOT NULL, '
+                'PRIMARY KEY (job_id, stage))'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_job_stages_stage ON job_stages (stage, status, finished)')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS job_events ('
+                'job_id TEXT NOT NULL, seq INTEGER NOT NULL, ts REAL NOT NULL, type TEXT NOT NULL, '
+                'stage TEXT, done INTEGER, total INTEGER, data TEXT NOT NULL, PRIMARY KEY (job_id, seq))'
+            )
+
+    def _write(self, sql, params):
+        with self._lock, self._conn:
+            self._conn.execute(sql, params)
+
+    def start_job(self, job_id, lecture_id, kind, audio_seconds, started):
+        self._write('INSERT OR REPLACE INTO jobs (job_id, lecture_id, kind, audio_seconds, started, status) '
+                    'VALUES (?, ?, ?, ?, ?, ?)', (job_id, lecture_id, kind, audio_seconds, started, 'running'))
+
+    def set_audio_seconds(self, job_id, audio_seconds):
+        self._write('UPDATE jobs SET audio_seconds = ? WHERE job_id = ?', (audio_seconds, job_id))
+
+    def finish_job(self, job_id, finished, status, message):
+        self._write('UPDATE jobs SET finished = ?, status = ?, message = ? WHERE job_id = ?',
+                    (finished, status, message, job_id))
+
+    def start_stage(self, job_id, stage, started):
+        self._write('INSERT OR REPLACE INTO job_stages (job_id, stage, started, status) VALUES (?, ?, ?, ?)',
+                    (job_id, stage, started, 'running'))
+
+    def finish_stage(self, job_id, stage, finished, seconds, done, total, status):
+        self._write('UPDATE job_stages SET finished = ?, seconds = ?, done = ?, total = ?, status = ? '
+                    'WHERE job_id = ? AND stage = ?', (finished, seconds, done, total, status, job_id, stage))
+
+    def add_event(self, job_id, event):
+        self._write('INSERT OR REPLACE INTO job_events (job_id, seq, ts, type, stage, done, total, data) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (job_id, event['seq'], event['ts'], event['type'], event.get('stage'),
+                     event.get('done'), event.get('total'), json.dumps(event, ensure_ascii=False)))
+
+    def typical_seconds(self, stage, audio_seconds=None, limit=HISTORY_JOBS):
+        """Median duration of the stage over recent successful runs (scaled to audio_seconds if known)"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT s.seconds, j.audio_seconds FROM job_stages s JOIN jobs j ON j.job_id = s.job_id '
+                'WHERE s.stage = ? AND s.status = ? ORDER BY s.finished DESC LIMIT ?',
+                (stage, 'done', limit)).fetchall()
+        if audio_seconds:
+            rates = [seconds / audio for seconds, audio in rows if audio]
+            if rates:
+                return _median(rates) * audio_seconds
+        return _median([seconds for seconds, _ in rows])
+
+    def job_summary(self, job_id):
+        """Job row plus its stage timings, or None"""
+        with self._lock:
+            job = self._conn.execute(
+                'SELECT job_id, lecture_id, kind, audio_seconds, started, finished, status, message '
+                'FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+            if job is None:
+                return None
+            stages = self._conn.execute(
+                'SELECT stage, started, finished, seconds, done, total, status FROM job_stages '
+                'WHERE job_id = ? ORDER BY started', (job_id,)).fetchall()
+        keys = ('job_id', 'lecture_id', 'kind', 'audio_seconds', 'started', 'finished', 'status', 'message')
+        summary = dict(zip(keys, job))
+        summary['seconds'] = round(job[5] - job[4], 2) if job[5] else None
+        summary['stages'] = [dict(zip(('stage', 'started', 'finished', 'seconds', 'done', 'total', 'status'), row))
+                             for row in stages]
+        return summary
+
+    def stage_stats(self, limit=HISTORY_JOBS):
+        """Median seconds per stage over the most recent successful runs"""
+        with self._lock:
+            stages = [row[0] for row in self._conn.execute('SELECT DISTINCT stage FROM job_stages')]
+        return {stage: {'median_seconds': self.typical_seconds(stage, limit=limit)} for stage in stages}
+
+
+class Job:
+    """Live state of one job: events for subscribers and the running stage"""
+
+    def __init__(self, job_id, store):
+        self.id = job_id
+        self.store = store
+        self.events = []
+        self.stages = []
+        self.completed = set()
+        self.expected = {}
+        self.started = None
+        self.finished = None
+        self.stage = None
+        self.stage_started = None
+        self.stage_progress = (None, None)
+        self.created = time.time()
+        self.claim_until = None  # set while the job is only a subscriber's placeholder
+        self._cond = threading.Condition()
+        self._waiters = set()
+
+    def _eta(self, now):
+        """Seconds left: the running stage by its progress, later stages by their history"""
+        if self.started is None or self.finished is not None:
+            return None
+        remaining = 0.0
+        for stage in self.stages:
+            if stage in self.completed:
+                continue
+            expected = self.expected.get(stage)
+            if stage == self.stage:
+                done, total = self.stage_progress
+                stage_elapsed = now - self.stage_started
+                if done and total:
+                    remaining += stage_elapsed / done * (total - done)
+                    continue
+                if expected is not None:
+                    remaining += max(0.0, expected - stage_elapsed)
+                    continue
+            if expected is None:
+                return None
+            remaining += expected
+        return round(remaining, 1)
+
+    def _emit(self, type, **fields):
+        now = time.time()
+        with self._cond:
+            event = {'seq': len(self.events) + 1, 'type': type, 'ts': now,
+                     'elapsed': round(now - self.started, 1) if self.started else 0.0, **fields}
+            if self.stage is not None and type != 'stage_finish':
+                event['stage_elapsed'] = round(now - self.stage_started, 1)
+            event['eta'] = self._eta(now)
+            self.events.append(event)
+            self._cond.notify_all()
+            waiters = list(self._waiters)
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(waiter.set)
+        try:
+            self.store.add_event(self.id, event)
+        except Exception as e:
+            print(f"Warning: could not record job event: {e}")
+        return event
+
+    def _estimate_stages(self, audio_seconds):
+        for stage in self.stages:
+            try:
+                self.expected[stage] = self.store.typical_seconds(stage, audio_seconds)
+            except Exception:
+                self.expected[stage] = None
+
+    def plan(self, stages, kind='lecture', lecture_id=None, audio_seconds=None):
+        """Start the job with its planned stages (estimates come from earlier jobs)"""
+        self.started = time.time()
+        self.stages = list(stages)
+        self._estimate_stages(audio_seconds)
+        try:
+            self.store.start_job(self.id, lecture_id, kind, audio_seconds, self.started)
+        except Exception as e:
+            print(f"Warning: could not record job {self.id}: {e}")
+        self._emit('job_start', stages=self.stages, audio_seconds=audio_seconds)
+
+    def set_audio_seconds(self, audio_seconds):
+        """Length of the recording, once known: estimates scale with it from then on"""
+        try:
+            self.store.set_audio_seconds(self.id, audio_seconds)
+        except Exception as e:
+            print(f"Warning: could not record job {self.id}: {e}")
+        self._estimate_stages(audio_seconds)
+
+    def start_stage(self, stage):
+        self.stage, self.stage_started, self.stage_progress = stage, time.time(), (None, None)
+        try:
+            self.store.start_stage(self.id, stage, self.stage_started)
+        except Exception as e:
+            print(f"Warning: could not record stage {stage}: {e}")
+        self._emit('stage_start', stage=stage)
+
+    def progress(self, update):
+        """Progress reported by a script, e.g. {'stage': 'transcription', 'done': 37, 'total': 108}"""
+        if self.stage is None:
+            return
+        self.stage_progress = (update.get('done'), update.get('total'))
+        self._emit('progress', stage=self.stage, done=update.get('done'), total=update.get('total'))
+
+    def finish_stage(self, success=True, message=None):
+        stage, now = self.stage, time.time()
+        if stage is None:
+            return
+        seconds = round(now - self.stage_started, 3)
+        done, total = self.stage_progress
+        try:
+            self.store.finish_stage(self.id, stage, now, seconds, done, total, 'done' if success else 'failed')
+        except Exception as e:
+            print(f"Warning: could not record stage {stage}: {e}")
+        self.stage = None
+        self.completed.add(stage)
+        self._emit('stage_finish', stage=stage, seconds=seconds, status='done' if success else 'failed',
+                   message=message)
+
+    def finish(self, status='done', message=None):
+        if self.finished is not None:
+            return
+        if self.stage is not None:
+            self.finish_stage(status == 'done', message)
+        self.finished = time.time()
+        try:
+            self.store.finish_job(self.id, self.finished, status, message)
+        except Exception as e:
+            print(f"Warning: could not record job {self.id}: {e}")
+        self._emit('job_finish', status=status, message=message,
+                   seconds=round(self.finished - self.started, 1) if self.started else None)
+
+    @property
+    def running(self):
+        return self.started is not None and self.finished is None
+
+    @property
+    def abandoned(self):
+        """A placeholder no upload claimed in time; its subscribers stop streaming"""
+        return self.claim_until is not None and time.time() > self.claim_until
+
+    def events_after(self, seq):
+        """(events after seq, whether the job is over and all of its events are in the list)"""
+        with self._cond:
+            return self.events[seq:], self.finished is not None
+
+    def wait(self, seq, timeout):
+        """Block until there are events after seq (or timeout); see events_after"""
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.events) > seq or self.finished is not None, timeout)
+        return self.events_after(seq)
+
+    async def wait_async(self, seq, timeout):
+        """wait() for coroutines: suspends the task instead of a thread"""
+        import asyncio
+        events, finished = self.events_after(seq)
+        if events or finished:
+            return events, finished
+        key = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            self._waiters.add(key)
+        try:
+            if len(self.events) <= seq:
+                await asyncio.wait_for(key[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                self._waiters.discard(key)
+        return self.events_after(seq)
+
+
+_store = None
+_jobs = {}
+_placeholders = {}
+_jobs_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _jobs_lock:
+        if _store is None:
+            _store = JobStore()
+        return _store
+
+
+def _forget_old_locked(now):
+    # Forget jobs that finished a while ago (running jobs stay however long they take)
+    # and placeholders nobody claimed
+    for old_id, old in list(_jobs.items()):
+        if not old.running and now - (old.finished or old.created) > MEMORY_TTL_SECONDS:
+            del _jobs[old_id]
+    for old_id, old in list(_placeholders.items()):
+        if old.abandoned:
+            del _placeholders[old_id]
+
+
+def get_job(job_id):
+    """The live job for job_id, or None"""
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def claim_job(job_id=None):
+    """The job an upload runs as: the existing one, the subscriber's placeholder, or a new one
+    (a fresh ID is made up when job_id is missing or malformed)"""
+    if not job_id or not _JOB_ID.match(job_id):
+        job_id = uuid.uuid4().hex
+    store = get_store()
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            _forget_old_locked(time.time())
+            job = _placeholders.pop(job_id, None) or Job(job_id, store)
+            job.claim_until = None
+            _jobs[job_id] = job
+        return job
+
+
+def subscribe(job_id):
+    """The job to stream for job_id: the live job, else a short-lived placeholder an upload can claim.
+
+    None when the ID is malformed or MAX_PLACEHOLDERS subscriptions are already waiting.
+    """
+    if not job_id or not _JOB_ID.match(job_id):
+        return None
+    store = get_store()
+    with _jobs_lock:
+        job = _jobs.get(job_id) or _placeholders.get(job_id)
+        if job is None:
+            _forget_old_locked(time.time())
+            if len(_placeholders) >= MAX_PLACEHOLDERS:
+                return None
+            job = _placeholders[job_id] = Job(job_id, store)
+            job.claim_until = job.created + PLACEHOLDER_TTL_SECONDS
+        return job
+
+
+def job_summary(job_id):
+    return get_store().job_summary(job_id)
+
+
+if __name__ == '__main__':
+    store = get_store()
+    if len(sys.argv) > 1:
+        print(json.dumps(store.job_summary(sys.argv[1]), indent=2, ensure_ascii=False))
+    else:
+        for stage, info in store.stage_stats().items():
+            median = info['median_seconds']
+            print(f"{stage:<15} {median:8.1f} s" if median is not None else f"{stage:<15}        -")
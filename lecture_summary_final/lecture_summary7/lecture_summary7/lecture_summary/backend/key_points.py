@@ -0,0 +1,146 @@
+"""Local extractive key points for the AI tutor.
+
+Ranks the headings and sentences of the generated notes with TextRank over
+Arabic-aware TF-IDF vectors (sections are the "documents" for IDF), so a
+lecture's key points are available in a few milliseconds without calling
+Gemini.  Headings get a bonus because the notes already use them as topic
+titles; near-duplicate candidates are dropped and the winners are returned in
+the order they appear in the lecture.
+
+    python key_points.py [output.txt]
+"""
+import math
+import re
+import sys
+import time
+from collections import Counter
+
+from arabic_text import tokenize
+from document_export import split_sections
+
+MAX_POINT_CHARS = 160
+HEADING_BONUS = 1.5
+DAMPING = 0.85
+ITERATIONS = 30
+REDUNDANCY_THRESHOLD = 0.5
+MIN_HEADING_TERMS = 2  # skips generic sub-headings such as "مقدمة"
+
+_SENTENCE_END = re.compile(r'(?<=[.!?؟۔])\s+')
+
+
+def _candidates(text):
+    """(position, text, is_heading, section_index) for every heading and sentence"""
+    candidates = []
+    seen_headings = set()
+    sections = split_sections(text)
+    for index, sec in enumerate(sections):
+        # "chapter - sub" headings contribute both titles, each once
+        for title in sec.heading.split(" - ", 1):
+            if title in seen_headings or title == "المحتوى":  # split_sections' placeholder
+                continue
+            seen_headings.add(title)
+            if len(tokenize(title)) >= MIN_HEADING_TERMS:
+                candidates.append((len(candidates), title, True, index))
+        for line in sec.body_lines:
+            line = line[2:] if line.startswith("- ") else line
+            for sentence in _SENTENCE_END.split(line):
+                sentence = sentence.strip(' :-')
+                if len(sentence) > 8:
+                    candidates.append((len(candidates), sentence, False, index))
+    return candidates, sections
+
+
+def _tfidf_vectors(candidates, sections):
+    """Unit-length TF-IDF vectors, IDF computed over sections"""
+    section_terms = [set(tokenize(sec.heading + '\n' + '\n'.join(sec.body_lines))) for sec in sections]
+    doc_freq = Counter(term for terms in section_terms for term in terms)
+    section_count = len(sections) or 1
+
+    vectors = []
+    for _, text, _, _ in candidates:
+        weights = {term: tf * math.log(1 + section_count / (1 + doc_freq[term]))
+                   for term, tf in Counter(tokenize(text)).items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        vectors.append({term: w / norm for term, w in weights.items()})
+    return vectors
+
+
+def _cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(term, 0.0) for term, w in a.items())
+
+
+def _textrank(vectors):
+    """PageRank over the cosine-similarity graph of the candidates"""
+    n = len(vectors)
+    edges = [[] for _ in range(n)]
+    for i in range(n):
+        for j in range(i + 1, n):
+            sim = _cosine(vectors[i], vectors[j])
+            if sim > 0:
+                edges[i].append((j, sim))
+                edges[j].append((i, sim))
+    out_weight = [sum(w for _, w in e) for e in edges]
+
+    scores = [1.0] * n
+    for _ in range(ITERATIONS):
+        scores = [
+            (1 - DAMPING) + DAMPING * sum(scores[j] * w / out_weight[j] for j, w in edges[i])
+            for i in range(n)
+        ]
+    return scores
+
+
+def _shorten(text, limit=MAX_POINT_CHARS):
+    if len(text) <= limit:
+        return text
+    cut = text[:limit].rsplit(' ', 1)[0]
+    return cut.rstrip('،,;: ') + '…'
+
+
+def extract_key_points(text, limit=5):
+    """Return up to limit key points (headings/sentences) ranked by TextRank"""
+    candidates, sections = _candidates(text or '')
+    if not candidates:
+        return []
+    vectors = _tfidf_vectors(candidates, sections)
+    scores = _textrank(vectors)
+
+    ranked = sorted(
+        range(len(candidates)),
+        key=lambda i: scores[i] * (HEADING_BONUS if candidates[i][2] else 1.0),
+        reverse=True,
+    )
+    chosen = []
+    sentence_sections = set()
+    for i in ranked:
+        _, _, is_heading, section = candidates[i]
+        if not vectors[i] or (not is_heading and section in sentence_sections):
+            continue
+        if any(_cosine(vectors[i], vectors[j]) > REDUNDANCY_THRESHOLD for j in chosen):
+            continue
+        chosen.append(i)
+        if not is_heading:
+            sentence_sections.add(section)
+        if len(chosen) == limit:
+            break
+
+    return [_shorten(candidates[i][1]) for i in sorted(chosen)]
+
+
+def save_key_points(points, path='key_points.txt'):
+    with open(path, 'w', encoding='utf-8') as f:
+        for point in points:
+            f.write(f"{point}\n")
+
+
+if __name__ == '__main__':
+    source = sys.argv[1] if len(sys.argv) > 1 else 'output.txt'
+    with open(source, 'r', encoding='utf-8') as f:
+        content = f.read()
+    started = time.perf_counter()
+    points = extract_key_points(content)
+    print(f"Extracted {len(points)} key points in {(time.perf_counter() - started) * 1000:.1f} ms")
+    for point in points:
+        print(f"- {point}")
@@ -0,0 +1,401 @@
+"""HTTP load test for the deployed app (asgi:application) with local stand-ins for Speech, Gemini and OpenAI.
+
+Starts asgi.py in-process under uvicorn, as start_app.sh does (inside a
+scratch working directory, so the real input/output files are untouched),
+plus a local HTTP stand-in that answers Gemini generateContent and OpenAI
+realtime session requests after a tunable delay.  Google Speech runs over
+gRPC in a subprocess, so it is stood in at the run_script boundary (both
+app.run_script and async_service.run_script): the transcription step sleeps
+for --speech-latency and writes a sample transcript, while note generation
+and PDF export run the real code in-process (note generation goes through
+the Gemini stand-in).
+
+Each virtual student runs a full session:
+
+    POST /upload -> GET /process -> POST /tutor/realtime/session
+    -> POST /quiz/generate -> POST /quiz/submit (x questions) -> GET /quiz/result
+
+Concurrency is stepped through --concurrency (students are started evenly
+over --ramp-up seconds in each stage) and every stage reports p50/p95/p99
+latency, error rate and throughput per route.  A route is reported as
+saturated at the first stage where adding students stops adding throughput
+or its p95 latency has doubled since the first stage.
+
+    python loadtest.py --concurrency 1,2,4,8,16 --stage-seconds 30 \\
+        --speech-latency 2 --gemini-latency 1.5 --openai-latency 0.3
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+BACKEND_DIR = os.path.abspath(os.path.dirname(__file__))
+ROUTES = ['/upload', '/process', '/tutor/realtime/session', '/quiz/generate', '/quiz/submit', '/quiz/result']
+QUESTIONS = 5
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list (0 when empty)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+class Upstreams:
+    """Latency/error settings shared by the stand-ins"""
+
+    def __init__(self, speech, gemini, openai, jitter, error_rate, notes, transcript):
+        self.latency = {'speech': speech, 'gemini': gemini, 'openai': openai}
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.notes = notes
+        self.transcript = transcript
+        self.calls = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def wait(self, name):
+        """Sleep like the upstream would; returns False when a failure should be injected"""
+        with self._lock:
+            self.calls[name] += 1
+        base = self.latency[name]
+        time.sleep(max(0.0, random.uniform(base * (1 - self.jitter), base * (1 + self.jitter))))
+        return random.random() >= self.error_rate
+
+
+def _quiz_json():
+    return json.dumps([
+        {
+            'question': f'سؤال تجريبي رقم {n}؟',
+            'right_answer': 'الإجابة الصحيحة',
+            'wrong_answer1': 'إجابة خاطئة 1',
+            'wrong_answer2': 'إجابة خاطئة 2',
+            'wrong_answer3': 'إجابة خاطئة 3',
+        }
+        for n in range(1, QUESTIONS + 1)
+    ], ensure_ascii=False)
+
+
+def make_stub_handler(upstreams):
+    """HTTP handler answering Gemini generateContent and OpenAI realtime sessions"""
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            request_body = self.rfile.read(length).decode('utf-8', 'replace')
+
+            if ':generateContent' in self.path:
+                if not upstreams.wait('gemini'):
+                    return self._reply(503, {'error': {'code': 503, 'message': 'stand-in overloaded'}})
+                if 'JSON array' in request_body:
+                    text = _quiz_json()
+                elif 'النقاط الأساسية' in request_body:
+                    text = '\n'.join(f'نقطة أساسية تجريبية رقم {n}' for n in range(1, 6))
+                else:
+                    text = upstreams.notes
+                return self._reply(200, {'candidates': [
+                    {'content': {'role': 'model', 'parts': [{'text': text}]}, 'finishReason': 'STOP'}]})
+
+            if self.path.endswith('/realtime/sessions'):
+                if not upstreams.wait('openai'):
+                    return self._reply(500, {'error': {'message': 'stand-in failure'}})
+                return self._reply(200, {
+                    'id': f'sess_{random.getrandbits(48):012x}',
+                    'object': 'realtime.session',
+                    'client_secret': {'value': 'ek_loadtest', 'expires_at': int(time.time()) + 60},
+                })
+
+            self._reply(404, {'error': 'unknown stand-in path'})
+
+    return StubHandler
+
+
+def install_script_standins(app_module, async_service, upstreams):
+    """Replace app.run_script and async_service.run_script: Speech is simulated, the rest runs in-process"""
+    import document_export
+    import generate_lec1
+
+    def run_script(script_path, *args, progress=None):
+        name = os.path.basename(script_path)
+        try:
+            if name in ('transcribtion.py', 'pipeline.py'):
+                if not upstreams.wait('speech'):
+                    return False, '', 'Speech stand-in failure'
+                if progress is not None:
+                    progress({'stage': 'transcription', 'done': 1, 'total': 1})
+                with open('input.txt', 'w', encoding='utf-8') as f:
+                    f.write(upstreams.transcript)
+                if name == 'pipeline.py':
+                    generate_lec1.main('input.txt', 'output.txt')
+            elif name == 'generate_lec1.py':
+                generate_lec1.main('input.txt', 'output.txt')
+            elif name == 'document_export.py':
+                with open('output.txt', 'r', encoding='utf-8') as f:
+                    document_export.export_documents(f.read())
+            else:
+                return False, '', f'No stand-in for {name}'
+            return True, '', ''
+        except Exception as e:
+            return False, '', str(e)
+
+    async def run_script_async(script_path, *args, progress=None):
+        # The async routes await this; the stand-in blocks like the subprocess wait would not
+        return await asyncio.to_thread(run_script, script_path, *args, progress=progress)
+
+    app_module.run_script = run_script
+    async_service.run_script = run_script_async
+
+
+def start_asgi_server(application):
+    """Serve application with uvicorn on a free local port from a background thread"""
+    import uvicorn
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', 0))
+    server = uvicorn.Server(uvicorn.Config(application, log_level='error', access_log=False))
+    thread = threading.Thread(target=server.run, kwargs={'sockets': [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError('uvicorn failed to start')
+        time.sleep(0.05)
+    return server, thread, sock.getsockname()[1]
+
+
+class Recorder:
+    """Thread-safe latency/error samples per route"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, route, seconds, ok):
+        with self._lock:
+            self.samples[route].append(seconds)
+            if not ok:
+                self.errors[route] += 1
+
+
+def _timed(recorder, route, call, check):
+    started = time.perf_counter()
+    try:
+        resp = call()
+        ok = check(resp)
+    except (requests.RequestException, ValueError):  # ValueError: non-JSON body
+        resp, ok = None, False
+    recorder.record(route, time.perf_counter() - started, ok)
+    return resp if ok else None
+
+
+def student_session(base_url, recorder, student_id):
+    """One student: upload, notes, tutor, quiz; stops at the first failed step"""
+    http = requests.Session()
+    redirects_to = lambda path: lambda r: r.status_code == 302 and r.headers.get('Location', '').endswith(path)
+
+    if not _timed(recorder, '/upload', lambda: http.post(
+            f'{base_url}/upload',
+            data={'student_name': f'طالب {student_id}'},
+            files={'audio': ('lecture.mp3', b'ID3' + os.urandom(2048), 'audio/mpeg')},
+            allow_redirects=False), redirects_to('/process')):
+        return False
+    if not _timed(recorder, '/process', lambda: http.get(f'{base_url}/process', allow_redirects=False),
+                  redirects_to('/explanation')):
+        return False
+    if not _timed(recorder, '/tutor/realtime/session', lambda: http.post(f'{base_url}/tutor/realtime/session'),
+                  lambda r: r.status_code == 200 and 'client_secret' in r.json()):
+        return False
+    quiz = _timed(recorder, '/quiz/generate', lambda: http.post(f'{base_url}/quiz/generate'),
+                  lambda r: r.status_code == 200 and r.json().get('success'))
+    if not quiz:
+        return False
+    for question in quiz.json()['questions']:
+        if not _timed(recorder, '/quiz/submit', lambda: http.post(
+                f'{base_url}/quiz/submit', json={'answer_index': random.randrange(len(question['answers']))}),
+                lambda r: r.status_code == 200):
+            return False
+    return bool(_timed(recorder, '/quiz/result', lambda: http.get(f'{base_url}/quiz/result', allow_redirects=False),
+                       lambda r: r.status_code == 200))
+
+
+def run_stage(base_url, users, ramp_up, stage_seconds):
+    """Run `users` students for stage_seconds (each loops sessions); returns the recorder and wall time"""
+    recorder = Recorder()
+    deadline = time.time() + stage_seconds
+    sessions = {'ok': 0, 'failed': 0}
+    lock = threading.Lock()
+
+    def user_loop(n):
+        time.sleep(ramp_up * n / max(users, 1))
+        while time.time() < deadline:
+            ok = student_session(base_url, recorder, n)
+            with lock:
+                sessions['ok' if ok else 'failed'] += 1
+
+    started = time.time()
+    threads = [threading.Thread(target=user_loop, args=(n,), daemon=True) for n in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return recorder, sessions, time.time() - started
+
+
+def summarize(recorder, elapsed):
+    summary = {}
+    for route in ROUTES:
+        samples = recorder.samples.get(route, [])
+        if not samples:
+            continue
+        summary[route] = {
+            'requests': len(samples),
+            'errors': recorder.errors.get(route, 0),
+            'error_rate': recorder.errors.get(route, 0) / len(samples),
+            'rps': len(samples) / elapsed,
+            'p50_ms': percentile(samples, 50) * 1000,
+            'p95_ms': percentile(samples, 95) * 1000,
+            'p99_ms': percentile(samples, 99) * 1000,
+        }
+    return summary
+
+
+def find_saturation(stages, throughput_gain=0.1, latency_factor=2.0):
+    """First concurrency per route where throughput stops growing or p95 has doubled"""
+    saturation = {}
+    for route in ROUTES:
+        points = [(s['concurrency'], s['routes'][route]) for s in stages if route in s['routes']]
+        for (_, prev), (users, cur) in zip(points, points[1:]):
+            if (cur['rps'] < prev['rps'] * (1 + throughput_gain)
+                    or cur['p95_ms'] > points[0][1]['p95_ms'] * latency_factor):
+                saturation[route] = users
+                break
+    return saturation
+
+
+def print_stage(stage):
+    print(f"\n== {stage['concurrency']} concurrent students, {stage['elapsed']:.1f}s, "
+          f"sessions ok={stage['sessions']['ok']} failed={stage['sessions']['failed']}")
+    print(f"{'route':<26}{'reqs':>6}{'err%':>7}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for route, r in stage['routes'].items():
+        print(f"{route:<26}{r['requests']:>6}{r['error_rate'] * 100:>6.1f}%{r['rps']:>8.2f}"
+              f"{r['p50_ms']:>9.0f}{r['p95_ms']:>9.0f}{r['p99_ms']:>9.0f}")
+
+
+def prepare_workdir(notes_path):
+    """Scratch directory with the fonts/static the app and exporter read via relative paths"""
+    workdir = tempfile.mkdtemp(prefix='lecture-loadtest-')
+    for name in ('fonts', 'static'):
+        if os.path.isdir(os.path.join(BACKEND_DIR, name)):
+            os.symlink(os.path.join(BACKEND_DIR, name), os.path.join(workdir, name))
+    shutil.copy(notes_path, os.path.join(workdir, 'output.txt'))
+    return workdir
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Concurrent load test for the Lecture Assist app')
+    parser.add_argument('--concurrency', default='1,2,4,8', help='comma-separated student counts, one stage each')
+    parser.add_argument('--ramp-up', type=float, default=5.0, help='seconds to start all students of a stage')
+    parser.add_argument('--stage-seconds', type=float, default=30.0, help='how long each stage keeps starting sessions')
+    parser.add_argument('--speech-latency', type=float, default=2.0, help='seconds per transcription')
+    parser.add_argument('--gemini-latency', type=float, default=1.5, help='seconds per Gemini call')
+    parser.add_argument('--openai-latency', type=float, default=0.3, help='seconds per realtime session')
+    parser.add_argument('--jitter', type=float, default=0.25, help='+/- fraction applied to every latency')
+    parser.add_argument('--upstream-error-rate', type=float, default=0.0, help='fraction of upstream calls that fail')
+    parser.add_argument('--notes', default=os.path.join(BACKEND_DIR, 'output.txt'), help='sample notes served by Gemini')
+    parser.add_argument('--transcript', default=os.path.join(BACKEND_DIR, 'input.txt'), help='sample transcript')
+    parser.add_argument('--json', help='write the full report to this file')
+    args = parser.parse_args(argv)
+    report_path = os.path.abspath(args.json) if args.json else None
+
+    with open(args.notes, 'r', encoding='utf-8') as f:
+        notes = f.read()
+    transcript = notes
+    if os.path.exists(args.transcript):
+        with open(args.transcript, 'r', encoding='utf-8') as f:
+            transcript = f.read()
+    upstreams = Upstreams(args.speech_latency, args.gemini_latency, args.openai_latency,
+                          args.jitter, args.upstream_error_rate, notes, transcript)
+
+    stub = ThreadingHTTPServer(('127.0.0.1', 0), make_stub_handler(upstreams))
+    stub.daemon_threads = True
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    stub_url = f'http://127.0.0.1:{stub.server_port}'
+
+    # The app reads these at import time
+    os.environ.update({
+        'RETENTION_ENABLED': '0',
+        'KEY_POINTS_GEMINI_REFINE': '0',
+        'GEMINI_API_KEY': 'loadtest',
+        'OPENAI_API_KEY': 'loadtest',
+        'GEMINI_API_BASE_URL': stub_url,
+        'OPENAI_API_BASE': f'{stub_url}/v1',
+    })
+    sys.path.insert(0, BACKEND_DIR)
+    workdir = prepare_workdir(os.path.abspath(args.notes))
+    os.chdir(workdir)
+
+    import app as app_module
+    import asgi
+    import async_service
+
+    install_script_standins(app_module, async_service, upstreams)
+    server, server_thread, port = start_asgi_server(asgi.application)
+    base_url = f'http://127.0.0.1:{port}'
+    print(f"App on {base_url}, upstream stand-ins on {stub_url}, scratch dir {workdir}")
+
+    stages = []
+    try:
+        for users in [int(n) for n in args.concurrency.split(',') if n.strip()]:
+            recorder, sessions, elapsed = run_stage(base_url, users, args.ramp_up, args.stage_seconds)
+            stage = {'concurrency': users, 'elapsed': elapsed, 'sessions': sessions,
+                     'routes': summarize(recorder, elapsed)}
+            stages.append(stage)
+            print_stage(stage)
+    finally:
+        server.should_exit = True
+        server_thread.join(timeout=10)
+        stub.shutdown()
+        os.chdir(BACKEND_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    saturation = find_saturation(stages)
+    print("\nSaturation (first concurrency where throughput flattens or p95 doubles):")
+    for route in ROUTES:
+        print(f"  {route:<26} {saturation.get(route, 'not reached')}")
+    print(f"Upstream calls: {dict(upstreams.calls)}")
+
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump({'settings': vars(args), 'stages': stages, 'saturation': saturation,
+                       'upstream_calls': dict(upstreams.calls)}, f, ensure_ascii=False, indent=2)
+    return stages
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+"""Decode-once cache of normalized PCM audio, with a passthrough for ready audio.
+
+The first time an audio file is seen it is decoded (pydub/ffmpeg, using the
+decoder for its probed container), converted to the format the recognizer
+expects (mono, 48 kHz, 16-bit) and written as a raw .pcm file named after the
+SHA-256 of the source.  Later stages open that file with mmap and take
+zero-copy memoryview slices, so re-chunking or retrying a segment never
+decodes the source again.
+
+open_audio() skips decoding altogether for recordings Google Speech accepts
+as they are: 16-bit mono PCM WAV is memory-mapped in place, and mono FLAC is
+indexed and cut on frame boundaries.
+"""
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import wave
+
+import audio_probe
+import retention
+
+CACHE_DIR = os.getenv('PCM_CACHE_DIR', os.path.join('processed', 'pcm_cache'))
+SAMPLE_RATE = 48000
+SAMPLE_WIDTH = 2  # bytes, LINEAR16
+CHANNELS = 1
+
+_hash_memo = {}  # (path, size, mtime) -> digest, so retries skip re-hashing
+
+
+def audio_hash(file_path, block_size=1024 * 1024):
+    """SHA-256 of the source file contents"""
+    st = os.stat(file_path)
+    key = (os.path.abspath(file_path), st.st_size, st.st_mtime_ns)
+    if key in _hash_memo:
+        return _hash_memo[key]
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    _hash_memo[key] = digest.hexdigest()
+    return _hash_memo[key]
+
+
+class PCMAudio:
+    """Read-only, memory-mapped view of raw PCM samples (a cache file or a WAV's data chunk)"""
+
+    encoding = 'LINEAR16'
+    chunk_extension = '.wav'
+
+    def __init__(self, pcm_path, meta, data_offset=0, data_size=None):
+        self.path = pcm_path
+        self.sample_rate = meta['sample_rate']
+        self.sample_width = meta['sample_width']
+        self.channels = meta['channels']
+        self.frame_size = self.sample_width * self.channels
+        self._file = open(pcm_path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._view = memoryview(self._mmap) if self._mmap is not None else memoryview(b'')
+        end = len(self._view) if data_size is None else min(len(self._view), data_offset + data_size)
+        self._view = self._view[data_offset:end]
+        self.frames = len(self._view) // self.frame_size
+
+    @property
+    def duration_ms(self):
+        return self.frames * 1000 // self.sample_rate
+
+    def slice_ms(self, start_ms, end_ms):
+        """Zero-copy memoryview of the samples between start_ms and end_ms"""
+        start = max(0, start_ms) * self.sample_rate // 1000
+        end = min(self.frames, end_ms * self.sample_rate // 1000)
+        return self._view[start * self.frame_size:max(start, end) * self.frame_size]
+
+    def write_wav(self, wav_path, start_ms, end_ms):
+        """Write a WAV file for a time span straight from the mapped samples"""
+        with wave.open(wav_path, 'wb') as out:
+            out.setnchannels(self.channels)
+            out.setsampwidth(self.sample_width)
+            out.setframerate(self.sample_rate)
+            out.writeframes(self.slice_ms(start_ms, end_ms))
+        return wav_path
+
+    write_chunk = write_wav
+
+    def segment_bytes(self, start_ms, end_ms):
+        """Raw samples for a time span (LINEAR16 content for the recognizer)"""
+        return bytes(self.slice_ms(start_ms, end_ms))
+
+    def close(self):
+        self._view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FLACAudio:
+    """Memory-mapped FLAC file cut on frame boundaries (no decoding)"""
+
+    encoding = 'FLAC'
+    chunk_extension = '.flac'
+
+    def __init__(self, path, info):
+        self.path = path
+        self.sample_rate = info.sample_rate
+        self.channels = info.channels
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # STREAMINFO is always the first metadata block
+        start = self._mmap.find(b'fLaC')
+        streaminfo = self._mmap[start + 8:start + 42]
+        _, _, _, total, _, max_block = audio_probe.parse_flac_streaminfo(streaminfo)
+        min_frame = int.from_bytes(streaminfo[4:7], 'big')
+        self.frames = audio_probe.index_flac_frames(self._mmap, info.data_offset, max_block, min_frame)
+        self._first_samples = [first for _, first in self.frames]
+        self.data_end = len(self._mmap)
+        last_sample = self.frames[-1][1] + max_block if self.frames else 0
+        self.total_samples = total or last_sample
+
+        # Chunk header: STREAMINFO marked as the last metadata block, with the
+        # total sample count and MD5 zeroed ("unknown") since chunks are partial
+        patched = bytearray(streaminfo)
+        patched[13] &= 0xF0
+        patched[14:18] = b'\0\0\0\0'
+        patched[18:34] = bytes(16)
+        self._header = b'fLaC' + bytes([0x80]) + (34).to_bytes(3, 'big') + bytes(patched)
+
+    @property
+    def duration_ms(self):
+        return self.total_samples * 1000 // self.sample_rate
+
+    def _frame_range(self, start_ms, end_ms):
+        """Byte range of the frames whose first sample falls in [start_ms, end_ms)"""
+        first = bisect.bisect_left(self._first_samples, max(0, start_ms) * self.sample_rate // 1000)
+        last = bisect.bisect_left(self._first_samples, end_ms * self.sample_rate // 1000)
+        if first >= last:
+            return 0, 0
+        return self.frames[first][0], self.frames[last][0] if last < len(self.frames) else self.data_end
+
+    def segment_bytes(self, start_ms, end_ms):
+        """A standalone FLAC stream for a time span (FLAC content for the recognizer)"""
+        begin, end = self._frame_range(start_ms, end_ms)
+        return self._header + self._mmap[begin:end]
+
+    def write_chunk(self, chunk_path, start_ms, end_ms):
+        with open(chunk_path, 'wb') as f:
+            f.write(self.segment_bytes(start_ms, end_ms))
+        return chunk_path
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _paths(digest):
+    return os.path.join(CACHE_DIR, f"{digest}.pcm"), os.path.join(CACHE_DIR, f"{digest}.json")
+
+
+def _decode_to_cache(file_path, pcm_path, meta_path, decoder_format=None):
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_file(file_path, format=decoder_format)
+    audio = audio.set_channels(CHANNELS).set_frame_rate(SAMPLE_RATE).set_sample_width(SAMPLE_WIDTH)
+
+    # Write to temp names first so a crash never leaves a truncated cache entry
+    with open(pcm_path + '.tmp', 'wb') as f:
+        f.write(audio.raw_data)
+    meta = {
+        'source': os.path.abspath(file_path),
+        'sample_rate': SAMPLE_RATE,
+        'sample_width': SAMPLE_WIDTH,
+        'channels': CHANNELS,
+        'duration_ms': len(audio),
+    }
+    with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(pcm_path + '.tmp', pcm_path)
+    os.replace(meta_path + '.tmp', meta_path)
+    return meta
+
+
+def load_pcm(file_path, info=None):
+    """Return a PCMAudio for file_path, decoding it only if it is not cached yet"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    digest = audio_hash(file_path)
+    pcm_path, meta_path = _paths(digest)
+
+    if os.path.exists(pcm_path) and os.path.exists(meta_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        print(f"PCM cache hit: {digest[:12]}")
+    else:
+        info = info or audio_probe.probe(file_path)
+        print(f"PCM cache miss: decoding {file_path} ({info.container or 'unknown'}/{info.codec or '?'})")
+        meta = _decode_to_cache(file_path, pcm_path, meta_path, info.decoder_format)
+    # Hot entries stay: LRU eviction sees the read on both files of the pair
+    retention.touch(pcm_path)
+    retention.touch(meta_path)
+    return PCMAudio(pcm_path, meta)
+
+
+def open_audio(file_path):
+    """PCMAudio or FLACAudio for file_path, without decoding when the source is speech-ready"""
+    info = audio_probe.probe(file_path)
+    if info.speech_ready and info.container == 'wav':
+        print(f"WAV passthrough: {info.sample_rate} Hz mono, no decode")
+        meta = {'sample_rate': info.sample_rate, 'sample_width': 2, 'channels': 1}
+        return PCMAudio(file_path, meta, info.data_offset, info.data_size)
+    if info.speech_ready and info.container == 'flac':
+        audio = FLACAudio(file_path, info)
+        if audio.frames:
+            print(f"FLAC passthrough: {info.sample_rate} Hz mono, {len(audio.frames)} frames, no decode")
+            return audio
+        audio.close()
+    return load_pcm(file_path, info)
@@ -0,0 +1,132 @@
+"""Pipelined transcription + note generation.
+
+Instead of waiting for the whole transcript before calling Gemini, segments
+of the transcript are sent for note generation as soon as enough text has
+built up, while Google Speech keeps transcribing the next chunks.  When the
+last chunk lands, one merge pass turns the segment notes into the final
+output.txt.  For a long lecture the total time approaches max(ASR, LLM)
+instead of ASR + LLM.
+
+    python pipeline.py [audio_path]       # writes input.txt and output.txt
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import generate_lec1
+import transcribtion
+from word_timeline import WordTimeline
+
+# Roughly 5-6 chunks (~5 minutes) of Arabic speech per segment
+SEGMENT_CHARS = int(os.getenv('PIPELINE_SEGMENT_CHARS', '4000'))
+SEGMENT_WORKERS = int(os.getenv('PIPELINE_SEGMENT_WORKERS', '2'))
+
+
+def _timed(fn, *args):
+    started = time.time()
+    result = fn(*args)
+    return result, time.time() - started
+
+
+class NoteGenerationError(RuntimeError):
+    """The transcript was saved but no notes could be generated from it"""
+
+
+def _notes(fn, *args):
+    try:
+        return _timed(fn, *args)
+    except Exception as e:
+        raise NoteGenerationError(f"Note generation failed: {e}") from e
+
+
+def run_pipelined(audio_path, input_path="input.txt", output_path="output.txt",
+                  language_code="ar-JO", chunk_dir=".", segment_chars=SEGMENT_CHARS):
+    """Transcribe audio_path while generating notes segment by segment"""
+    # A fresh input.txt without output.txt afterwards means only note generation failed,
+    # so the previous lecture's files go before anything here can fail
+    for path in (input_path, output_path):
+        if os.path.exists(path):
+            os.remove(path)
+    client = generate_lec1.get_gemini_client()
+    started = time.time()
+    transcript_parts = []
+    buffer, buffer_chars = [], 0
+    futures = []
+    # Same per-chunk post-processing as the sequential path (word timeline,
+    # optional re-transcription), so segments are queued with the final text
+    timeline = WordTimeline()
+
+    with ThreadPoolExecutor(max_workers=SEGMENT_WORKERS) as pool:
+        for n, total, text in transcribtion.iter_transcribed_chunks(audio_path, language_code, chunk_dir,
+                                                                     timeline=timeline):
+            if not text:
+                continue
+            transcript_parts.append(text)
+            buffer.append(text)
+            buffer_chars += len(text)
+            if buffer_chars >= segment_chars and n < total:
+                print(f"Segment {len(futures) + 1} queued for note generation after chunk {n}/{total}")
+                futures.append(pool.submit(_timed, generate_lec1.generate_segment_notes,
+                                           " ".join(buffer), len(futures) + 1, client))
+                buffer, buffer_chars = [], 0
+
+        asr_seconds = time.time() - started
+        transcript = " ".join(transcript_parts).strip()
+        if not transcript:
+            raise RuntimeError("Transcription returned no text")
+        with open(input_path, "w", encoding="utf-8") as f:
+            f.write(transcript)
+        transcribtion.save_timeline(timeline)
+
+        llm_seconds = 0.0
+        if not futures:
+            # Short lecture: one ordinary generation pass, same as the sequential mode
+            notes, llm_seconds = _notes(generate_lec1.generate_notes, transcript, client)
+        else:
+            if buffer:
+                futures.append(pool.submit(_timed, generate_lec1.generate_segment_notes,
+                                           " ".join(buffer), len(futures) + 1, client))
+            segment_notes = []
+            for number, future in enumerate(futures, 1):
+                try:
+                    notes, seconds = future.result()
+                except Exception as e:
+                    # The transcript is complete; only this segment's notes are missing
+                    print(f"Note generation failed for segment {number}/{len(futures)}: {e}")
+                    for pending in futures[number:]:
+                        pending.cancel()  # queued segments are not sent; the fallback covers them
+                    break
+                segment_notes.append(notes)
+                llm_seconds += seconds
+            if len(segment_notes) == len(futures):
+                print(f"Merging notes from {len(segment_notes)} segments...")
+                notes, merge_seconds = _notes(generate_lec1.merge_segment_notes, segment_notes, client)
+            else:
+                print("Falling back to one generation pass over the whole transcript...")
+                notes, merge_seconds = _notes(generate_lec1.generate_notes, transcript, client)
+            llm_seconds += merge_seconds
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(notes)
+
+    total_seconds = time.time() - started
+    print(f"Pipeline finished in {total_seconds:.1f}s "
+          f"(ASR {asr_seconds:.1f}s, LLM {llm_seconds:.1f}s, "
+          f"overlap saved {max(0.0, asr_seconds + llm_seconds - total_seconds):.1f}s)")
+    return transcript, notes
+
+
+if __name__ == "__main__":
+    audio_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join("uploads", "audio_input.mp3")
+    if not os.path.exists(audio_file):
+        print("Error: No audio file found. Please upload an audio file first.")
+        sys.exit(1)
+
+    try:
+        run_pipelined(audio_file)
+    except NoteGenerationError as e:
+        # input.txt is written and output.txt is not: the web app generates the notes again
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    print("تمت المعالجة. الملف الناتج موجود باسم: output.txt")
@@ -0,0 +1,192 @@
+"""Quiz attempts and the per-question / per-lecture analytics built from them.
+
+Every answer submitted to /quiz/submit is one row (lecture, question, chosen
+index, correctness, seconds taken).  The same transaction updates running
+totals per question and per lecture, so "which questions did the section get
+wrong" reads a handful of pre-aggregated rows instead of scanning attempts.
+
+Questions are identified by a hash of their text: quizzes are regenerated per
+student, and the same question text in the same lecture counts as one question.
+
+    python quiz_store.py                # per-lecture totals
+    python quiz_store.py <lecture_id>   # per-question totals, most missed first
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+DB_PATH = os.path.join('processed', 'quiz_attempts.sqlite3')
+
+
+def question_key(text):
+    """Stable ID of a question across quizzes (hash of its whitespace-normalized text)"""
+    return hashlib.sha1(' '.join(text.split()).encode('utf-8')).hexdigest()[:16]
+
+
+def _rate(part, whole):
+    return round(part / whole, 4) if whole else None
+
+
+class QuizStore:
+    """SQLite store of quiz answers with incrementally maintained aggregates"""
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS quiz_attempts ('
+                'attempt_id TEXT PRIMARY KEY, lecture_id TEXT NOT NULL, student_name TEXT, '
+                'total_questions INTEGER NOT NULL, answered INTEGER NOT NULL DEFAULT 0, '
+                'correct INTEGER NOT NULL DEFAULT 0, started REAL NOT NULL, finished REAL)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_quiz_attempts_lecture ON quiz_attempts (lecture_id, started)')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS quiz_answers ('
+                'attempt_id TEXT NOT NULL, question_index INTEGER NOT NULL, lecture_id TEXT NOT NULL, '
+                'question_key TEXT NOT NULL, chosen_index INTEGER NOT NULL, correct_index INTEGER NOT NULL, '
+                'is_correct INTEGER NOT NULL, seconds REAL NOT NULL, answered_at REAL NOT NULL, '
+                'PRIMARY KEY (attempt_id, question_index))'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_quiz_answers_question ON quiz_answers (lecture_id, question_key)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_quiz_answers_time ON quiz_answers (answered_at)')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS quiz_question_stats ('
+                'lecture_id TEXT NOT NULL, question_key TEXT NOT NULL, question TEXT NOT NULL, '
+                'answers INTEGER NOT NULL DEFAULT 0, correct INTEGER NOT NULL DEFAULT 0, '
+                'seconds REAL NOT NULL DEFAULT 0, PRIMARY KEY (lecture_id, question_key))'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS quiz_lecture_stats ('
+                'lecture_id TEXT PRIMARY KEY, attempts INTEGER NOT NULL DEFAULT 0, '
+                'finished_attempts INTEGER NOT NULL DEFAULT 0, answers INTEGER NOT NULL DEFAULT 0, '
+                'correct INTEGER NOT NULL DEFAULT 0, seconds REAL NOT NULL DEFAULT 0, last_answer REAL)'
+            )
+
+    def start_attempt(self, attempt_id, lecture_id, student_name, total_questions):
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR IGNORE INTO quiz_attempts (attempt_id, lecture_id, student_name, total_questions, started) '
+                'VALUES (?, ?, ?, ?, ?)', (attempt_id, lecture_id, student_name, total_questions, time.time()))
+            self._conn.execute(
+                'INSERT INTO quiz_lecture_stats (lecture_id, attempts) VALUES (?, 1) '
+                'ON CONFLICT(lecture_id) DO UPDATE SET attempts = attempts + 1', (lecture_id,))
+
+    def record_answer(self, attempt_id, lecture_id, question_index, question, chosen_index, correct_index, seconds):
+        """Store one answer and fold it into the aggregates; answering a question again replaces the answer"""
+        now = time.time()
+        key = question_key(question)
+        is_correct = int(chosen_index == correct_index)
+        with self._lock, self._conn:
+            previous = self._conn.execute(
+                'SELECT is_correct FROM quiz_answers WHERE attempt_id = ? AND question_index = ?',
+                (attempt_id, question_index)).fetchone()
+            if previous is None:
+                self._conn.execute(
+                    'INSERT INTO quiz_answers (attempt_id, question_index, lecture_id, question_key, chosen_index, '
+                    'correct_index, is_correct, seconds, answered_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (attempt_id, question_index, lecture_id, key, chosen_index, correct_index, is_correct, seconds, now))
+                new_answers, new_correct = 1, is_correct
+            else:
+                # Time spent on a revisited question adds up
+                self._conn.execute(
+                    'UPDATE quiz_answers SET chosen_index = ?, is_correct = ?, seconds = seconds + ?, answered_at = ? '
+                    'WHERE attempt_id = ? AND question_index = ?',
+                    (chosen_index, is_correct, seconds, now, attempt_id, question_index))
+                new_answers, new_correct = 0, is_correct - previous[0]
+
+            self._conn.execute(
+                'INSERT INTO quiz_question_stats (lecture_id, question_key, question, answers, correct, seconds) '
+                'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(lecture_id, question_key) DO UPDATE SET '
+                'answers = answers + excluded.answers, correct = correct + excluded.correct, '
+                'seconds = seconds + excluded.seconds',
+                (lecture_id, key, question, new_answers, new_correct, seconds))
+            self._conn.execute(
+                'INSERT INTO quiz_lecture_stats (lecture_id, answers, correct, seconds, last_answer) '
+                'VALUES (?, ?, ?, ?, ?) ON CONFLICT(lecture_id) DO UPDATE SET '
+                'answers = answers + excluded.answers, correct = correct + excluded.correct, '
+                'seconds = seconds + excluded.seconds, last_answer = excluded.last_answer',
+                (lecture_id, new_answers, new_correct, seconds, now))
+            self._conn.execute(
+                'UPDATE quiz_attempts SET answered = answered + ?, correct = correct + ? WHERE attempt_id = ?',
+                (new_answers, new_correct, attempt_id))
+            # The last answer finishes the attempt
+            self._finish_locked(attempt_id, 'answered >= total_questions')
+
+    def _finish_locked(self, attempt_id, condition='1'):
+        row = self._conn.execute(
+            f'SELECT lecture_id FROM quiz_attempts WHERE attempt_id = ? AND finished IS NULL AND {condition}',
+            (attempt_id,)).fetchone()
+        if row is None:
+            return
+        self._conn.execute('UPDATE quiz_attempts SET finished = ? WHERE attempt_id = ?', (time.time(), attempt_id))
+        self._conn.execute('UPDATE quiz_lecture_stats SET finished_attempts = finished_attempts + 1 '
+                           'WHERE lecture_id = ?', (row[0],))
+
+    def finish_attempt(self, attempt_id):
+        """Mark an attempt finished (once; later calls do nothing)"""
+        with self._lock, self._conn:
+            self._finish_locked(attempt_id)
+
+    def lecture_stats(self):
+        """Totals per lecture, most recently answered first"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT lecture_id, attempts, finished_attempts, answers, correct, seconds, last_answer '
+                'FROM quiz_lecture_stats ORDER BY last_answer DESC').fetchall()
+        return [{
+            'lecture_id': lecture_id,
+            'attempts': attempts,
+            'finished_attempts': finished,
+            'answers': answers,
+            'correct_rate': _rate(correct, answers),
+            'avg_seconds_per_answer': _rate(seconds, answers),
+            'last_answer': last_answer,
+        } for lecture_id, attempts, finished, answers, correct, seconds, last_answer in rows]
+
+    def question_stats(self, lecture_id, limit=None):
+        """Totals per question of a lecture, most often missed first"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT question_key, question, answers, correct, seconds FROM quiz_question_stats '
+                'WHERE lecture_id = ? ORDER BY (answers - correct) DESC, answers DESC LIMIT ?',
+                (lecture_id, limit if limit else -1)).fetchall()
+        return [{
+            'question_key': key,
+            'question': question,
+            'answers': answers,
+            'wrong': answers - correct,
+            'correct_rate': _rate(correct, answers),
+            'avg_seconds': _rate(seconds, answers),
+        } for key, question, answers, correct, seconds in rows]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = QuizStore()
+        return _store
+
+
+if __name__ == '__main__':
+    store = get_store()
+    if len(sys.argv) > 1:
+        for row in store.question_stats(sys.argv[1]):
+            print(f"{row['wrong']:5d} wrong / {row['answers']:5d}  {row['avg_seconds'] or 0:6.1f} s  {row['question'][:70]}")
+    else:
+        print(json.dumps(store.lecture_stats(), indent=2, ensure_ascii=False))
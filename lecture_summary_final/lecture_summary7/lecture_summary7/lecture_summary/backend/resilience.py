@@ -0,0 +1,381 @@
+"""Deadlines, hedged requests and circuit breakers for upstream calls.
+
+Every upstream (a Gemini model, the OpenAI realtime endpoint for one model)
+gets a name.  Per name we keep a window of recent latencies and a circuit
+breaker:
+
+- hedged_call() runs the call on a worker thread and gives up at the
+  deadline.  If the first attempt is still running after the upstream's p95
+  latency, one duplicate request is sent and whichever answers first wins
+  (hedges are capped at HEDGE_RATIO of calls so a slow upstream is not
+  flooded).
+- after BREAKER_FAILURES consecutive failures the breaker opens and calls
+  fail immediately for BREAKER_RESET_SECONDS, then one trial call is let
+  through.
+- call_with_failover() walks an ordered list of upstreams, skipping open
+  breakers.  Every upstream but the last gets a capped share of the
+  deadline (an equal split of what is left, at most ATTEMPT_P95_FACTOR x
+  its p95 once known), so a hanging primary still leaves time for the
+  fallback; the last upstream gets whatever remains.
+- is_failure(result) turns a returned result into a failure (HTTP 5xx/429),
+  is_rejection(error) marks an exception as the request's own fault (4xx):
+  it is re-raised at once, without retry, failover or a breaker failure.
+
+hedged_call_async() / call_with_failover_async() do the same for coroutines
+on the running event loop (used by asgi.py) and share the per-upstream
+latency windows and breakers with the thread-based versions.
+
+The deadline bounds how long the caller waits; an abandoned thread-based
+attempt keeps running on its worker thread until the upstream answers or its
+own HTTP timeout fires, while an abandoned async attempt is cancelled.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+LATENCY_WINDOW = 200
+MIN_SAMPLES_FOR_P95 = 20
+HEDGE_RATIO = float(os.getenv('RESILIENCE_HEDGE_RATIO', '0.1'))
+BREAKER_FAILURES = int(os.getenv('RESILIENCE_BREAKER_FAILURES', '5'))
+BREAKER_RESET_SECONDS = float(os.getenv('RESILIENCE_BREAKER_RESET_SECONDS', '30'))
+ATTEMPT_P95_FACTOR = float(os.getenv('RESILIENCE_ATTEMPT_P95_FACTOR', '3'))
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv('RESILIENCE_MAX_WORKERS', '32')),
+                               thread_name_prefix='upstream')
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class UpstreamError(RuntimeError):
+    """A call returned a result that counts as a failure (e.g. an HTTP 5xx response)"""
+
+    def __init__(self, name, result):
+        super().__init__(f"{name} returned a failed result")
+        self.result = result
+
+
+def is_upstream_failure(response):
+    """HTTP responses that say the upstream is unwell (5xx, 429) rather than that the request was bad"""
+    return response.status_code >= 500 or response.status_code == 429
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a half-open trial after reset_seconds"""
+
+    def __init__(self, name, failures=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failures
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+
+class Upstream:
+    """Latency window, counters and breaker for one named upstream"""
+
+    def __init__(self, name):
+        self.name = name
+        self.breaker = CircuitBreaker(name)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.calls = 0
+        self.hedges = 0
+        self.failures = 0
+        self.deadline_misses = 0
+        self._lock = threading.Lock()
+
+    def percentile(self, pct):
+        with self._lock:
+            ordered = sorted(self.latencies)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    def hedge_delay(self, default):
+        """p95 of recent latencies once there is enough data, else the default"""
+        if len(self.latencies) >= MIN_SAMPLES_FOR_P95:
+            return self.percentile(95)
+        return default
+
+    def may_hedge(self):
+        with self._lock:
+            return self.hedges < max(1, self.calls * HEDGE_RATIO)
+
+    def count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def record_latency(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+
+_upstreams = {}
+_upstreams_lock = threading.Lock()
+
+
+def get_upstream(name):
+    with _upstreams_lock:
+        if name not in _upstreams:
+            _upstreams[name] = Upstream(name)
+        return _upstreams[name]
+
+
+def hedged_call(fn, name, deadline, hedge_after=None, max_attempts=2, is_failure=None, is_rejection=None):
+    """Call fn(timeout_seconds) within deadline seconds, hedging after the upstream's p95.
+
+    A failed attempt is retried immediately while attempts remain.  Raises
+    CircuitOpenError, DeadlineExceeded, UpstreamError or the last exception.
+    """
+    upstream = get_upstream(name)
+    if not upstream.breaker.allow():
+        raise CircuitOpenError(f"circuit open for {name}")
+    upstream.count('calls')
+
+    started = time.monotonic()
+    end = started + deadline
+    delay = upstream.hedge_delay(hedge_after)
+    pending = {}
+    last_error = None
+
+    def launch():
+        now = time.monotonic()
+        pending[_executor.submit(fn, max(end - now, 0.1))] = now
+
+    launch()
+    attempts = 1
+    while pending:
+        now = time.monotonic()
+        if now >= end:
+            break
+        timeout = end - now
+        hedge_at = started + delay if delay is not None else None
+        if attempts < max_attempts and hedge_at is not None and hedge_at > now:
+            timeout = min(timeout, hedge_at - now)
+
+        done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            launched = pending.pop(future)
+            try:
+                result = future.result()
+                if is_failure is not None and is_failure(result):
+                    raise UpstreamError(name, result)
+            except Exception as e:
+                if is_rejection is not None and is_rejection(e):
+                    upstream.breaker.record_success()  # it answered; the request itself was bad
+                    raise
+                last_error = e
+                continue
+            upstream.record_latency(time.monotonic() - launched)
+            upstream.breaker.record_success()
+            return result
+
+        now = time.monotonic()
+        if attempts < max_attempts and now < end:
+            if not pending:
+                launch()  # every attempt so far failed fast: retry
+                attempts += 1
+            elif hedge_at is not None and now >= hedge_at and upstream.may_hedge():
+                upstream.count('hedges')
+                launch()
+                attempts += 1
+
+    upstream.count('failures')
+    upstream.breaker.record_failure()
+    if pending and time.monotonic() >= end:
+        upstream.count('deadline_misses')
+        raise DeadlineExceeded(f"{name} did not answer within {deadline:.1f}s")
+    raise last_error or DeadlineExceeded(f"{name} did not answer within {deadline:.1f}s")
+
+
+def _failover_plan(targets, name_prefix):
+    """Distinct targets in order, with their upstreams"""
+    return [(target, get_upstream(f"{name_prefix}{target}")) for target in dict.fromkeys(targets)]
+
+
+def _attempt_budget(plan, index, remaining):
+    """Seconds for plan[index]: all that is left if no later target can be tried, else a capped share"""
+    later = sum(1 for _, upstream in plan[index + 1:] if upstream.breaker.state != 'open')
+    if later == 0:
+        return remaining
+    budget = remaining / (later + 1)
+    upstream = plan[index][1]
+    if len(upstream.latencies) >= MIN_SAMPLES_FOR_P95:
+        budget = min(budget, ATTEMPT_P95_FACTOR * upstream.percentile(95))
+    return budget
+
+
+def call_with_failover(fn, targets, deadline, hedge_after=None, is_failure=None, name_prefix='', is_rejection=None):
+    """Try fn(target, timeout) for each target in order within one overall deadline.
+
+    Targets whose breaker is open are skipped without waiting, and every
+    target but the last gets only a share of the deadline (_attempt_budget).
+    Returns (target, result); raises the last error when every target failed.
+    """
+    end = time.monotonic() + deadline
+    last_error = None
+    plan = _failover_plan(targets, name_prefix)
+    for index, (target, upstream) in enumerate(plan):
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            result = hedged_call(lambda timeout, t=target: fn(t, timeout), upstream.name,
+                                 _attempt_budget(plan, index, remaining), hedge_after=hedge_after,
+                                 is_failure=is_failure, is_rejection=is_rejection)
+            return target, result
+        except Exception as e:
+            if is_rejection is not None and is_rejection(e):
+                raise  # every other target would reject the same request
+            last_error = e
+    raise last_error or DeadlineExceeded(f"no upstream answered within {deadline:.1f}s")
+
+
+async def hedged_call_async(fn, name, deadline, hedge_after=None, max_attempts=2, is_failure=None,
+                            is_rejection=None):
+    """hedged_call for coroutines: await fn(timeout_seconds) as tasks, cancelling the losers"""
+    upstream = get_upstream(name)
+    if not upstream.breaker.allow():
+        raise CircuitOpenError(f"circuit open for {name}")
+    upstream.count('calls')
+
+    started = time.monotonic()
+    end = started + deadline
+    delay = upstream.hedge_delay(hedge_after)
+    pending = {}
+    last_error = None
+
+    def launch():
+        now = time.monotonic()
+        pending[asyncio.ensure_future(fn(max(end - now, 0.1)))] = now
+
+    launch()
+    attempts = 1
+    try:
+        while pending:
+            now = time.monotonic()
+            if now >= end:
+                break
+            timeout = end - now
+            hedge_at = started + delay if delay is not None else None
+            if attempts < max_attempts and hedge_at is not None and hedge_at > now:
+                timeout = min(timeout, hedge_at - now)
+
+            done, _ = await asyncio.wait(list(pending), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                launched = pending.pop(task)
+                try:
+                    result = task.result()
+                    if is_failure is not None and is_failure(result):
+                        raise UpstreamError(name, result)
+                except Exception as e:
+                    if is_rejection is not None and is_rejection(e):
+                        upstream.breaker.record_success()  # it answered; the request itself was bad
+                        raise
+                    last_error = e
+                    continue
+                upstream.record_latency(time.monotonic() - launched)
+                upstream.breaker.record_success()
+                return result
+
+            now = time.monotonic()
+            if attempts < max_attempts and now < end:
+                if not pending:
+                    launch()  # every attempt so far failed fast: retry
+                    attempts += 1
+                elif hedge_at is not None and now >= hedge_at and upstream.may_hedge():
+                    upstream.count('hedges')
+                    launch()
+                    attempts += 1
+
+        upstream.count('failures')
+        upstream.breaker.record_failure()
+        if pending and time.monotonic() >= end:
+            upstream.count('deadline_misses')
+            raise DeadlineExceeded(f"{name} did not answer within {deadline:.1f}s")
+        raise last_error or DeadlineExceeded(f"{name} did not answer within {deadline:.1f}s")
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def call_with_failover_async(fn, targets, deadline, hedge_after=None, is_failure=None, name_prefix='',
+                                   is_rejection=None):
+    """call_with_failover for coroutines: await fn(target, timeout) for each target in order"""
+    end = time.monotonic() + deadline
+    last_error = None
+    plan = _failover_plan(targets, name_prefix)
+    for index, (target, upstream) in enumerate(plan):
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            result = await hedged_call_async(lambda timeout, t=target: fn(t, timeout), upstream.name,
+                                             _attempt_budget(plan, index, remaining), hedge_after=hedge_after,
+                                             is_failure=is_failure, is_rejection=is_rejection)
+            return target, result
+        except Exception as e:
+            if is_rejection is not None and is_rejection(e):
+                raise  # every other target would reject the same request
+            last_error = e
+    raise last_error or DeadlineExceeded(f"no upstream answered within {deadline:.1f}s")
+
+
+def upstream_stats():
+    """Breaker state, latency percentiles and counters per upstream"""
+    with _upstreams_lock:
+        upstreams = list(_upstreams.values())
+    stats = {}
+    for u in upstreams:
+        p50, p95 = u.percentile(50), u.percentile(95)
+        stats[u.name] = {
+            'state': u.breaker.state,
+            'calls': u.calls,
+            'hedges': u.hedges,
+            'failures': u.failures,
+            'deadline_misses': u.deadline_misses,
+            'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+            'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+        }
+    return stats
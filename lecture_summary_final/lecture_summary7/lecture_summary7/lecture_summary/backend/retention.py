@@ -0,0 +1,352 @@
+"""Tiered retention for uploaded audio, caches and generated artifacts.
+
+Every artifact under the managed directories is tracked in a small SQLite
+registry (size, last access, lecture, tier).  A sweep:
+
+1. removes orphaned temp_chunk_*.wav/.flac files left behind by a crashed transcription
+2. evicts artifacts whose tier TTL has expired since their last access
+3. if the total is still above the disk quota, evicts by tier (raw audio first,
+   notes/key points last) and least-recently-used within a tier
+
+A PCM cache entry (<digest>.pcm plus its .json metadata) is aged and evicted as
+one unit, and every cache hit refreshes both files.
+
+Files a running process has claimed with in_use() (a transcription's input
+and its chunks) are never removed, and raw audio used within the last
+RETENTION_RAW_AUDIO_MIN_AGE_SECONDS is not evicted for quota, so the sweep
+cannot pull audio out from under a job.
+
+    python retention.py            # one sweep, prints what was removed
+    python retention.py --dry-run
+"""
+import contextlib
+import fnmatch
+import glob
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+REGISTRY_PATH = os.path.join('processed', 'artifacts.sqlite3')
+QUOTA_BYTES = int(float(os.getenv('RETENTION_QUOTA_MB', '2048')) * 1024 * 1024)
+TEMP_CHUNK_MIN_AGE = int(os.getenv('RETENTION_TEMP_CHUNK_MIN_AGE_SECONDS', '1800'))
+RAW_AUDIO_MIN_AGE = int(os.getenv('RETENTION_RAW_AUDIO_MIN_AGE_SECONDS', str(3 * 3600)))
+IN_USE_DIR = os.path.join('processed', 'in_use')
+
+
+def _env_hours(name, default):
+    return float(os.getenv(name, default)) * 3600
+
+
+# Eviction order under quota pressure follows this list (first tier goes first)
+TIERS = [
+    ('raw_audio', _env_hours('RETENTION_RAW_AUDIO_TTL_HOURS', '48')),
+    ('cache', _env_hours('RETENTION_CACHE_TTL_HOURS', '168')),
+    ('document', _env_hours('RETENTION_DOCUMENT_TTL_HOURS', '720')),
+    ('derived', _env_hours('RETENTION_DERIVED_TTL_HOURS', '4320')),
+]
+TIER_TTL = dict(TIERS)
+TIER_PRIORITY = {name: rank for rank, (name, _) in enumerate(TIERS)}
+
+# (glob pattern relative to the backend directory, tier); first match wins
+MANAGED_PATTERNS = [
+    ('uploads/*', 'raw_audio'),
+    ('processed/pcm_cache/*', 'cache'),
+    ('generated_documents/*', 'document'),
+    ('batch_output/*/final_document.*', 'document'),
+    ('batch_output/*/*.txt', 'derived'),
+    ('processed/*.txt', 'derived'),
+    ('processed/*.json', 'derived'),
+]
+ROOT_DERIVED = ['input.txt', 'output.txt', 'key_points.txt', 'quiz.json', 'transcript_words.json',
+                'lecture_id.txt']
+TEMP_CHUNK_PATTERNS = ['temp_chunk_*.wav', 'temp_chunk_*.flac',
+                       'batch_output/*/temp_chunk_*.wav', 'batch_output/*/temp_chunk_*.flac']
+
+
+def classify(path):
+    """Tier for a path relative to the backend directory (None if unmanaged)"""
+    path = path.replace(os.sep, '/')
+    if path.endswith('.upload'):
+        return None  # still being received (save_audio_upload renames it when done)
+    if path in ROOT_DERIVED:
+        return 'derived'
+    for pattern, tier in MANAGED_PATTERNS:
+        if fnmatch.fnmatch(path, pattern):
+            return tier
+    return None
+
+
+def _normalize(path):
+    return os.path.normpath(path).replace(os.sep, '/')
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextlib.contextmanager
+def in_use(*patterns):
+    """Claim paths (glob patterns allowed) for this process while the block runs; sweeps leave them alone"""
+    marker = os.path.join(IN_USE_DIR, f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+    try:
+        os.makedirs(IN_USE_DIR, exist_ok=True)
+        with open(marker, 'w', encoding='utf-8') as f:
+            json.dump({'pid': os.getpid(), 'patterns': [_normalize(p) for p in patterns]}, f)
+    except OSError as e:
+        print(f"Warning: could not mark {patterns} as in use: {e}")
+    try:
+        yield
+    finally:
+        try:
+            os.remove(marker)
+        except OSError:
+            pass
+
+
+def claimed_patterns():
+    """Patterns claimed by live processes (markers of processes that died are removed)"""
+    patterns = []
+    for marker in glob.glob(os.path.join(IN_USE_DIR, '*.json')):
+        try:
+            with open(marker, encoding='utf-8') as f:
+                claim = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if _pid_alive(claim.get('pid', 0)):
+            patterns.extend(claim.get('patterns', []))
+        else:
+            try:
+                os.remove(marker)
+            except OSError:
+                pass
+    return patterns
+
+
+def _claimed(path, patterns):
+    path = _normalize(path)
+    return any(fnmatch.fnmatch(path, pattern) for pattern in patterns)
+
+
+class ArtifactRegistry:
+    """SQLite registry of tracked artifacts"""
+
+    def __init__(self, path=REGISTRY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS artifacts ('
+                'path TEXT PRIMARY KEY, tier TEXT NOT NULL, lecture_id TEXT, '
+                'size INTEGER NOT NULL, created REAL NOT NULL, last_access REAL NOT NULL)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_artifacts_access ON artifacts (tier, last_access)')
+
+    def track(self, path, tier=None, lecture_id=None):
+        """Register (or refresh) an artifact after it was written"""
+        tier = tier or classify(path)
+        if tier is None or not os.path.exists(path):
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT INTO artifacts (path, tier, lecture_id, size, created, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(path) DO UPDATE SET '
+                'size = excluded.size, last_access = excluded.last_access, '
+                'lecture_id = COALESCE(excluded.lecture_id, artifacts.lecture_id)',
+                (path, tier, lecture_id, os.path.getsize(path), now, now),
+            )
+
+    def touch(self, path):
+        """Record a read so LRU eviction keeps hot artifacts (registering it if it is not tracked yet)"""
+        with self._lock, self._conn:
+            updated = self._conn.execute('UPDATE artifacts SET last_access = ? WHERE path = ?',
+                                         (time.time(), path)).rowcount
+        if not updated:
+            self.track(path)
+
+    def scan(self):
+        """Pick up untracked files and forget rows whose files are gone"""
+        found = set()
+        for pattern, _ in MANAGED_PATTERNS:
+            found.update(p for p in glob.glob(pattern) if os.path.isfile(p) and classify(p))
+        found.update(p for p in ROOT_DERIVED if os.path.isfile(p))
+
+        with self._lock, self._conn:
+            known = {row[0] for row in self._conn.execute('SELECT path FROM artifacts')}
+            for path in known - found:
+                self._conn.execute('DELETE FROM artifacts WHERE path = ?', (path,))
+            for path in found - known:
+                st = os.stat(path)
+                parts = path.replace(os.sep, '/').split('/')
+                lecture_id = parts[1] if parts[0] == 'batch_output' and len(parts) > 2 else None
+                self._conn.execute(
+                    'INSERT INTO artifacts (path, tier, lecture_id, size, created, last_access) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (path, classify(path), lecture_id, st.st_size, st.st_mtime, max(st.st_atime, st.st_mtime)),
+                )
+
+    def total_size(self):
+        with self._lock:
+            return self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM artifacts').fetchone()[0]
+
+    def usage(self):
+        """Bytes and file count per tier"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT tier, COUNT(*), COALESCE(SUM(size), 0) FROM artifacts GROUP BY tier').fetchall()
+        return {tier: {'files': count, 'bytes': size} for tier, count, size in rows}
+
+    def _remove(self, path, dry_run):
+        if not dry_run:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            with self._lock, self._conn:
+                self._conn.execute('DELETE FROM artifacts WHERE path = ?', (path,))
+
+    def enforce(self, quota_bytes=QUOTA_BYTES, dry_run=False):
+        """Evict expired artifacts, then LRU by tier until under quota; returns evicted paths"""
+        now = time.time()
+        evicted = []
+        with self._lock:
+            rows = self._conn.execute('SELECT path, tier, size, last_access FROM artifacts').fetchall()
+
+        # Files that only work together (a PCM cache entry and its metadata) age and go as one
+        groups = {}
+        for path, tier, size, last_access in rows:
+            groups.setdefault(_eviction_group(path, tier), []).append((path, tier, size, last_access))
+
+        claimed = claimed_patterns()
+        remaining = []
+        protected = 0
+        for members in groups.values():
+            tier = members[0][1]
+            size = sum(m[2] for m in members)
+            last_access = max(m[3] for m in members)
+            if (any(_claimed(m[0], claimed) for m in members)
+                    or (tier == 'raw_audio' and now - last_access < RAW_AUDIO_MIN_AGE)):
+                protected += size  # a job may still be reading it
+            elif now - last_access > TIER_TTL.get(tier, float('inf')):
+                for path, _, member_size, _ in members:
+                    self._remove(path, dry_run)
+                    evicted.append((path, tier, member_size, 'ttl'))
+            else:
+                remaining.append((members, tier, size, last_access))
+
+        total = protected + sum(size for _, _, size, _ in remaining)
+        remaining.sort(key=lambda r: (TIER_PRIORITY.get(r[1], len(TIERS)), r[3]))
+        for members, tier, size, _ in remaining:
+            if total <= quota_bytes:
+                break
+            for path, _, member_size, _ in members:
+                self._remove(path, dry_run)
+                evicted.append((path, tier, member_size, 'quota'))
+            total -= size
+        return evicted
+
+
+def _eviction_group(path, tier):
+    # <digest>.pcm and <digest>.json in the PCM cache share their stem
+    if tier == 'cache':
+        return os.path.splitext(path)[0]
+    return path
+
+
+def sweep_orphan_temp_chunks(min_age=TEMP_CHUNK_MIN_AGE, dry_run=False):
+    """Delete temp_chunk_*.wav/.flac files older than min_age that no running transcription has claimed"""
+    removed = []
+    now = time.time()
+    claimed = claimed_patterns()
+    for pattern in TEMP_CHUNK_PATTERNS:
+        for path in glob.glob(pattern):
+            if _claimed(path, claimed):
+                continue
+            try:
+                if now - os.path.getmtime(path) >= min_age:
+                    if not dry_run:
+                        os.remove(path)
+                    removed.append(path)
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ArtifactRegistry()
+        return _registry
+
+
+def track(path, tier=None, lecture_id=None):
+    """Best-effort tracking helper for request handlers"""
+    try:
+        get_registry().track(path, tier, lecture_id)
+    except Exception as e:
+        print(f"Warning: could not track artifact {path}: {e}")
+
+
+def touch(path):
+    try:
+        get_registry().touch(path)
+    except Exception as e:
+        print(f"Warning: could not touch artifact {path}: {e}")
+
+
+def run_sweep(quota_bytes=QUOTA_BYTES, temp_chunk_min_age=TEMP_CHUNK_MIN_AGE, dry_run=False):
+    """Orphan sweep + registry reconcile + TTL/quota eviction"""
+    orphans = sweep_orphan_temp_chunks(temp_chunk_min_age, dry_run)
+    registry = get_registry()
+    registry.scan()
+    evicted = registry.enforce(quota_bytes, dry_run)
+    freed = sum(size for _, _, size, _ in evicted)
+    if orphans or evicted:
+        print(f"🧹 Retention: removed {len(orphans)} orphan chunks, evicted {len(evicted)} artifacts "
+              f"({freed / (1024 * 1024):.1f} MB), {registry.total_size() / (1024 * 1024):.1f} MB in use")
+    return {'orphans': orphans, 'evicted': evicted}
+
+
+def start_retention_thread(interval_seconds=3600):
+    """Run a sweep now and then every interval_seconds in a daemon thread"""
+    def loop():
+        while True:
+            try:
+                run_sweep()
+            except Exception as e:
+                print(f"Retention sweep failed: {e}")
+            time.sleep(interval_seconds)
+
+    thread = threading.Thread(target=loop, name='retention-sweeper', daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    dry_run = '--dry-run' in sys.argv
+    result = run_sweep(dry_run=dry_run)
+    for path in result['orphans']:
+        print(f"{'would remove' if dry_run else 'removed'} orphan {path}")
+    for path, tier, size, reason in result['evicted']:
+        print(f"{'would evict' if dry_run else 'evicted'} [{tier}/{reason}] {path} ({size // 1024} KB)")
+    for tier, info in get_registry().usage().items():
+        print(f"{tier:<10} {info['files']:5d} files {info['bytes'] / (1024 * 1024):9.1f} MB")
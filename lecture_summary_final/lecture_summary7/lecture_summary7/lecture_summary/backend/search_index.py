@@ -0,0 +1,187 @@
+"""Persistent full-text search over every lecture's notes and transcript.
+
+The index is an inverted index stored in SQLite (postings are keyed by the
+normalized term, see arabic_text.tokenize) and ranked with BM25.  Indexing a
+lecture replaces only that lecture's rows, so updates are incremental.
+
+    python search_index.py "الانحدار regression"     # query from the shell
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+
+from arabic_text import bm25_idf, bm25_term_score, tokenize
+from document_export import parse_text_to_model, split_sections
+
+DEFAULT_INDEX_PATH = os.getenv('SEARCH_INDEX_PATH', os.path.join('processed', 'search_index.sqlite3'))
+TRANSCRIPT_PASSAGE_WORDS = 120
+STATS_TTL_SECONDS = 30  # other processes (e.g. batch workers) may add lectures
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lectures (
+    lecture_id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sections (
+    section_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lecture_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    heading TEXT NOT NULL,
+    body TEXT NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sections_lecture ON sections (lecture_id);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    section_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, section_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_postings_section ON postings (section_id);
+"""
+
+
+def transcript_passages(text, words_per_passage=TRANSCRIPT_PASSAGE_WORDS):
+    """Split an unstructured transcript into fixed-size word windows"""
+    words = text.split()
+    return [' '.join(words[i:i + words_per_passage]) for i in range(0, len(words), words_per_passage)]
+
+
+class SearchIndex:
+    """SQLite-backed inverted index with BM25 ranking"""
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._stats = None  # cached (expires, section count, average length)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(_SCHEMA)
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def index_lecture(self, lecture_id, notes_text, transcript_text='', title=None):
+        """(Re)index one lecture's notes and transcript; other lectures are untouched"""
+        if title is None:
+            title = parse_text_to_model(notes_text).title if notes_text.strip() else lecture_id
+
+        rows = [('notes', sec.heading, '\n'.join(sec.body_lines)) for sec in split_sections(notes_text)]
+        rows += [('transcript', f"نص المحاضرة - جزء {n}", passage)
+                 for n, passage in enumerate(transcript_passages(transcript_text or ''), 1)]
+
+        conn = self._conn()
+        with conn:
+            self._delete_locked(conn, lecture_id)
+            conn.execute('INSERT INTO lectures (lecture_id, title, indexed_at) VALUES (?, ?, ?)',
+                         (lecture_id, title, time.time()))
+            for kind, heading, body in rows:
+                terms = tokenize(heading + '\n' + body)
+                cur = conn.execute(
+                    'INSERT INTO sections (lecture_id, kind, heading, body, length) VALUES (?, ?, ?, ?, ?)',
+                    (lecture_id, kind, heading, body, len(terms)),
+                )
+                conn.executemany('INSERT INTO postings (term, section_id, tf) VALUES (?, ?, ?)',
+                                 [(term, cur.lastrowid, tf) for term, tf in Counter(terms).items()])
+        self._stats = None
+        return len(rows)
+
+    def remove_lecture(self, lecture_id):
+        conn = self._conn()
+        with conn:
+            self._delete_locked(conn, lecture_id)
+        self._stats = None
+
+    def _delete_locked(self, conn, lecture_id):
+        conn.execute('DELETE FROM postings WHERE section_id IN '
+                     '(SELECT section_id FROM sections WHERE lecture_id = ?)', (lecture_id,))
+        conn.execute('DELETE FROM sections WHERE lecture_id = ?', (lecture_id,))
+        conn.execute('DELETE FROM lectures WHERE lecture_id = ?', (lecture_id,))
+
+    def _collection_stats(self, conn):
+        if self._stats is None or self._stats[0] < time.time():
+            count, avg_len = conn.execute('SELECT COUNT(*), AVG(length) FROM sections').fetchone()
+            self._stats = (time.time() + STATS_TTL_SECONDS, count or 0, avg_len or 0.0)
+        return self._stats[1:]
+
+    def search(self, query, limit=10, kind=None):
+        """Return the best matching sections for a query, best first"""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        conn = self._conn()
+        doc_count, avg_len = self._collection_stats(conn)
+        placeholders = ','.join('?' * len(terms))
+
+        doc_freq = dict(conn.execute(
+            f'SELECT term, COUNT(*) FROM postings WHERE term IN ({placeholders}) GROUP BY term',
+            tuple(terms)).fetchall())
+        rows = conn.execute(
+            f'SELECT p.term, p.section_id, p.tf, s.length FROM postings p '
+            f'JOIN sections s ON s.section_id = p.section_id WHERE p.term IN ({placeholders})'
+            + (' AND s.kind = ?' if kind else ''),
+            tuple(terms) + ((kind,) if kind else ())).fetchall()
+
+        scores = Counter()
+        for term, section_id, tf, length in rows:
+            scores[section_id] += bm25_term_score(tf, bm25_idf(doc_count, doc_freq[term]), length, avg_len)
+
+        results = []
+        for section_id, score in scores.most_common(limit):
+            lecture_id, title, section_kind, heading, body = conn.execute(
+                'SELECT s.lecture_id, l.title, s.kind, s.heading, s.body FROM sections s '
+                'JOIN lectures l ON l.lecture_id = s.lecture_id WHERE s.section_id = ?',
+                (section_id,)).fetchone()
+            results.append({
+                'lecture_id': lecture_id,
+                'lecture_title': title,
+                'section': heading,
+                'kind': section_kind,
+                'score': round(score, 4),
+                'snippet': _best_line(body, terms),
+            })
+        return results
+
+
+def _best_line(body, terms, max_chars=240):
+    """Pick the body line with the most query terms as a result snippet"""
+    lines = [line for line in body.splitlines() if line.strip()] or [body]
+    best = max(lines, key=lambda line: len(terms.intersection(tokenize(line))))
+    return best if len(best) <= max_chars else best[:max_chars] + '…'
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_index(path=DEFAULT_INDEX_PATH):
+    """Process-wide shared index for the default path"""
+    global _default_index
+    with _default_lock:
+        if _default_index is None or _default_index.path != path:
+            _default_index = SearchIndex(path)
+        return _default_index
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('Usage: python search_index.py "<query>"')
+        sys.exit(1)
+    started = time.perf_counter()
+    hits = get_index().search(' '.join(sys.argv[1:]))
+    print(f"{len(hits)} results in {(time.perf_counter() - started) * 1000:.1f} ms")
+    for hit in hits:
+        print(f"[{hit['score']:.2f}] {hit['lecture_title']} › {hit['section']}\n    {hit['snippet']}")
@@ -0,0 +1,195 @@
+"""Server-side session storage for the Flask app.
+
+Flask's default session keeps everything (including the whole randomized quiz)
+in a signed cookie that is re-sent with every request.  This module keeps the
+session data on the server instead; the cookie only carries a signed session ID.
+
+Two backends are available:
+- MemorySessionStore: a dict in this process (default, fine for one worker)
+- SQLiteSessionStore: a local SQLite file, shared by all workers on the host
+
+Both expire entries after a TTL.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+
+class MemorySessionStore:
+    """In-process session store with TTL expiry"""
+
+    def __init__(self, purge_every=500):
+        self._data = {}
+        self._lock = threading.Lock()
+        self._purge_every = purge_every
+        self._writes = 0
+
+    def get(self, sid):
+        with self._lock:
+            item = self._data.get(sid)
+            if item is None:
+                return None
+            expires, payload = item
+            if expires < time.time():
+                del self._data[sid]
+                return None
+        return json.loads(payload)
+
+    def set(self, sid, data, ttl):
+        payload = json.dumps(data, ensure_ascii=False)
+        with self._lock:
+            self._data[sid] = (time.time() + ttl, payload)
+            self._writes += 1
+            if self._writes % self._purge_every == 0:
+                self._purge_locked()
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def purge_expired(self):
+        with self._lock:
+            return self._purge_locked()
+
+    def _purge_locked(self):
+        now = time.time()
+        expired = [sid for sid, (expires, _) in self._data.items() if expires < now]
+        for sid in expired:
+            del self._data[sid]
+        return len(expired)
+
+
+class SQLiteSessionStore:
+    """Session store backed by a local SQLite file (one connection per thread)"""
+
+    def __init__(self, path, purge_every=500):
+        self.path = path
+        self._local = threading.local()
+        self._purge_every = purge_every
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            'sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires)')
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, sid):
+        row = self._conn().execute(
+            'SELECT data FROM sessions WHERE sid = ? AND expires >= ?', (sid, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, sid, data, ttl):
+        conn = self._conn()
+        conn.execute(
+            'INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)',
+            (sid, json.dumps(data, ensure_ascii=False), time.time() + ttl),
+        )
+        conn.commit()
+        self._writes += 1
+        if self._writes % self._purge_every == 0:
+            self.purge_expired()
+
+    def delete(self, sid):
+        conn = self._conn()
+        conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+        conn.commit()
+
+    def purge_expired(self):
+        conn = self._conn()
+        cur = conn.execute('DELETE FROM sessions WHERE expires < ?', (time.time(),))
+        conn.commit()
+        return cur.rowcount
+
+
+def create_session_store(backend='memory', path='processed/sessions.sqlite3'):
+    """Build a session store from a backend name ('memory' or 'sqlite')"""
+    if backend == 'sqlite':
+        return SQLiteSessionStore(path)
+    if backend == 'memory':
+        return MemorySessionStore()
+    raise ValueError(f"Unknown session store backend: {backend}")
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session dict that remembers its ID and whether it was changed"""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface that keeps data in a store and only the ID in the cookie"""
+
+    def __init__(self, store, ttl=6 * 3600):
+        self.store = store
+        self.ttl = ttl
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-side-session')
+
+    def open_session(self, app, request):
+        signed_sid = request.cookies.get(self.get_cookie_name(app))
+        if signed_sid:
+            try:
+                sid = self._signer(app).unsign(signed_sid).decode('utf-8')
+            except BadSignature:
+                sid = None
+            if sid:
+                data = self.store.get(sid)
+                if data is not None:
+                    return ServerSideSession(data, sid=sid)
+        return ServerSideSession(sid=uuid.uuid4().hex, new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if not session.modified:
+            return
+
+        self.store.set(session.sid, dict(session), self.ttl)
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid).decode('utf-8'),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
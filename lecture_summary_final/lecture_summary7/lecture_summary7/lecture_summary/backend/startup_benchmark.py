@@ -0,0 +1,124 @@
+"""Cold-start import budget for the app and the pipeline scripts.
+
+Each module is imported in a fresh interpreter with `python -X importtime`,
+a few times, keeping the fastest run.  The per-module import times of that
+run are written to processed/startup_importtime.json, and the benchmark
+exits non-zero when a module goes over its budget or pulls in one of the
+heavy dependencies that must only be loaded on first use.
+
+    python startup_benchmark.py                 # check all budgets
+    python startup_benchmark.py --top 25        # also print the slowest imports
+    STARTUP_BUDGET_APP_MS=300 python startup_benchmark.py
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.dirname(__file__))
+REPORT_PATH = os.path.join('processed', 'startup_importtime.json')
+
+# Milliseconds of cumulative import time allowed per entry module
+BUDGETS_MS = {
+    'app': float(os.getenv('STARTUP_BUDGET_APP_MS', '500')),
+    'transcribtion': float(os.getenv('STARTUP_BUDGET_TRANSCRIPTION_MS', '150')),
+    'generate_lec1': float(os.getenv('STARTUP_BUDGET_GENERATE_MS', '150')),
+    'document_export': float(os.getenv('STARTUP_BUDGET_EXPORT_MS', '150')),
+    'pipeline': float(os.getenv('STARTUP_BUDGET_PIPELINE_MS', '200')),
+}
+
+# Loaded lazily by the functions that need them; importing any of these at
+# startup is a regression even when the time budget still holds
+LAZY_MODULES = [
+    'reportlab', 'docx', 'arabic_reshaper', 'bidi',
+    'google.genai', 'google.cloud.speech_v1p1beta1', 'pydub',
+    'googleapiclient', 'google_auth_oauthlib', 'httpx',
+]
+
+_IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+
+def measure(module):
+    """Import module in a fresh interpreter; returns (cumulative_ms, rows, loaded_lazy_modules)"""
+    probe = f"import sys, json; import {module}; print(json.dumps(sorted(sys.modules)))"
+    env = dict(os.environ, RETENTION_ENABLED='0')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', probe],
+                            capture_output=True, text=True, cwd=BACKEND_DIR, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    cumulative_ms = None
+    for line in result.stderr.splitlines():
+        m = _IMPORTTIME_LINE.match(line)
+        if not m:
+            continue
+        self_us, cumulative_us, indent, name = int(m.group(1)), int(m.group(2)), m.group(3), m.group(4)
+        rows.append({'module': name, 'self_ms': self_us / 1000, 'cumulative_ms': cumulative_us / 1000,
+                     'depth': len(indent) // 2})
+        if name == module and not indent:
+            cumulative_ms = cumulative_us / 1000
+
+    loaded = set(json.loads(result.stdout.strip().splitlines()[-1]))
+    lazy_loaded = [name for name in LAZY_MODULES if name in loaded]
+    return cumulative_ms or 0.0, rows, lazy_loaded
+
+
+def run(modules, runs=3):
+    """Best-of-N measurement per module; returns the report dict"""
+    report = {}
+    for module in modules:
+        best = None
+        for _ in range(runs):
+            sample = measure(module)
+            if best is None or sample[0] < best[0]:
+                best = sample
+        cumulative_ms, rows, lazy_loaded = best
+        report[module] = {
+            'cumulative_ms': round(cumulative_ms, 1),
+            'budget_ms': BUDGETS_MS.get(module),
+            'eager_heavy_imports': lazy_loaded,
+            'imports': sorted(rows, key=lambda r: r['self_ms'], reverse=True),
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check cold-start import time against the budget')
+    parser.add_argument('modules', nargs='*', default=list(BUDGETS_MS), help='entry modules to measure')
+    parser.add_argument('--runs', type=int, default=3, help='fresh interpreters per module (best run counts)')
+    parser.add_argument('--top', type=int, default=0, help='print the N slowest imports per module')
+    args = parser.parse_args(argv)
+
+    report = run(args.modules, args.runs)
+
+    failures = []
+    for module, info in report.items():
+        budget = info['budget_ms']
+        over = budget is not None and info['cumulative_ms'] > budget
+        status = 'OVER BUDGET' if over else 'ok'
+        print(f"{module:<18} {info['cumulative_ms']:8.1f} ms  (budget {budget or '-'} ms)  {status}")
+        if over:
+            failures.append(f"{module} took {info['cumulative_ms']:.1f} ms > {budget:.0f} ms")
+        if info['eager_heavy_imports']:
+            failures.append(f"{module} imports {', '.join(info['eager_heavy_imports'])} at startup")
+        for row in info['imports'][:args.top]:
+            print(f"    {row['self_ms']:7.1f} ms self {row['cumulative_ms']:8.1f} ms cumulative  {row['module']}")
+
+    os.makedirs(os.path.join(BACKEND_DIR, 'processed'), exist_ok=True)
+    with open(os.path.join(BACKEND_DIR, REPORT_PATH), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    if failures:
+        print("\n❌ Startup budget exceeded:")
+        for failure in failures:
+            print(f"   - {failure}")
+        return 1
+    print("\n✅ Cold start within budget")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
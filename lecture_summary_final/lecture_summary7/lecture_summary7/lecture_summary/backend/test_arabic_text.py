@@ -0,0 +1,56 @@
+from arabic_text import bm25_idf, bm25_scores, normalize_arabic, tokenize
+
+
+def test_normalize_strips_diacritics_and_tatweel():
+    assert normalize_arabic('مُحَاضَرَةٌ') == 'محاضره'
+    assert normalize_arabic('عـــلم') == 'علم'
+
+
+def test_normalize_unifies_letter_variants_and_digits():
+    assert normalize_arabic('أحمد إسلام آمن') == 'احمد اسلام امن'
+    assert normalize_arabic('مستوى مسؤول شاطئ') == 'مستوي مسوول شاطي'
+    assert normalize_arabic('٢٠٢٤') == '2024'
+
+
+def test_tokenize_drops_article_and_attached_prefixes():
+    assert tokenize('الانحدار') == ['انحدار']
+    assert tokenize('والطالب بالقلم') == ['طالب', 'قلم']
+
+
+def test_tokenize_keeps_article_when_stem_would_be_too_short():
+    assert tokenize('الحب') == ['الحب']
+
+
+def test_tokenize_matches_across_spelling_variants():
+    assert tokenize('المُحاضَرة') == tokenize('المحاضره')
+
+
+def test_tokenize_lowercases_english_without_stemming():
+    assert tokenize('Linear Regression models') == ['linear', 'regression', 'models']
+
+
+def test_tokenize_stopwords():
+    assert tokenize('في the الدرس') == ['درس']
+    assert tokenize('في الدرس', keep_stopwords=True) == ['في', 'درس']
+
+
+def test_bm25_idf_is_never_negative():
+    assert bm25_idf(10, 10) > 0
+    assert bm25_idf(10, 1) > bm25_idf(10, 5)
+
+
+def test_bm25_scores_rank_matching_documents():
+    docs = [['انحدار', 'خطي'], ['شبكه', 'عصبيه'], ['انحدار', 'انحدار', 'خطي']]
+    scores = bm25_scores(['انحدار'], docs)
+    assert scores[1] == 0
+    assert scores[2] > scores[0] > 0
+
+
+def test_bm25_scores_prefer_shorter_documents_at_equal_tf():
+    docs = [['انحدار', 'خطي'], ['انحدار'] + ['كلمه'] * 20]
+    short, long = bm25_scores(['انحدار'], docs)
+    assert short > long
+
+
+def test_bm25_scores_without_documents():
+    assert bm25_scores(['انحدار'], []) == []
@@ -0,0 +1,66 @@
+import asyncio
+import os
+
+import pytest
+
+os.environ.setdefault('RETENTION_ENABLED', '0')  # no background sweeps of the working tree
+
+import asgi  # noqa: E402
+
+
+def _receiver(chunks):
+    """ASGI receive() that yields the body in the given chunks"""
+    messages = [{'type': 'http.request', 'body': chunk, 'more_body': i < len(chunks) - 1}
+                for i, chunk in enumerate(chunks)]
+
+    async def receive():
+        return messages.pop(0)
+    return receive, messages
+
+
+def _scope(method, path, headers=()):
+    return {'type': 'http', 'http_version': '1.1', 'method': method, 'path': path, 'root_path': '',
+            'query_string': b'', 'headers': list(headers), 'scheme': 'http',
+            'server': ('testserver', 80), 'client': ('127.0.0.1', 1234)}
+
+
+async def _call(scope, receive):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+    await asgi.application(scope, receive, send)
+    return sent
+
+
+@pytest.fixture
+def small_limit(monkeypatch):
+    monkeypatch.setitem(asgi.app.config, 'MAX_CONTENT_LENGTH', 10)
+
+
+def test_read_body_within_limit():
+    receive, _ = _receiver([b'hello ', b'world'])
+    body = asyncio.run(asgi._read_body(receive, 11))
+    assert body.read() == b'hello world'
+    body.close()
+
+
+def test_read_body_over_limit_stops_reading():
+    receive, left = _receiver([b'x' * 8, b'x' * 8, b'x' * 8])
+    with pytest.raises(asgi.RequestTooLarge):
+        asyncio.run(asgi._read_body(receive, 10))
+    assert len(left) == 1  # the rest of the body was never pulled in
+
+
+def test_declared_length_over_limit_is_refused_up_front(small_limit):
+    receive, left = _receiver([b'x' * 100])
+    sent = asyncio.run(_call(_scope('POST', '/upload', [(b'content-length', b'100')]), receive))
+    assert sent[0]['status'] == 413
+    assert left  # nothing was read
+
+
+def test_streamed_body_over_limit_on_async_route(small_limit):
+    receive, _ = _receiver([b'x' * 8, b'x' * 8])
+    sent = asyncio.run(_call(_scope('POST', '/quiz/generate'), receive))
+    assert sent[0]['status'] == 413
+    assert b'larger than' in sent[1]['body']
@@ -0,0 +1,139 @@
+import json
+import wave
+
+import pytest
+
+import audio_probe
+import pcm_cache
+
+
+def _samples(count):
+    # 16-bit little-endian frames whose value is their index, so slices are easy to check
+    return b''.join(n.to_bytes(2, 'little') for n in range(count))
+
+
+def _meta(rate):
+    return {'sample_rate': rate, 'sample_width': 2, 'channels': 1}
+
+
+def test_pcm_slice_ms_is_sample_exact(tmp_path):
+    path = tmp_path / 'audio.pcm'
+    path.write_bytes(_samples(16000))  # 1 s at 16 kHz
+    with pcm_cache.PCMAudio(str(path), _meta(16000)) as audio:
+        assert audio.duration_ms == 1000
+        piece = bytes(audio.slice_ms(250, 500))
+        assert len(piece) == 4000 * 2
+        assert int.from_bytes(piece[:2], 'little') == 4000
+        assert audio.segment_bytes(900, 5000) == _samples(16000)[14400 * 2:]
+        assert audio.segment_bytes(600, 400) == b''
+
+
+def test_pcm_view_of_wav_data_chunk(tmp_path):
+    path = tmp_path / 'audio.pcm'
+    path.write_bytes(b'HEADER' + _samples(100) + b'TRAILER')
+    with pcm_cache.PCMAudio(str(path), _meta(1000), data_offset=6, data_size=200) as audio:
+        assert audio.frames == 100
+        assert audio.segment_bytes(0, 100) == _samples(100)
+
+
+def test_write_wav_chunk(tmp_path):
+    path = tmp_path / 'audio.pcm'
+    path.write_bytes(_samples(8000))
+    with pcm_cache.PCMAudio(str(path), _meta(8000)) as audio:
+        audio.write_wav(str(tmp_path / 'chunk.wav'), 500, 750)
+    with wave.open(str(tmp_path / 'chunk.wav'), 'rb') as chunk:
+        assert (chunk.getframerate(), chunk.getnchannels(), chunk.getsampwidth()) == (8000, 1, 2)
+        assert chunk.readframes(chunk.getnframes()) == _samples(8000)[4000 * 2:6000 * 2]
+
+
+def test_load_pcm_cache_hit_does_not_decode(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(pcm_cache, 'CACHE_DIR', str(tmp_path / 'cache'))
+    source = tmp_path / 'lecture.mp3'
+    source.write_bytes(b'ID3 not really audio')
+    (tmp_path / 'cache').mkdir()
+    pcm_path, meta_path = pcm_cache._paths(pcm_cache.audio_hash(str(source)))
+    with open(pcm_path, 'wb') as f:
+        f.write(_samples(48000))
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(_meta(48000), f)
+
+    def no_decode(*args):
+        pytest.fail('cached audio was decoded again')
+
+    monkeypatch.setattr(pcm_cache, '_decode_to_cache', no_decode)
+    with pcm_cache.load_pcm(str(source)) as audio:
+        assert audio.duration_ms == 1000
+
+
+def test_audio_hash_follows_content(tmp_path):
+    a, b = tmp_path / 'a.mp3', tmp_path / 'b.mp3'
+    a.write_bytes(b'same bytes')
+    b.write_bytes(b'same bytes')
+    assert pcm_cache.audio_hash(str(a)) == pcm_cache.audio_hash(str(b))
+    b.write_bytes(b'other bytes')
+    assert pcm_cache.audio_hash(str(a)) != pcm_cache.audio_hash(str(b))
+
+
+FLAC_BLOCK = 4096
+FLAC_PAYLOAD = bytes(50)
+
+
+def _flac(path, frame_count, rate=16000):
+    """Synthetic mono 16-bit FLAC: real STREAMINFO and frame headers, zeroed frame bodies"""
+    packed = rate << 44 | 0 << 41 | 15 << 36 | frame_count * FLAC_BLOCK
+    streaminfo = (FLAC_BLOCK.to_bytes(2, 'big') * 2 + bytes(6) + packed.to_bytes(8, 'big')
+                  + b'\x11' * 16)
+    data = b'fLaC' + bytes([0x80]) + (34).to_bytes(3, 'big') + streaminfo
+    offsets = []
+    for number in range(frame_count):
+        offsets.append(len(data))
+        header = bytes([0xFF, 0xF8, (12 << 4) | 5, 0x08, number])
+        data += header + bytes([audio_probe._crc8(header)]) + FLAC_PAYLOAD
+    path.write_bytes(data)
+    return data, offsets
+
+
+def test_open_audio_cuts_flac_on_frame_boundaries(tmp_path):
+    data, offsets = _flac(tmp_path / 'lecture.flac', 10)
+    with pcm_cache.open_audio(str(tmp_path / 'lecture.flac')) as audio:
+        assert isinstance(audio, pcm_cache.FLACAudio)
+        assert len(audio.frames) == 10
+        assert audio.duration_ms == 2560
+
+        # Frames starting at samples 0, 4096, 8192 and 12288 fall before 1000 ms (16000)
+        assert audio.segment_bytes(0, 1000)[42:] == data[offsets[0]:offsets[4]]
+        assert audio.segment_bytes(1000, 2000)[42:] == data[offsets[4]:offsets[8]]
+
+
+def test_flac_chunk_header_is_a_standalone_stream(tmp_path):
+    data, offsets = _flac(tmp_path / 'lecture.flac', 10)
+    with pcm_cache.open_audio(str(tmp_path / 'lecture.flac')) as audio:
+        header = audio.segment_bytes(0, 1000)[:42]
+    assert header[:4] == b'fLaC'
+    assert header[4] == 0x80  # STREAMINFO is the last metadata block
+    rate, channels, bits, total, _, max_block = audio_probe.parse_flac_streaminfo(header[8:])
+    assert (rate, channels, bits, total, max_block) == (16000, 1, 16, 0, FLAC_BLOCK)
+    assert header[26:42] == bytes(16)  # MD5 unknown for a partial stream
+    assert header[8:21] == data[8:21]
+
+
+def test_flac_empty_range_and_tail(tmp_path):
+    data, offsets = _flac(tmp_path / 'lecture.flac', 10)
+    with pcm_cache.open_audio(str(tmp_path / 'lecture.flac')) as audio:
+        assert len(audio.segment_bytes(500, 500)) == 42
+        assert audio.segment_bytes(2000, 60000)[42:] == data[offsets[8]:]
+
+
+def test_open_audio_maps_speech_ready_wav(tmp_path):
+    path = tmp_path / 'lecture.mp3'  # the name does not matter, the header does
+    with wave.open(str(path), 'wb') as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(16000)
+        out.writeframes(_samples(8000))
+    with pcm_cache.open_audio(str(path)) as audio:
+        assert isinstance(audio, pcm_cache.PCMAudio)
+        assert audio.path == str(path)
+        assert audio.duration_ms == 500
+        assert audio.segment_bytes(250, 500) == _samples(8000)[4000 * 2:]
@@ -0,0 +1,67 @@
+import pytest
+
+from quiz_store import QuizStore, question_key
+
+Q1 = 'ما هو الانحدار الخطي؟'
+Q2 = 'ما هي دالة الخسارة؟'
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = QuizStore(str(tmp_path / 'quiz.sqlite3'))
+    store.start_attempt('a1', 'lecture', 'Sara', 2)
+    return store
+
+
+def _lecture(store):
+    return store.lecture_stats()[0]
+
+
+def test_question_key_ignores_whitespace():
+    assert question_key(Q1) == question_key(f"  {Q1.replace(' ', '  ')}\n")
+    assert question_key(Q1) != question_key(Q2)
+
+
+def test_answers_fold_into_the_aggregates(store):
+    store.record_answer('a1', 'lecture', 0, Q1, 1, 1, 10)
+    store.record_answer('a1', 'lecture', 1, Q2, 0, 2, 20)
+    lecture = _lecture(store)
+    assert (lecture['attempts'], lecture['answers'], lecture['correct_rate']) == (1, 2, 0.5)
+    assert lecture['avg_seconds_per_answer'] == 15
+    assert [q['question'] for q in store.question_stats('lecture')] == [Q2, Q1]  # most missed first
+
+
+def test_reanswering_replaces_the_answer_and_adds_the_time(store):
+    store.record_answer('a1', 'lecture', 0, Q1, 0, 1, 10)
+    store.record_answer('a1', 'lecture', 0, Q1, 1, 1, 5)
+    question = store.question_stats('lecture')[0]
+    assert (question['answers'], question['wrong'], question['avg_seconds']) == (1, 0, 15)
+    lecture = _lecture(store)
+    assert (lecture['answers'], lecture['correct_rate']) == (1, 1.0)
+
+
+def test_reanswering_right_then_wrong(store):
+    store.record_answer('a1', 'lecture', 0, Q1, 1, 1, 10)
+    store.record_answer('a1', 'lecture', 0, Q1, 2, 1, 10)
+    assert store.question_stats('lecture')[0]['wrong'] == 1
+    assert _lecture(store)['correct_rate'] == 0
+
+
+def test_attempt_finishes_once_when_every_question_is_answered(store):
+    store.record_answer('a1', 'lecture', 0, Q1, 1, 1, 10)
+    store.record_answer('a1', 'lecture', 0, Q1, 1, 1, 10)  # a re-answer does not complete the quiz
+    assert _lecture(store)['finished_attempts'] == 0
+    store.record_answer('a1', 'lecture', 1, Q2, 2, 2, 10)
+    assert _lecture(store)['finished_attempts'] == 1
+    store.record_answer('a1', 'lecture', 1, Q2, 0, 2, 10)
+    store.finish_attempt('a1')
+    assert _lecture(store)['finished_attempts'] == 1
+
+
+def test_same_question_across_attempts_counts_as_one(store):
+    store.start_attempt('a2', 'lecture', 'Omar', 1)
+    store.record_answer('a1', 'lecture', 0, Q1, 1, 1, 10)
+    store.record_answer('a2', 'lecture', 0, f"{Q1} ", 0, 1, 30)
+    questions = store.question_stats('lecture')
+    assert len(questions) == 1
+    assert (questions[0]['answers'], questions[0]['wrong'], questions[0]['avg_seconds']) == (2, 1, 20)
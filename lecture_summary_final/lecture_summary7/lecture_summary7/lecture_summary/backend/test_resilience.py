@@ -0,0 +1,173 @@
+import asyncio
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpenError, UpstreamError
+
+
+@pytest.fixture
+def prefix():
+    """Upstreams are process-wide: give every test its own names"""
+    return f"test-{uuid.uuid4().hex[:8]}:"
+
+
+class Rejected(Exception):
+    pass
+
+
+def _response(status_code):
+    return SimpleNamespace(status_code=status_code)
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker('b', failures=3, reset_seconds=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()  # a success resets the count
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == 'closed' and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker('b', failures=1, reset_seconds=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.state == 'half_open'
+    assert breaker.allow()
+    assert not breaker.allow()  # only one trial at a time
+
+
+def test_breaker_trial_failure_reopens_and_success_closes():
+    breaker = CircuitBreaker('b', failures=5, reset_seconds=0.05)
+    for _ in range(5):
+        breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.failures == 0
+
+
+def test_failover_to_next_target_on_error(prefix):
+    calls = []
+
+    def fn(target, timeout):
+        calls.append(target)
+        if target == 'primary':
+            raise ConnectionError('down')
+        return f"answer from {target}"
+
+    assert resilience.call_with_failover(fn, ['primary', 'backup'], 5, name_prefix=prefix) == \
+        ('backup', 'answer from backup')
+    assert calls == ['primary', 'primary', 'backup']  # one immediate retry before failing over
+    assert resilience.get_upstream(prefix + 'primary').breaker.failures == 1
+
+
+def test_hanging_primary_leaves_time_for_backup(prefix):
+    def fn(target, timeout):
+        if target == 'primary':
+            time.sleep(timeout + 0.3)  # ignores its own timeout
+        return target
+
+    started = time.monotonic()
+    assert resilience.call_with_failover(fn, ['primary', 'backup'], 1.0, name_prefix=prefix) == ('backup', 'backup')
+    assert time.monotonic() - started < 1.0
+    assert resilience.get_upstream(prefix + 'primary').deadline_misses == 1
+
+
+def test_open_breaker_is_skipped(prefix):
+    breaker = resilience.get_upstream(prefix + 'primary').breaker
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    calls = []
+
+    def fn(target, timeout):
+        calls.append(target)
+        return target
+
+    assert resilience.call_with_failover(fn, ['primary', 'backup'], 5, name_prefix=prefix) == ('backup', 'backup')
+    assert calls == ['backup']
+
+
+def test_rejection_is_raised_without_retry_or_failover(prefix):
+    calls = []
+
+    def fn(target, timeout):
+        calls.append(target)
+        raise Rejected('bad request')
+
+    with pytest.raises(Rejected):
+        resilience.call_with_failover(fn, ['primary', 'backup'], 5, name_prefix=prefix,
+                                      is_rejection=lambda e: isinstance(e, Rejected))
+    assert calls == ['primary']
+    assert resilience.get_upstream(prefix + 'primary').breaker.failures == 0
+
+
+def test_failed_results_count_as_failures(prefix):
+    responses = {'primary': _response(503), 'backup': _response(200)}
+    target, response = resilience.call_with_failover(lambda t, timeout: responses[t], ['primary', 'backup'], 5,
+                                                     is_failure=resilience.is_upstream_failure, name_prefix=prefix)
+    assert (target, response.status_code) == ('backup', 200)
+    assert resilience.get_upstream(prefix + 'primary').failures == 1
+
+
+def test_client_errors_are_returned_not_failed_over(prefix):
+    target, response = resilience.call_with_failover(lambda t, timeout: _response(404), ['primary', 'backup'], 5,
+                                                     is_failure=resilience.is_upstream_failure, name_prefix=prefix)
+    assert (target, response.status_code) == ('primary', 404)
+
+
+def test_every_target_failing_raises_the_last_error(prefix):
+    with pytest.raises(UpstreamError) as raised:
+        resilience.call_with_failover(lambda t, timeout: _response(429), ['primary', 'backup'], 5,
+                                      is_failure=resilience.is_upstream_failure, name_prefix=prefix)
+    assert raised.value.result.status_code == 429
+
+
+def test_hedged_call_refuses_when_circuit_open(prefix):
+    breaker = resilience.get_upstream(prefix + 'only').breaker
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        resilience.hedged_call(lambda timeout: 'never', prefix + 'only', 5)
+
+
+def test_async_failover_cancels_hanging_primary(prefix):
+    cancelled = []
+
+    async def fn(target, timeout):
+        if target == 'primary':
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.append(target)
+                raise
+        return target
+
+    started = time.monotonic()
+    result = asyncio.run(resilience.call_with_failover_async(fn, ['primary', 'backup'], 1.0, name_prefix=prefix))
+    assert result == ('backup', 'backup')
+    assert cancelled == ['primary']
+    assert time.monotonic() - started < 1.0
+
+
+def test_async_rejection_is_raised(prefix):
+    async def fn(target, timeout):
+        raise Rejected(target)
+
+    with pytest.raises(Rejected):
+        asyncio.run(resilience.call_with_failover_async(fn, ['primary', 'backup'], 5, name_prefix=prefix,
+                                                        is_rejection=lambda e: isinstance(e, Rejected)))
+    assert resilience.get_upstream(prefix + 'backup').calls == 0
@@ -0,0 +1,134 @@
+import json
+import os
+import time
+
+import pytest
+
+import retention
+
+HOUR = 3600
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return retention.ArtifactRegistry()
+
+
+def _write(path, size=100, age=0):
+    """Create a managed file whose last access was age seconds ago"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(bytes(size))
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+
+
+def _evicted(result):
+    return [(path, reason) for path, _, _, reason in result]
+
+
+def test_classify():
+    assert retention.classify('uploads/audio_input.mp3') == 'raw_audio'
+    assert retention.classify('uploads/audio_input.mp3.upload') is None
+    assert retention.classify('processed/pcm_cache/abc.pcm') == 'cache'
+    assert retention.classify('quiz.json') == 'derived'
+    assert retention.classify('app.py') is None
+
+
+def test_expired_artifacts_are_evicted(registry):
+    _write('uploads/old.mp3', age=49 * HOUR)
+    _write('uploads/kept.mp3', age=4 * HOUR)
+    _write('output.txt', age=49 * HOUR)
+    registry.scan()
+    assert _evicted(registry.enforce()) == [('uploads/old.mp3', 'ttl')]
+    assert not os.path.exists('uploads/old.mp3')
+    assert os.path.exists('uploads/kept.mp3') and os.path.exists('output.txt')
+
+
+def test_dry_run_removes_nothing(registry):
+    _write('uploads/old.mp3', age=49 * HOUR)
+    registry.scan()
+    assert _evicted(registry.enforce(dry_run=True)) == [('uploads/old.mp3', 'ttl')]
+    assert os.path.exists('uploads/old.mp3')
+    assert registry.total_size() == 100
+
+
+def test_quota_evicts_by_tier_then_least_recently_used(registry):
+    _write('output.txt', age=10 * HOUR)
+    _write('generated_documents/older.docx', age=6 * HOUR)
+    _write('generated_documents/newer.docx', age=5 * HOUR)
+    _write('uploads/lecture.mp3', age=4 * HOUR)
+    registry.scan()
+    assert _evicted(registry.enforce(quota_bytes=150)) == [
+        ('uploads/lecture.mp3', 'quota'),
+        ('generated_documents/older.docx', 'quota'),
+        ('generated_documents/newer.docx', 'quota'),
+    ]
+    assert registry.usage() == {'derived': {'files': 1, 'bytes': 100}}
+
+
+def test_recent_raw_audio_is_not_evicted_for_quota(registry):
+    _write('uploads/new.mp3', age=60)
+    _write('output.txt', age=10 * HOUR)
+    registry.scan()
+    assert _evicted(registry.enforce(quota_bytes=0)) == [('output.txt', 'quota')]
+    assert os.path.exists('uploads/new.mp3')
+
+
+def test_claimed_files_are_kept(registry):
+    _write('uploads/old.mp3', age=49 * HOUR)
+    _write('generated_documents/notes.docx', age=5 * HOUR)
+    registry.scan()
+    with retention.in_use('uploads/old.mp3', 'generated_documents/*'):
+        assert registry.enforce(quota_bytes=0) == []
+    assert not os.listdir(retention.IN_USE_DIR)  # the claim ends with the block
+    assert len(registry.enforce(quota_bytes=0)) == 2
+
+
+def test_claims_of_dead_processes_are_dropped(registry):
+    os.makedirs(retention.IN_USE_DIR)
+    marker = os.path.join(retention.IN_USE_DIR, 'dead.json')
+    with open(marker, 'w', encoding='utf-8') as f:
+        json.dump({'pid': 2 ** 30, 'patterns': ['uploads/*']}, f)
+    assert retention.claimed_patterns() == []
+    assert not os.path.exists(marker)
+
+
+def test_touch_registers_untracked_files(registry):
+    _write('processed/notes.txt', size=40)
+    registry.touch('processed/notes.txt')
+    assert registry.usage() == {'derived': {'files': 1, 'bytes': 40}}
+
+
+def test_scan_forgets_deleted_files(registry):
+    _write('output.txt')
+    registry.scan()
+    os.remove('output.txt')
+    registry.scan()
+    assert registry.total_size() == 0
+
+
+def test_pcm_cache_pair_ages_as_one(registry):
+    _write('processed/pcm_cache/abc.pcm', size=1000, age=200 * HOUR)
+    _write('processed/pcm_cache/abc.json', size=10, age=HOUR)
+    registry.scan()
+    assert registry.enforce() == []  # the recent metadata read keeps the samples too
+
+
+def test_pcm_cache_pair_is_evicted_together(registry):
+    _write('processed/pcm_cache/abc.pcm', size=1000, age=2 * HOUR)
+    _write('processed/pcm_cache/abc.json', size=10, age=2 * HOUR)
+    _write('processed/pcm_cache/def.pcm', size=1000, age=HOUR)
+    _write('processed/pcm_cache/def.json', size=10, age=HOUR)
+    registry.scan()
+    evicted = _evicted(registry.enforce(quota_bytes=1500))
+    assert sorted(evicted) == [('processed/pcm_cache/abc.json', 'quota'), ('processed/pcm_cache/abc.pcm', 'quota')]
+    assert sorted(os.listdir('processed/pcm_cache')) == ['def.json', 'def.pcm']
+
+
+def test_orphan_temp_chunks_are_swept(registry):
+    _write('temp_chunk_1.wav', age=2 * HOUR)
+    _write('temp_chunk_2.flac', age=60)
+    assert retention.sweep_orphan_temp_chunks(min_age=HOUR) == ['temp_chunk_1.wav']
+    assert os.path.exists('temp_chunk_2.flac')
@@ -0,0 +1,68 @@
+import pytest
+
+from search_index import SearchIndex, transcript_passages
+
+REGRESSION_NOTES = """# الانحدار الخطي
+
+## تعريف الانحدار
+- الانحدار الخطي يتنبأ بقيمة مستمرة
+- يستخدم Linear Regression لتقدير العلاقة
+
+## دالة الخسارة
+- متوسط مربع الخطأ
+"""
+
+NETWORK_NOTES = """# الشبكات العصبية
+
+## الطبقات
+- كل طبقة تحتوي على خلايا عصبية
+"""
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path / 'search.sqlite3'))
+    index.index_lecture('regression', REGRESSION_NOTES, 'في هذه المحاضرة نشرح مربع الخطأ بالتفصيل')
+    index.index_lecture('networks', NETWORK_NOTES)
+    return index
+
+
+def test_search_finds_section_across_spelling_variants(index):
+    results = index.search('الانحدارُ')
+    assert results
+    assert results[0]['lecture_id'] == 'regression'
+    assert results[0]['section'] == 'تعريف الانحدار'
+
+
+def test_search_matches_english_terms_case_insensitively(index):
+    results = index.search('REGRESSION')
+    assert [r['lecture_id'] for r in results] == ['regression']
+    assert 'Linear Regression' in results[0]['snippet']
+
+
+def test_search_kind_filter(index):
+    kinds = {r['kind'] for r in index.search('مربع الخطأ')}
+    assert kinds == {'notes', 'transcript'}
+    assert {r['kind'] for r in index.search('مربع الخطأ', kind='transcript')} == {'transcript'}
+
+
+def test_search_without_terms(index):
+    assert index.search('في the') == []
+
+
+def test_reindexing_replaces_only_that_lecture(index):
+    index.index_lecture('regression', '# الانحدار اللوجستي\n\n## التصنيف\n- احتمال الفئة')
+    assert index.search('مستمرة') == []
+    assert index.search('التصنيف')[0]['lecture_id'] == 'regression'
+    assert index.search('الطبقات')[0]['lecture_id'] == 'networks'
+
+
+def test_remove_lecture(index):
+    index.remove_lecture('networks')
+    assert index.search('الطبقات') == []
+    assert index.search('الانحدار')
+
+
+def test_transcript_passages_split_by_word_count():
+    passages = transcript_passages(' '.join(str(n) for n in range(250)), words_per_passage=100)
+    assert [len(p.split()) for p in passages] == [100, 100, 50]
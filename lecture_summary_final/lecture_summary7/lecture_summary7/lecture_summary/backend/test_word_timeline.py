@@ -0,0 +1,84 @@
+import pytest
+
+from word_timeline import WordTimeline
+
+
+def _timeline(words, weak=(), start_ms=0):
+    """One word every 500 ms, each 400 ms long; indexes in weak get confidence 0.3"""
+    timeline = WordTimeline()
+    for i, word in enumerate(words):
+        start = start_ms + i * 500
+        timeline.append(word, start, start + 400, 0.3 if i in weak else 0.9)
+    return timeline
+
+
+WORDS = [f'w{n}' for n in range(10)]
+
+
+def test_locate_in_follows_the_transcript():
+    timeline = _timeline(['في', 'هذه', 'المحاضرة', 'في'])
+    text = 'في هذه المحاضرة نشرح في'
+    assert timeline.locate_in(text) == [(0, 2), (3, 6), (7, 15), (21, 23)]
+
+
+def test_locate_in_marks_missing_words_and_keeps_going():
+    timeline = _timeline(['alpha', 'missing', 'beta'])
+    assert timeline.locate_in('alpha and beta') == [(0, 5), None, (10, 14)]
+
+
+def test_locate_in_does_not_jump_far_ahead():
+    timeline = _timeline(['alpha', 'beta'])
+    text = 'alpha ' + 'x' * 50 + ' beta'
+    assert timeline.locate_in(text, max_skip=10) == [(0, 5), None]
+
+
+def test_low_confidence_spans_merge_and_pad():
+    timeline = _timeline(WORDS, weak={3, 5})
+    # Words 3 and 5 merge; the padded window (1200-3200 ms) overlaps words 2-6
+    assert timeline.low_confidence_spans() == [(1000, 3400, 2, 7)]
+
+
+def test_low_confidence_spans_stay_apart_when_far():
+    timeline = _timeline(WORDS, weak={1, 8})
+    assert timeline.low_confidence_spans(merge_gap_ms=0) == [(0, 1400, 0, 3), (3500, 4900, 7, 10)]
+
+
+def test_low_confidence_spans_merge_after_widening():
+    timeline = _timeline(WORDS, weak={3, 4})
+    # Not merged by gap, but the padded word ranges (2-5 and 3-6) overlap
+    assert timeline.low_confidence_spans(merge_gap_ms=0) == [(1000, 2900, 2, 6)]
+
+
+def test_low_confidence_spans_none_when_confident():
+    assert _timeline(WORDS).low_confidence_spans() == []
+
+
+def test_splice_replaces_words_and_timings_together():
+    timeline = _timeline(WORDS)
+    timeline.splice(2, 4, _timeline(['a', 'b', 'c'], weak={1}, start_ms=1000))
+    assert timeline.words[:6] == ['w0', 'w1', 'a', 'b', 'c', 'w4']
+    assert len(timeline.start_ms) == len(timeline.end_ms) == len(timeline.confidence) == 11
+    assert list(timeline.start_ms[2:5]) == [1000, 1500, 2000]
+    assert timeline.confidence[3] == pytest.approx(0.3)
+
+
+def test_trim_unchanged_narrows_to_the_changed_words():
+    timeline = _timeline(['a', 'b', 'c', 'd', 'e'])
+    first, last, replacement = timeline.trim_unchanged(1, 4, _timeline(['b', 'X', 'd']))
+    assert (first, last, replacement.words) == (2, 3, ['X'])
+
+
+def test_trim_unchanged_identical_replacement_is_empty():
+    timeline = _timeline(['a', 'b', 'c'])
+    first, last, replacement = timeline.trim_unchanged(0, 3, _timeline(['a', 'b', 'c']))
+    assert first == last and len(replacement) == 0
+
+
+def test_save_load_round_trip(tmp_path):
+    timeline = _timeline(['مرحبا', 'بكم'], weak={1})
+    timeline.save(str(tmp_path / 'words.json'))
+    loaded = WordTimeline.load(str(tmp_path / 'words.json'))
+    assert loaded.words == timeline.words
+    assert loaded.start_ms == timeline.start_ms
+    assert loaded.end_ms == timeline.end_ms
+    assert loaded.confidence == timeline.confidence
@@ -1,25 +1,36 @@
-from google.cloud import speech_v1p1beta1 as speech
-import pydub
-from pydub import AudioSegment
 import os
+import sys
+import audio_probe
+import clients
+import jobs
+import pcm_cache
+import retention
+from word_timeline import WordTimeline
 
-def chunk_audio(file_path, chunk_length_ms=50000):  # 50 seconds per chunk
+# (language_code, model) pairs tried for low-confidence spans, best confidence wins
+RETRANSCRIBE_ALTERNATIVES = [
+    (os.getenv("RETRANSCRIBE_LANGUAGE", "ar-JO"), os.getenv("RETRANSCRIBE_MODEL", "latest_long")),
+    (os.getenv("RETRANSCRIBE_FALLBACK_LANGUAGE", "ar-SA"), None),
+]
+RETRANSCRIBE_ENABLED = os.getenv("RETRANSCRIBE_LOW_CONFIDENCE") == "1"
+RETRANSCRIBE_THRESHOLD = float(os.getenv("RETRANSCRIBE_THRESHOLD", "0.6"))
+WORD_TIMELINE_PATH = "transcript_words.json"
+
+def chunk_audio(file_path, chunk_length_ms=50000, chunk_dir="."):  # 50 seconds per chunk
     """Split audio file into chunks for processing"""
     try:
         print(f"Loading audio file: {file_path}")
-        audio = AudioSegment.from_mp3(file_path)
-        print(f"Audio loaded: {len(audio)}ms duration")
-        
-        # Convert to mono (single channel) and set sample rate
-        audio = audio.set_channels(1).set_frame_rate(48000)
-        chunks = []
-        
-        for i in range(0, len(audio), chunk_length_ms):
-            chunk = audio[i:i + chunk_length_ms]
-            chunk_path = f"temp_chunk_{i//chunk_length_ms}.wav"
-            print(f"Creating chunk: {chunk_path}")
-            chunk.export(chunk_path, format="wav")
-            chunks.append(chunk_path)
+        # Speech-ready WAV/FLAC is sliced as-is; anything else is decoded once
+        # to mono 48 kHz PCM and cached per audio hash
+        with pcm_cache.open_audio(file_path) as audio:
+            print(f"Audio loaded: {audio.duration_ms}ms duration")
+            chunks = []
+            
+            for i in range(0, audio.duration_ms, chunk_length_ms):
+                chunk_path = os.path.join(chunk_dir, f"temp_chunk_{i//chunk_length_ms}{audio.chunk_extension}")
+                print(f"Creating chunk: {chunk_path}")
+                audio.write_chunk(chunk_path, i, i + chunk_length_ms)
+                chunks.append(chunk_path)
         
         print(f"Successfully created {len(chunks)} chunks")
         return chunks
@@ -28,56 +39,160 @@ def chunk_audio(file_path, chunk_length_ms=50000):  # 50 seconds per chunk
         print(f"Error in chunk_audio: {e}")
         return []
 
-def transcribe_chunk(chunk_path, language_code="ar-JO"):
-    """Transcribe a single audio chunk"""
-    client = speech.SpeechClient()
-    
-    with open(chunk_path, "rb") as audio_file:
-        content = audio_file.read()
+def _speech():
+    """google.cloud.speech (gRPC + protobuf) is only loaded when audio is recognized"""
+    from google.cloud import speech_v1p1beta1 as speech
+    return speech
+
+def recognize_audio(content, language_code="ar-JO", sample_rate=pcm_cache.SAMPLE_RATE,
+                    timeline=None, offset_ms=0, model=None, encoding="LINEAR16"):
+    """Send LINEAR16 (WAV or raw PCM bytes) or FLAC audio to Google Speech"""
+    speech = _speech()
+    client = clients.speech_client()
     
     audio = speech.RecognitionAudio(content=content)
     config = speech.RecognitionConfig(
-        encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
-        sample_rate_hertz=48000,  # Match the actual audio sample rate
+        encoding=getattr(speech.RecognitionConfig.AudioEncoding, encoding),
+        sample_rate_hertz=sample_rate,  # Match the actual audio sample rate
         language_code=language_code,
         enable_automatic_punctuation=True,
         enable_word_confidence=True,
+        enable_word_time_offsets=True,
     )
+    if model:
+        config.model = model
     
     response = client.recognize(config=config, audio=audio)
     
+    # Keep per-word confidences and offsets for selective re-transcription
+    if timeline is not None:
+        timeline.add_recognition_results(response.results, offset_ms)
+    
     transcript = ""
     for result in response.results:
         transcript += result.alternatives[0].transcript + " "
     
     return transcript.strip()
 
-def transcribe_long_arabic_audio(file_path, language_code="ar-JO"):
-    """Transcribe long Arabic audio by chunking"""
-    print(f"Processing {file_path} for Arabic transcription...")
+def transcribe_chunk(chunk_path, language_code="ar-JO", timeline=None, offset_ms=0, sample_rate=None):
+    """Transcribe a single audio chunk (WAV or FLAC; the sample rate is read from its header if not given)"""
+    info = audio_probe.probe(chunk_path)
+    with open(chunk_path, "rb") as audio_file:
+        content = audio_file.read()
+    
+    encoding = "FLAC" if info.container == "flac" else "LINEAR16"
+    return recognize_audio(content, language_code, sample_rate or info.sample_rate or pcm_cache.SAMPLE_RATE,
+                           timeline=timeline, offset_ms=offset_ms, encoding=encoding)
+
+def transcribe_segment(file_path, start_ms, end_ms, language_code="ar-JO", timeline=None, model=None, audio=None):
+    """Transcribe a time span straight from the source or PCM cache (no decode, no temp file)"""
+    if audio is None:
+        with pcm_cache.open_audio(file_path) as opened:
+            return transcribe_segment(file_path, start_ms, end_ms, language_code, timeline, model, opened)
+    content = audio.segment_bytes(start_ms, end_ms)
+    return recognize_audio(content, language_code, audio.sample_rate, timeline, start_ms, model, audio.encoding)
+
+def retranscribe_low_confidence(file_path, timeline, threshold=0.6, alternatives=None, min_gain=0.05, text=None):
+    """Re-run only the low-confidence spans with other models/language variants and splice in better words.
+    
+    When text (the transcript the timeline was built with) is given, only the
+    replaced spans are rewritten in it, so its punctuation and line breaks stay.
+    Returns (spans_tried, spans_replaced, seconds_retranscribed, text).
+    """
+    alternatives = alternatives or RETRANSCRIBE_ALTERNATIVES
+    spans = timeline.low_confidence_spans(threshold)
+    offsets = timeline.locate_in(text) if text is not None else []
+    replaced = 0
+    seconds = 0.0
+    with retention.in_use(file_path), pcm_cache.open_audio(file_path) as audio:
+        # Splice from the end so earlier word indexes stay valid
+        for start_ms, end_ms, first, last in reversed(spans):
+            seconds += (end_ms - start_ms) / 1000
+            best, best_conf = None, timeline.mean_confidence(first, last) + min_gain
+            for language_code, model in alternatives:
+                candidate = WordTimeline()
+                try:
+                    transcribe_segment(file_path, start_ms, end_ms, language_code, candidate, model, audio)
+                except Exception as e:
+                    print(f"Re-transcription of {start_ms}-{end_ms}ms with {language_code}/{model} failed: {e}")
+                    continue
+                if len(candidate) and candidate.mean_confidence() > best_conf:
+                    best, best_conf = candidate, candidate.mean_confidence()
+            if best is not None:
+                # The padded window repeats neighbouring words; only the changed ones are replaced
+                first, last, best = timeline.trim_unchanged(first, last, best)
+                if first == last and not len(best):
+                    continue
+                if text is not None:
+                    if first == last:
+                        print(f"Span {start_ms}-{end_ms}ms only inserts words, keeping the transcript text")
+                        continue
+                    if offsets[first] is None or offsets[last - 1] is None:
+                        print(f"Span {start_ms}-{end_ms}ms not found in the transcript text, keeping it")
+                        continue
+                    text = text[:offsets[first][0]] + best.text() + text[offsets[last - 1][1]:]
+                timeline.splice(first, last, best)
+                replaced += 1
+    print(f"Re-transcribed {len(spans)} low-confidence spans ({seconds:.1f}s of audio), replaced {replaced}")
+    return len(spans), replaced, seconds, text
+
+def finish_chunk(file_path, chunk_transcript, chunk_timeline, timeline):
+    """Per-chunk post-processing shared by the sequential and pipelined paths:
+    optionally re-transcribe the chunk's low-confidence spans, then append its words to the timeline"""
+    if RETRANSCRIBE_ENABLED and len(chunk_timeline):
+        _, _, _, chunk_transcript = retranscribe_low_confidence(file_path, chunk_timeline, RETRANSCRIBE_THRESHOLD,
+                                                                text=chunk_transcript)
+    timeline.splice(len(timeline), len(timeline), chunk_timeline)
+    return chunk_transcript
+
+def save_timeline(timeline, path=WORD_TIMELINE_PATH):
+    """Write the word timeline next to input.txt (skipped when no words were recognised)"""
+    if len(timeline):
+        timeline.save(path)
+        print(f"Word timeline saved: {len(timeline)} words, mean confidence {timeline.mean_confidence():.2f}")
+
+def iter_transcribed_chunks(file_path, language_code="ar-JO", chunk_dir=".", chunk_length_ms=50000, timeline=None):
+    """Yield (chunk_number, total_chunks, transcript) as soon as each chunk is transcribed"""
+    # The retention sweep must not remove the input or chunks while they are in use
+    with retention.in_use(file_path, os.path.join(chunk_dir, "temp_chunk_*")):
+        yield from _transcribe_chunks(file_path, language_code, chunk_dir, chunk_length_ms, timeline)
+
+def _transcribe_chunks(file_path, language_code, chunk_dir, chunk_length_ms, timeline):
+    # Create audio chunks
+    chunks = chunk_audio(file_path, chunk_length_ms, chunk_dir=chunk_dir)
+    print(f"Created {len(chunks)} audio chunks")
+    
+    created_chunks = []  # Track which chunks were actually created
     
     try:
-        # Create audio chunks
-        chunks = chunk_audio(file_path)
-        print(f"Created {len(chunks)} audio chunks")
-        
-        full_transcript = ""
-        created_chunks = []  # Track which chunks were actually created
-        
         for i, chunk_path in enumerate(chunks):
             print(f"Transcribing chunk {i+1}/{len(chunks)}...")
+            chunk_transcript = ""
+            chunk_timeline = WordTimeline() if timeline is not None else None
             try:
                 # Check if chunk file exists before processing
                 if os.path.exists(chunk_path):
                     created_chunks.append(chunk_path)
-                    chunk_transcript = transcribe_chunk(chunk_path, language_code)
-                    full_transcript += chunk_transcript + " "
+                    chunk_transcript = transcribe_chunk(chunk_path, language_code, chunk_timeline, i * chunk_length_ms)
                     print(f"Chunk {i+1} transcribed: {chunk_transcript[:100]}...")
                 else:
                     print(f"Warning: Chunk file {chunk_path} does not exist, skipping...")
             except Exception as e:
                 print(f"Error transcribing chunk {i+1}: {e}")
-        
+                # Retry the same span from the source/cached PCM without re-decoding
+                chunk_timeline = WordTimeline() if timeline is not None else None
+                try:
+                    start_ms = i * chunk_length_ms
+                    chunk_transcript = transcribe_segment(file_path, start_ms, start_ms + chunk_length_ms, language_code, chunk_timeline)
+                    print(f"Chunk {i+1} transcribed on retry")
+                except Exception as retry_error:
+                    print(f"Retry of chunk {i+1} failed: {retry_error}")
+            if chunk_timeline is not None:
+                chunk_transcript = finish_chunk(file_path, chunk_transcript, chunk_timeline, timeline)
+            # Picked up by the web app for the job's progress stream
+            jobs.report("transcription", i + 1, len(chunks))
+            yield i + 1, len(chunks), chunk_transcript
+    finally:
         # Clean up all created chunk files
         for chunk_path in created_chunks:
             try:
@@ -86,6 +201,16 @@ def transcribe_long_arabic_audio(file_path, language_code="ar-JO"):
                     print(f"Cleaned up: {chunk_path}")
             except Exception as e:
                 print(f"Warning: Could not remove chunk file {chunk_path}: {e}")
+
+def transcribe_long_arabic_audio(file_path, language_code="ar-JO", chunk_dir=".", chunk_length_ms=50000, timeline=None):
+    """Transcribe long Arabic audio by chunking"""
+    print(f"Processing {file_path} for Arabic transcription...")
+    
+    try:
+        full_transcript = ""
+        for _, _, chunk_transcript in iter_transcribed_chunks(file_path, language_code, chunk_dir, chunk_length_ms, timeline):
+            if chunk_transcript:
+                full_transcript += chunk_transcript + " "
         
         return full_transcript.strip()
         
@@ -94,10 +219,15 @@ def transcribe_long_arabic_audio(file_path, language_code="ar-JO"):
         return ""
 
 if __name__ == "__main__":
-    # Check for uploaded audio file from Flask app
-    # First check in uploads directory (Flask app location)
+    # The Flask app passes the uploaded file (its extension matches the probed format);
+    # otherwise check the uploads directory, then the current directory
     uploads_dir = "uploads"
-    audio_file = os.path.join(uploads_dir, "audio_input.mp3")
+    if len(sys.argv) > 1:
+        audio_file = sys.argv[1]
+    else:
+        # The lecture upload is saved with the extension of its probed format
+        saved = [os.path.join(uploads_dir, f"audio_input.{ext}") for ext in ("mp3", "wav", "flac", "m4a")]
+        audio_file = next((path for path in saved if os.path.exists(path)), saved[0])
     
     # If not found in uploads, check current directory
     if not os.path.exists(audio_file):
@@ -111,8 +241,11 @@ if __name__ == "__main__":
                 print("Error: No audio file found. Please upload an audio file first.")
                 exit(1)
     
-    # Transcribe the audio file
-    result = transcribe_long_arabic_audio(audio_file, "ar-JO")
+    # Transcribe the audio file, keeping word confidences and offsets
+    # (low-confidence spans are re-transcribed per chunk when enabled)
+    timeline = WordTimeline()
+    result = transcribe_long_arabic_audio(audio_file, "ar-JO", timeline=timeline)
+    save_timeline(timeline)
     
     # Save to input.txt in the root directory
     input_path = "input.txt"
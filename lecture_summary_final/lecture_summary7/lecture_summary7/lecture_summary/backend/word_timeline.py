@@ -0,0 +1,145 @@
+"""Compact per-word confidence/timing storage for transcripts.
+
+Google Speech returns a confidence and start/end offsets for every word.
+WordTimeline keeps them in parallel typed arrays (4 bytes per value) rather
+than one dict per word, so a full lecture stays small in memory and on disk,
+and low-confidence time spans can be found with a single pass.
+"""
+import base64
+import json
+from array import array
+
+
+class WordTimeline:
+    """Words with start/end offsets (ms) and confidences in parallel arrays"""
+
+    def __init__(self):
+        self.words = []
+        self.start_ms = array('I')
+        self.end_ms = array('I')
+        self.confidence = array('f')
+
+    def __len__(self):
+        return len(self.words)
+
+    def append(self, word, start_ms, end_ms, confidence):
+        self.words.append(word)
+        self.start_ms.append(max(0, int(start_ms)))
+        self.end_ms.append(max(0, int(end_ms)))
+        self.confidence.append(float(confidence))
+
+    def add_recognition_results(self, results, offset_ms=0):
+        """Append the words of a Speech API response, shifted by the chunk offset"""
+        for result in results:
+            if not result.alternatives:
+                continue
+            for info in result.alternatives[0].words:
+                self.append(
+                    info.word,
+                    offset_ms + info.start_time.total_seconds() * 1000,
+                    offset_ms + info.end_time.total_seconds() * 1000,
+                    info.confidence,
+                )
+
+    def text(self):
+        return ' '.join(self.words)
+
+    def locate_in(self, text, max_skip=200):
+        """(start, end) character offsets of each word in text (the transcript it came from), None if not found"""
+        offsets = []
+        cursor = 0
+        for word in self.words:
+            pos = text.find(word, cursor, cursor + max_skip + len(word)) if word else -1
+            if pos < 0:
+                offsets.append(None)
+                continue
+            cursor = pos + len(word)
+            offsets.append((pos, cursor))
+        return offsets
+
+    def mean_confidence(self, start=0, end=None):
+        values = self.confidence[start:end]
+        return sum(values) / len(values) if values else 0.0
+
+    def low_confidence_spans(self, threshold=0.6, pad_ms=300, merge_gap_ms=1500, max_span_ms=50000):
+        """Return [(start_ms, end_ms, first_word, last_word_exclusive)] for runs of weak words.
+
+        Nearby weak words are merged into one span (so the recognizer gets some
+        context) and each span is padded slightly on both sides.  The word range
+        covers every word the padded window overlaps, so what the recognizer
+        hears is exactly what the result replaces.
+        """
+        spans = []
+        for i, conf in enumerate(self.confidence):
+            if conf >= threshold:
+                continue
+            start, end = self.start_ms[i], self.end_ms[i]
+            if spans and start - spans[-1][1] <= merge_gap_ms and end - spans[-1][0] <= max_span_ms:
+                spans[-1][1] = end
+                spans[-1][3] = i + 1
+            else:
+                spans.append([start, end, i, i + 1])
+        padded = []
+        for s, e, i, j in spans:
+            s, e = max(0, s - pad_ms), e + pad_ms
+            while i > 0 and self.end_ms[i - 1] > s:
+                i -= 1
+            while j < len(self.words) and self.start_ms[j] < e:
+                j += 1
+            padded.append((min(s, self.start_ms[i]), max(e, self.end_ms[j - 1]), i, j))
+        # Widening can make neighbouring spans overlap: merge them
+        merged = []
+        for span in padded:
+            if merged and span[2] < merged[-1][3]:
+                s, e, i, _ = merged[-1]
+                merged[-1] = (s, max(e, span[1]), i, max(merged[-1][3], span[3]))
+            else:
+                merged.append(span)
+        return merged
+
+    def slice(self, start, end):
+        """A new timeline with words[start:end]"""
+        part = WordTimeline()
+        part.words = self.words[start:end]
+        part.start_ms = self.start_ms[start:end]
+        part.end_ms = self.end_ms[start:end]
+        part.confidence = self.confidence[start:end]
+        return part
+
+    def trim_unchanged(self, first, last, replacement):
+        """Narrow a replacement of words[first:last] to the words it actually changes at either end"""
+        start, end = 0, len(replacement)
+        while first < last and start < end and self.words[first] == replacement.words[start]:
+            first, start = first + 1, start + 1
+        while first < last and start < end and self.words[last - 1] == replacement.words[end - 1]:
+            last, end = last - 1, end - 1
+        return first, last, replacement.slice(start, end)
+
+    def splice(self, first, last, replacement):
+        """Replace words[first:last] with the words of another timeline"""
+        self.words[first:last] = replacement.words
+        self.start_ms[first:last] = replacement.start_ms
+        self.end_ms[first:last] = replacement.end_ms
+        self.confidence[first:last] = replacement.confidence
+
+    def save(self, path):
+        """Write words as JSON plus the typed arrays as base64 blobs"""
+        data = {
+            'words': self.words,
+            'start_ms': base64.b64encode(self.start_ms.tobytes()).decode('ascii'),
+            'end_ms': base64.b64encode(self.end_ms.tobytes()).decode('ascii'),
+            'confidence': base64.b64encode(self.confidence.tobytes()).decode('ascii'),
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        timeline = cls()
+        timeline.words = data['words']
+        timeline.start_ms.frombytes(base64.b64decode(data['start_ms']))
+        timeline.end_ms.frombytes(base64.b64decode(data['end_ms']))
+        timeline.confidence.frombytes(base64.b64decode(data['confidence']))
+        return timeline
@@ -23,8 +23,12 @@ echo "📦 Checking dependencies..."
 cd backend
 pip install -r requirements.txt > /dev/null 2>&1
 
+# Build fingerprinted, precompressed static assets
+echo "🗜️  Building static assets..."
+python3 assets.py > /dev/null
+
 # Start the Flask application
-echo "🚀 Starting Flask application..."
+echo "🚀 Starting Lecture Assist (ASGI)..."
 echo "   Open your browser and go to: http://localhost:5000"
 echo "   Press Ctrl+C to stop the application"
 echo ""
@@ -34,4 +38,4 @@ echo "   - Click 'Speak with AI Tutor' for interactive Arabic tutoring"
 echo "   - Live audio conversation with OpenAI Realtime API"
 echo ""
 
-python3 app.py
+python3 asgi.py